@@ -0,0 +1,123 @@
+"""Motor de alocação de brainrots em contas com limite de espaços
+
+Como todo espaço rende o mesmo (a renda depende só do brainrot), a alocação ótima é
+ocupar a capacidade total com os brainrots de maior renda. O motor:
+
+    1. posiciona os itens fixados (brainrot -> conta obrigatória);
+    2. ordena os demais por prioridade (favoritos primeiro, se pedido) e renda;
+    3. seleciona os melhores até a capacidade restante (ilimitada se alguma conta tiver 0 espaços);
+    4. mantém cada selecionado em uma conta onde já está, se ainda houver espaço,
+       e distribui o restante pelas contas com espaço livre.
+
+O resultado é uma lista de movimentos mínima em relação à situação atual.
+Complexidade O(n log n + m) para n brainrots e m associações.
+"""
+import heapq
+from collections import defaultdict
+
+ILIMITADO = float('inf')
+
+
+class ErroAlocacao(ValueError):
+    """Restrição impossível de atender (ex: itens fixados acima da capacidade)"""
+
+
+def calcular_alocacao(brainrots, contas, associacoes, fixados=None, priorizar_favoritos=True):
+    """Calcula a alocação que maximiza a renda total por segundo
+
+    brainrots: iterável de (id, renda, favorito)
+    contas: iterável de (id, espacos) — espacos 0 significa ilimitado
+    associacoes: iterável de (brainrot_id, conta_id) atuais
+    fixados: dict {brainrot_id: conta_id} que precisam ficar na conta indicada
+
+    Retorna dict com 'alocacao' {brainrot_id: conta_id}, 'movimentos' e totais de renda.
+    """
+    fixados = dict(fixados or {})
+    renda = {}
+    favorito = {}
+    for brainrot_id, valor, fav in brainrots:
+        renda[brainrot_id] = valor or 0.0
+        favorito[brainrot_id] = bool(fav)
+
+    capacidade = {}
+    for conta_id, espacos in contas:
+        capacidade[conta_id] = ILIMITADO if not espacos else espacos
+
+    atuais = defaultdict(set)
+    for brainrot_id, conta_id in associacoes:
+        if brainrot_id in renda and conta_id in capacidade:
+            atuais[brainrot_id].add(conta_id)
+
+    livre = dict(capacidade)
+    alocacao = {}
+
+    # 1. Itens fixados
+    for brainrot_id, conta_id in fixados.items():
+        if brainrot_id not in renda:
+            raise ErroAlocacao(f'Brainrot {brainrot_id} não encontrado')
+        if conta_id not in livre:
+            raise ErroAlocacao(f'Conta {conta_id} não encontrada')
+        if livre[conta_id] < 1:
+            raise ErroAlocacao(f'A conta {conta_id} não tem espaço para todos os itens fixados')
+        alocacao[brainrot_id] = conta_id
+        livre[conta_id] -= 1
+
+    # 2-3. Selecionar os melhores candidatos até a capacidade restante
+    restante = sum(livre.values())
+    candidatos = [b for b in renda if b not in alocacao]
+    if priorizar_favoritos:
+        chave = lambda b: (not favorito[b], -renda[b], b)
+    else:
+        chave = lambda b: (-renda[b], b)
+    if restante == ILIMITADO or restante >= len(candidatos):
+        selecionados = sorted(candidatos, key=chave)
+    else:
+        selecionados = heapq.nsmallest(int(restante), candidatos, key=chave)
+
+    # 4a. Manter na conta atual sempre que possível (menos movimentos)
+    pendentes = []
+    for brainrot_id in selecionados:
+        conta_atual = next(
+            (c for c in sorted(atuais.get(brainrot_id, ())) if livre.get(c, 0) >= 1),
+            None
+        )
+        if conta_atual is None:
+            pendentes.append(brainrot_id)
+        else:
+            alocacao[brainrot_id] = conta_atual
+            livre[conta_atual] -= 1
+
+    # 4b. Distribuir os pendentes pelas contas com mais espaço livre
+    heap = [(-livre[c], c) for c in livre if livre[c] >= 1]
+    heapq.heapify(heap)
+    for brainrot_id in pendentes:
+        if not heap:
+            break
+        negativo, conta_id = heapq.heappop(heap)
+        alocacao[brainrot_id] = conta_id
+        livre[conta_id] -= 1
+        if livre[conta_id] >= 1:
+            heapq.heappush(heap, (-livre[conta_id], conta_id))
+
+    # Diferença em relação à situação atual
+    movimentos = []
+    for brainrot_id in renda:
+        antes = atuais.get(brainrot_id, set())
+        depois = alocacao.get(brainrot_id)
+        if antes == ({depois} if depois is not None else set()):
+            continue
+        movimentos.append({
+            'brainrot_id': brainrot_id,
+            'de': sorted(antes),
+            'para': depois,
+            'renda': renda[brainrot_id]
+        })
+
+    return {
+        'alocacao': alocacao,
+        'movimentos': movimentos,
+        'renda_antes': sum(renda[b] for b in atuais),
+        'renda_depois': sum(renda[b] for b in alocacao),
+        'capacidade_total': sum(capacidade.values()),
+        'alocados': len(alocacao),
+    }
@@ -0,0 +1,339 @@
+"""Análises de distribuição da renda (percentis, histogramas, concentração, duplicados)
+
+As colunas necessárias ficam em arrays NumPy (formato colunar) mantidos em cada worker.
+Todos os agregados são calculados com operações vetorizadas: códigos inteiros por grupo,
+ordenação por grupo + fatiamento para os percentis e np.bincount para contagens e
+histogramas, sem laços por brainrot.
+
+Carga: a primeira leitura vai direto do cursor do driver para um array (np.fromiter) e
+os textos viram códigos pela ordem de primeira aparição. Depois disso, como em snapshot.py, cada nova
+versão dos dados relê só os brainrots com versao_alteracao acima da versão das colunas
+(e as associações deles); exclusões vêm dos tombstones em `exclusao` e um tombstone '*'
+pede a carga completa.
+
+O relatório é guardado em cache pela versão dos dados. Se o NumPy não estiver
+instalado, DISPONIVEL fica False e /api/analytics responde 503.
+"""
+import json
+import threading
+from itertools import chain, islice
+
+from sqlalchemy import func, select
+
+from models import parse_valor_formatado
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DISPONIVEL = np is not None
+
+PERCENTIS = (10, 25, 50, 75, 90, 99)
+TOP_K = (1, 10, 100, 1000)
+
+# Ids por IN (...) ao reler as associações dos brainrots alterados
+LOTE = 1000
+
+_estado = {}
+
+
+def init_analytics(db, Brainrot, Conta, brainrot_conta, Exclusao):
+    _estado.update(db=db, Brainrot=Brainrot, Conta=Conta, brainrot_conta=brainrot_conta, Exclusao=Exclusao)
+
+
+def _array(consulta, dtype, colunas=1):
+    """Executa a consulta no cursor do driver e monta o array direto das tuplas (np.fromiter)
+
+    Sem objetos Row nem laços Python por linha: o cursor, o chain e o fromiter rodam em C.
+    """
+    conexao = _estado['db'].session.connection()
+    sql = str(consulta.compile(dialect=conexao.dialect, compile_kwargs={'literal_binds': True}))
+    cursor = conexao.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(sql)
+        valores = np.fromiter(chain.from_iterable(cursor), dtype=dtype)
+    finally:
+        cursor.close()
+    return valores.reshape(-1, colunas) if colunas > 1 else valores
+
+
+class ColunasBrainrots:
+    """Colunas de um worker; obter() devolve as colunas atualizadas para a versão atual"""
+
+    # Textos guardados como códigos; cada código é a posição do texto no dicionário do campo
+    TEXTOS = ('valor_formatado', 'nome', 'raridade', 'eventos')
+
+    def __init__(self):
+        self.base = None
+        self.textos = {}
+        # Por código: valor do texto formatado e códigos dos eventos (só cresce, como os códigos)
+        self.valores = []
+        self.listas_eventos = []
+        self.nomes_eventos = {}
+        self.associacoes = None
+        self.colunas = None
+        self.versao = None
+        self._lock = threading.Lock()
+
+    def _linhas(self, condicao=None):
+        """Matriz (n, 7) com id, valor por segundo, quantidade e os textos, ordenada por id"""
+        Brainrot = _estado['Brainrot']
+        consulta = select(
+            Brainrot.id,
+            func.coalesce(Brainrot.valor_por_segundo, 0.0),
+            func.coalesce(func.nullif(Brainrot.quantidade, 0), 1),
+            *(func.coalesce(getattr(Brainrot, campo), '') for campo in self.TEXTOS),
+        ).order_by(Brainrot.id)
+        if condicao is not None:
+            consulta = consulta.where(condicao)
+        return _array(consulta, object, colunas=3 + len(self.TEXTOS))
+
+    def _associacoes(self, ids=None):
+        """Pares (brainrot_id, conta_id); com ids, só os desses brainrots"""
+        tabela = _estado['brainrot_conta']
+        consulta = select(tabela.c.brainrot_id, tabela.c.conta_id)
+        if ids is None:
+            return _array(consulta, np.int64, colunas=2)
+        lotes = [_array(consulta.where(tabela.c.brainrot_id.in_(ids[inicio:inicio + LOTE])), np.int64, colunas=2)
+                 for inicio in range(0, len(ids), LOTE)]
+        return np.concatenate(lotes) if lotes else np.zeros((0, 2), dtype=np.int64)
+
+    def _numeros(self, matriz):
+        return {
+            'id': matriz[:, 0].astype(np.int64),
+            'por_segundo': matriz[:, 1].astype(np.float64),
+            'quantidade': matriz[:, 2].astype(np.float64),
+        }
+
+    def recarregar(self, versao):
+        """Carga completa (primeira vez ou depois de um tombstone '*')"""
+        matriz = self._linhas()
+        base = self._numeros(matriz)
+        textos = {}
+        for j, campo in enumerate(self.TEXTOS, start=3):
+            # Código = ordem de primeira aparição; dict.fromkeys e map rodam em C, sem ordenar textos
+            valores = matriz[:, j]
+            codigos = {texto: i for i, texto in enumerate(dict.fromkeys(valores))}
+            textos[campo] = codigos
+            base[campo] = np.fromiter(map(codigos.__getitem__, valores), dtype=np.int64, count=len(valores))
+        self.associacoes = self._associacoes()
+        self.base = base
+        self.textos = textos
+        self.valores, self.listas_eventos, self.nomes_eventos = [], [], {}
+        self.colunas = self._montar()
+        self.versao = versao
+
+    def atualizar(self, versao):
+        """Relê só o que mudou depois da versão das colunas"""
+        db, Brainrot, Exclusao = _estado['db'], _estado['Brainrot'], _estado['Exclusao']
+        desde = self.versao
+        excluidos = db.session.execute(
+            select(Exclusao.tipo_entidade, Exclusao.entidade_id).where(Exclusao.versao > desde)).all()
+        if versao < desde or any(tipo == '*' for tipo, _ in excluidos):
+            return self.recarregar(versao)
+
+        matriz = self._linhas(Brainrot.versao_alteracao > desde)
+        novos = self._numeros(matriz)
+        for j, campo in enumerate(self.TEXTOS, start=3):
+            # Poucas linhas: textos novos ganham o próximo código do dicionário
+            codigos = self.textos[campo]
+            novos[campo] = np.array([codigos.setdefault(t, len(codigos)) for t in matriz[:, j]], dtype=np.int64)
+        removidos = np.union1d(novos['id'], np.array(
+            [entidade_id for tipo, entidade_id in excluidos if tipo == 'brainrot'], dtype=np.int64))
+
+        manter = ~np.isin(self.base['id'], removidos)
+        base = {campo: np.concatenate((valores[manter], novos[campo])) for campo, valores in self.base.items()}
+        ordem = np.argsort(base['id'], kind='stable')
+        self.base = {campo: valores[ordem] for campo, valores in base.items()}
+        associacoes = self.associacoes[~np.isin(self.associacoes[:, 0], removidos)]
+        self.associacoes = np.concatenate((associacoes, self._associacoes(novos['id'].tolist())))
+        self.colunas = self._montar()
+        self.versao = versao
+
+    def obter(self, versao):
+        if self.versao == versao:
+            return self.colunas
+        with self._lock:
+            if self.versao is None:
+                self.recarregar(versao)
+            elif self.versao != versao:
+                self.atualizar(versao)
+        return self.colunas
+
+    def _converter_textos(self):
+        """Converte só os textos distintos que ainda não foram convertidos"""
+        for texto in islice(self.textos['valor_formatado'], len(self.valores), None):
+            self.valores.append(parse_valor_formatado(texto) if texto else np.nan)
+        nomes_eventos = self.nomes_eventos
+        for texto in islice(self.textos['eventos'], len(self.listas_eventos), None):
+            try:
+                lista = json.loads(texto) if texto else []
+            except ValueError:
+                lista = []
+            self.listas_eventos.append([nomes_eventos.setdefault(e, len(nomes_eventos)) for e in dict.fromkeys(lista)])
+
+    def _montar(self):
+        """Colunas do relatório a partir da base; textos só são tratados uma vez por valor distinto"""
+        self._converter_textos()
+        base = self.base
+        ids = base['id']
+        n = len(ids)
+
+        # Valor: texto formatado convertido por código; vazio usa o valor por segundo
+        valor_unico = np.array(self.valores, dtype=np.float64)
+        valor = valor_unico[base['valor_formatado']] if n else np.zeros(0)
+        valor = np.where(np.isnan(valor), base['por_segundo'], valor)
+
+        colunas = {
+            'id': ids,
+            'renda': valor * base['quantidade'],
+            'nomes': np.array(list(self.textos['nome']), dtype=object),
+            'nome': base['nome'],
+            'raridades': np.array(list(self.textos['raridade']), dtype=object),
+            'raridade': base['raridade'],
+        }
+
+        # Eventos: JSON com poucos valores distintos; vira pares (linha, código do evento)
+        codigos_eventos = base['eventos']
+        listas = self.listas_eventos
+        tamanhos = np.array([len(l) for l in listas], dtype=np.int64)
+        por_linha = tamanhos[codigos_eventos] if n else np.zeros(0, dtype=np.int64)
+        colunas['eventos'] = np.array(list(self.nomes_eventos), dtype=object)
+        colunas['evento_linha'] = np.repeat(np.arange(n, dtype=np.int64), por_linha)
+        if len(colunas['evento_linha']):
+            # Posição de cada par dentro da lista do seu texto de eventos
+            inicio = np.repeat(np.cumsum(por_linha) - por_linha, por_linha)
+            posicao = np.arange(len(colunas['evento_linha'])) - inicio
+            deslocamento = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+            planos = np.array([c for l in listas for c in l], dtype=np.int64)
+            colunas['evento'] = planos[deslocamento[codigos_eventos[colunas['evento_linha']]] + posicao]
+        else:
+            colunas['evento'] = np.zeros(0, dtype=np.int64)
+
+        # Associações: brainrot_id -> índice da linha por busca binária nos ids (ordenados)
+        associacoes = self.associacoes
+        if len(associacoes) and n:
+            posicoes = np.searchsorted(ids, associacoes[:, 0])
+            colunas['conta_linha'] = np.minimum(posicoes, n - 1)
+            colunas['conta'] = associacoes[:, 1].copy()
+        else:
+            colunas['conta_linha'] = colunas['conta'] = np.zeros(0, dtype=np.int64)
+        return colunas
+
+
+_colunas = ColunasBrainrots()
+
+
+def carregar_colunas(versao):
+    """Colunas do worker atualizadas para a versão informada"""
+    return _colunas.obter(versao)
+
+
+def _bordas_histograma(renda, bins):
+    """Bordas em escala logarítmica (a renda vai de unidades a trilhões)"""
+    positivos = renda[renda > 0]
+    if not len(positivos):
+        return np.array([0.0, 1.0])
+    minimo, maximo = np.log10(positivos.min()), np.log10(positivos.max())
+    if minimo == maximo:
+        maximo = minimo + 1
+    return np.concatenate(([0.0], np.logspace(minimo, maximo, bins)))
+
+
+def _por_grupo(grupos, renda, rotulos, bordas):
+    """Contagem, soma, média, percentis e histograma de cada grupo, vetorizados"""
+    if not len(grupos):
+        return []
+    total_grupos = len(rotulos)
+    contagem = np.bincount(grupos, minlength=total_grupos)
+    soma = np.bincount(grupos, weights=renda, minlength=total_grupos)
+
+    # Ordena por (grupo, renda): cada grupo vira uma fatia contígua já ordenada
+    # (duas ordenações estáveis são bem mais rápidas que np.lexsort)
+    ordem = np.argsort(renda)
+    ordem = ordem[np.argsort(grupos[ordem], kind='stable')]
+    renda_ordenada = renda[ordem]
+    inicio = np.concatenate(([0], np.cumsum(contagem)[:-1]))
+    validos = contagem > 0
+    percentis = {}
+    for p in PERCENTIS:
+        # Interpolação linear, igual a np.percentile, para todos os grupos de uma vez
+        # (fração tirada da posição dentro do grupo, que não depende de onde a fatia começa)
+        posicao = (contagem - 1).clip(min=0) * (p / 100.0)
+        baixo = inicio + np.floor(posicao).astype(np.int64)
+        alto = np.minimum(baixo + 1, inicio + contagem - 1).clip(min=0)
+        baixo = baixo.clip(max=max(len(renda_ordenada) - 1, 0))
+        fracao = posicao - np.floor(posicao)
+        percentis[p] = renda_ordenada[baixo] * (1 - fracao) + renda_ordenada[alto] * fracao
+
+    bins = len(bordas) - 1
+    faixa = np.clip(np.searchsorted(bordas, renda, side='right') - 1, 0, bins - 1)
+    histograma = np.bincount(grupos * bins + faixa, minlength=total_grupos * bins).reshape(total_grupos, bins)
+
+    resultado = []
+    for i in np.flatnonzero(validos):
+        resultado.append({
+            'grupo': str(rotulos[i]),
+            'quantidade': int(contagem[i]),
+            'renda_total': float(soma[i]),
+            'renda_media': float(soma[i] / contagem[i]),
+            'percentis': {f'p{p}': float(percentis[p][i]) for p in PERCENTIS},
+            'histograma': histograma[i].tolist(),
+        })
+    resultado.sort(key=lambda g: g['renda_total'], reverse=True)
+    return resultado
+
+
+def _concentracao(renda):
+    """Participação dos k maiores brainrots na renda total"""
+    total = float(renda.sum())
+    decrescente = np.sort(renda)[::-1]
+    acumulado = np.cumsum(decrescente)
+    resultado = {}
+    for k in TOP_K:
+        if k <= len(acumulado):
+            resultado[f'top_{k}'] = float(acumulado[k - 1] / total) if total else 0.0
+    if len(acumulado):
+        # Quantos brainrots respondem por metade da renda
+        resultado['itens_metade_renda'] = int(np.searchsorted(acumulado, total / 2) + 1) if total else 0
+    return resultado
+
+
+def _duplicados(nomes, codigos, limite):
+    contagem = np.bincount(codigos, minlength=len(nomes)) if len(codigos) else np.zeros(0, dtype=np.int64)
+    repetidos = np.flatnonzero(contagem > 1)
+    # Empates em ordem alfabética (os códigos seguem a ordem de chegada dos nomes)
+    maiores = repetidos[np.lexsort((nomes[repetidos].astype(str), -contagem[repetidos]))][:limite]
+    return {
+        'nomes_unicos': int((contagem > 0).sum()),
+        'nomes_repetidos': int(len(repetidos)),
+        'copias_extras': int((contagem[repetidos] - 1).sum()),
+        'maiores': [{'nome': str(nomes[i]), 'quantidade': int(contagem[i])} for i in maiores],
+    }
+
+
+def gerar_relatorio(colunas, bins=20, limite=20):
+    """Calcula o relatório completo a partir das colunas carregadas"""
+    renda = colunas['renda']
+    bordas = _bordas_histograma(renda, bins)
+
+    contas = _estado['db'].session.execute(
+        select(_estado['Conta'].id, _estado['Conta'].nome)
+    ).all() if len(colunas['conta']) else []
+    nomes_contas = dict(contas)
+    contas_unicas, conta_codigo = np.unique(colunas['conta'], return_inverse=True)
+    rotulos_contas = np.array([nomes_contas.get(int(c), str(c)) for c in contas_unicas], dtype=object)
+
+    return {
+        'total_brainrots': int(len(renda)),
+        'renda_total': float(renda.sum()),
+        'histograma_bordas': bordas.tolist(),
+        'por_raridade': _por_grupo(colunas['raridade'], renda, colunas['raridades'], bordas),
+        'por_conta': _por_grupo(conta_codigo.astype(np.int64), renda[colunas['conta_linha']],
+                                rotulos_contas, bordas)[:limite],
+        'por_evento': _por_grupo(colunas['evento'], renda[colunas['evento_linha']],
+                                 colunas['eventos'], bordas)[:limite],
+        'concentracao': _concentracao(renda),
+        'duplicados': _duplicados(colunas['nomes'], colunas['nome'], limite),
+    }
@@ -0,0 +1,315 @@
+"""Histórico de alterações gravado fora do caminho da requisição (write-behind)
+
+As rotas chamam registrar_historico(...) em vez de criar linhas de HistoricoAlteracao. Os
+registros ficam na sessão até o commit (um rollback os descarta) e, conforme
+AUDITORIA_DURABILIDADE, são gravados:
+
+    'spool' (padrão)  Depois do commit, cada registro é acrescentado a um arquivo local
+                      (AUDITORIA_SPOOL_DIR/auditoria-<pid>.jsonl) e entra na fila em
+                      memória. Uma thread do worker grava a fila com INSERTs de várias
+                      linhas quando ela chega a AUDITORIA_LOTE itens ou a cada
+                      AUDITORIA_INTERVALO_S, e então esvazia o arquivo. Se o processo cair,
+                      o arquivo de um worker morto (sem o lock) é regravado pela thread do
+                      próximo worker que iniciar a fila, fora do caminho da requisição. Pode
+                      repetir registros se o processo cair entre o INSERT e o esvaziamento
+                      do arquivo (entrega "pelo menos uma vez").
+    'memoria'         Como 'spool', sem o arquivo: o que estiver na fila se perde se o
+                      processo cair.
+    'commit'          Sem fila: um único INSERT de várias linhas na própria transação,
+                      logo antes do commit (nada se perde, mas fica no caminho da requisição).
+
+AUDITORIA_FSYNC=1 força fsync a cada gravação no arquivo (sobrevive também a queda de
+energia). O histórico pode aparecer em /api/historico com até AUDITORIA_INTERVALO_S de
+atraso. Métricas: brainrot_queue_depth{fila="auditoria"} e
+brainrot_queue_lag_seconds{fila="auditoria"} (idade do registro pendente mais antigo).
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: sem lock de arquivo (um único processo)
+    fcntl = None
+
+from sqlalchemy import event
+
+from metrics import definir_atraso_fila, definir_tamanho_fila
+
+logger = logging.getLogger('brainrot.auditoria')
+
+DURABILIDADES = ('spool', 'memoria', 'commit')
+
+_estado = {}
+
+
+def registrar_historico(tipo_entidade, entidade_id, acao, dados_anteriores=None, dados_novos=None):
+    """Registra uma alteração no histórico (gravada depois do commit da transação atual)"""
+    _estado['db'].session.info.setdefault('historico_pendente', []).append({
+        'tipo_entidade': tipo_entidade,
+        'entidade_id': entidade_id,
+        'acao': acao,
+        'dados_anteriores': dados_anteriores,
+        'dados_novos': dados_novos,
+        'data_alteracao': datetime.utcnow(),
+    })
+
+
+def _para_json(registro):
+    return json.dumps({**registro, 'data_alteracao': registro['data_alteracao'].isoformat()},
+                      separators=(',', ':'))
+
+
+def _de_json(linha):
+    registro = json.loads(linha)
+    registro['data_alteracao'] = datetime.fromisoformat(registro['data_alteracao'])
+    return registro
+
+
+def _ler_registros(arquivo):
+    """Registros de um arquivo de spool; ignora a linha cortada por uma queda no meio da escrita"""
+    registros = []
+    for linha in arquivo:
+        if not linha.strip():
+            continue
+        try:
+            registros.append(_de_json(linha))
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Linha inválida ignorada em {arquivo.name}: {linha[:200]!r}")
+    return registros
+
+
+def _inserir(conexao, registros, lote):
+    """INSERT de várias linhas por comando (lotes de `lote` registros)"""
+    tabela = _estado['HistoricoAlteracao'].__table__
+    for inicio in range(0, len(registros), lote):
+        conexao.execute(tabela.insert().values(registros[inicio:inicio + lote]))
+
+
+class EscritorAuditoria:
+    """Fila do worker com o histórico já confirmado e a thread que o grava no banco"""
+
+    def __init__(self, app, spool):
+        self.app = app
+        self.config = app.config
+        self.spool = spool
+        self._fila = deque()  # (momento da entrada, registro)
+        self._trava = threading.Lock()
+        self._gravando = threading.Lock()  # Uma gravação por vez (thread ou encerramento)
+        self._acordar = threading.Event()
+        self._pid = None
+        self._arquivo = None
+
+    def __len__(self):
+        return len(self._fila)
+
+    def _iniciar(self):
+        """Por pid (depois do fork do gunicorn cada worker tem fila, arquivo e thread próprios)"""
+        if self._pid == os.getpid():
+            return
+        self._fila.clear()
+        self._arquivo = None
+        if self.spool:
+            diretorio = self.config['AUDITORIA_SPOOL_DIR']
+            os.makedirs(diretorio, exist_ok=True)
+            self._arquivo = open(os.path.join(diretorio, f'auditoria-{os.getpid()}.jsonl'), 'a+', encoding='utf-8')
+            if fcntl:
+                fcntl.flock(self._arquivo, fcntl.LOCK_EX)
+            # Restos de um processo anterior que caiu com o mesmo pid: entram na fila deste
+            self._arquivo.seek(0)
+            agora = time.monotonic()
+            self._fila.extend((agora, registro) for registro in _ler_registros(self._arquivo))
+        self._pid = os.getpid()
+        threading.Thread(target=self._executar, name='brainrot-auditoria', daemon=True).start()
+
+    def enfileirar(self, registros):
+        with self._trava:
+            self._iniciar()
+            if self._arquivo is not None:
+                self._arquivo.write(''.join(_para_json(registro) + '\n' for registro in registros))
+                self._arquivo.flush()
+                if self.config['AUDITORIA_FSYNC']:
+                    os.fsync(self._arquivo.fileno())
+            agora = time.monotonic()
+            self._fila.extend((agora, registro) for registro in registros)
+            tamanho = len(self._fila)
+        self._atualizar_metricas()
+        if tamanho >= self.config['AUDITORIA_LOTE']:
+            self._acordar.set()
+
+    def _atualizar_metricas(self):
+        fila = self._fila
+        definir_tamanho_fila('auditoria', len(fila))
+        try:
+            definir_atraso_fila('auditoria', time.monotonic() - fila[0][0])
+        except IndexError:
+            definir_atraso_fila('auditoria', 0)
+
+    def descarregar(self):
+        """Grava no banco tudo que está na fila agora; retorna quantos registros"""
+        with self._gravando:
+            return self._descarregar()
+
+    def _descarregar(self):
+        with self._trava:
+            pendentes = [registro for _, registro in self._fila]
+        if not pendentes:
+            return 0
+        with self.app.app_context():
+            with _estado['db'].engines[None].begin() as conexao:
+                _inserir(conexao, pendentes, self.config['AUDITORIA_LOTE'])
+        with self._trava:
+            for _ in range(len(pendentes)):
+                self._fila.popleft()
+            if self._arquivo is not None:
+                # O arquivo guarda só o que ainda não foi gravado
+                self._arquivo.seek(0)
+                self._arquivo.truncate()
+                self._arquivo.write(''.join(_para_json(registro) + '\n' for _, registro in self._fila))
+                self._arquivo.flush()
+        self._atualizar_metricas()
+        return len(pendentes)
+
+    def _executar(self):
+        if self.spool:
+            # Arquivos de workers que caíram: gravados aqui, nunca dentro de uma requisição
+            self.recuperar_spool()
+        espera = 1
+        while True:
+            self._acordar.wait(self.config['AUDITORIA_INTERVALO_S'])
+            self._acordar.clear()
+            try:
+                self.descarregar()
+                espera = 1
+            except Exception as e:
+                # Os registros continuam na fila (e no arquivo) para a próxima tentativa
+                logger.warning(f"Falha ao gravar o histórico ({len(self._fila)} pendentes): {e}; nova tentativa em {espera}s")
+                self._atualizar_metricas()
+                time.sleep(espera)
+                espera = min(espera * 2, 30)
+
+    def recuperar_spool(self):
+        """Grava no banco os arquivos de processos que caíram (sem lock); retorna quantos registros
+
+        Um arquivo que falhar (banco fora do ar, JSON inválido) fica para a próxima
+        recuperação; os demais seguem.
+        """
+        total = 0
+        for caminho in sorted(glob.glob(os.path.join(self.config['AUDITORIA_SPOOL_DIR'], 'auditoria-*.jsonl'))):
+            if self._arquivo is not None and caminho == self._arquivo.name:
+                continue
+            try:
+                total += self._recuperar_arquivo(caminho)
+            except Exception as e:
+                logger.warning(f"Falha ao recuperar o histórico de {caminho}: {e}")
+        return total
+
+    def _recuperar_arquivo(self, caminho):
+        try:
+            arquivo = open(caminho, 'r+', encoding='utf-8')
+        except FileNotFoundError:
+            # Outro worker acabou de recuperar e apagar
+            return 0
+        with arquivo:
+            if fcntl:
+                try:
+                    fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # Worker vivo: o arquivo é dele
+                    return 0
+            if os.fstat(arquivo.fileno()).st_nlink == 0:
+                # Recuperado e apagado por outro worker enquanto esperávamos o lock
+                return 0
+            registros = _ler_registros(arquivo)
+            if registros:
+                with self.app.app_context():
+                    with _estado['db'].engines[None].begin() as conexao:
+                        _inserir(conexao, registros, self.config['AUDITORIA_LOTE'])
+                logger.warning(f"{len(registros)} registro(s) de histórico recuperado(s) de {caminho}")
+            # Esvaziar ainda com o lock: quem abriu o arquivo antes do remove não regrava nada
+            arquivo.truncate(0)
+            arquivo.flush()
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+        return len(registros)
+
+    def encerrar(self):
+        """Ao sair do processo: grava o que restou (o arquivo continua se o banco falhar)"""
+        if self._pid != os.getpid():
+            return
+        try:
+            self.descarregar()
+            if self._arquivo is not None and not self._fila:
+                self._arquivo.close()
+                os.remove(self._arquivo.name)
+        except Exception as e:
+            logger.warning(f"Histórico não gravado ao encerrar ({len(self._fila)} pendentes): {e}")
+
+
+def init_auditoria(app, db, HistoricoAlteracao):
+    """Registra a coleta do histórico por transação e o escritor em segundo plano"""
+    _estado.update(db=db, HistoricoAlteracao=HistoricoAlteracao)
+    app.config.setdefault('AUDITORIA_DURABILIDADE', os.getenv('AUDITORIA_DURABILIDADE', 'spool'))
+    app.config.setdefault('AUDITORIA_LOTE', int(os.getenv('AUDITORIA_LOTE', 200)))
+    app.config.setdefault('AUDITORIA_INTERVALO_S', float(os.getenv('AUDITORIA_INTERVALO_S', 1)))
+    app.config.setdefault('AUDITORIA_FSYNC', os.getenv('AUDITORIA_FSYNC', '0') == '1')
+    app.config.setdefault('AUDITORIA_SPOOL_DIR', os.getenv('AUDITORIA_SPOOL_DIR', os.path.join(app.instance_path, 'auditoria')))
+    durabilidade = app.config['AUDITORIA_DURABILIDADE']
+    if durabilidade not in DURABILIDADES:
+        raise ValueError(f"AUDITORIA_DURABILIDADE inválida: {durabilidade} (use {', '.join(DURABILIDADES)})")
+
+    escritor = None
+    if durabilidade != 'commit':
+        escritor = _estado['escritor'] = EscritorAuditoria(app, spool=durabilidade == 'spool')
+        atexit.register(escritor.encerrar)
+
+    @event.listens_for(db.session, 'after_transaction_create')
+    def _abrir_savepoint(session, transacao):
+        # Cópia dos pendentes para restaurar se o savepoint for desfeito
+        if transacao.nested:
+            savepoints = session.info.setdefault('historico_savepoints', {})
+            savepoints[transacao] = list(session.info.get('historico_pendente', ()))
+
+    @event.listens_for(db.session, 'before_commit')
+    def _gravar_na_transacao(session):
+        if escritor is None and not session.in_nested_transaction():
+            pendentes = session.info.pop('historico_pendente', None)
+            if pendentes:
+                _inserir(session.connection(), pendentes, app.config['AUDITORIA_LOTE'])
+
+    @event.listens_for(db.session, 'after_commit')
+    def _enfileirar_apos_commit(session):
+        # Liberar um savepoint também dispara after_commit
+        if session.in_nested_transaction():
+            return
+        session.info.pop('historico_savepoints', None)
+        pendentes = session.info.pop('historico_pendente', None)
+        if pendentes and escritor is not None:
+            escritor.enfileirar(pendentes)
+
+    @event.listens_for(db.session, 'after_soft_rollback')
+    def _descartar(session, previous_transaction):
+        if previous_transaction.nested:
+            anteriores = session.info.get('historico_savepoints', {}).pop(previous_transaction, None)
+            if anteriores is not None:
+                session.info['historico_pendente'] = anteriores
+            return
+        session.info.pop('historico_pendente', None)
+        session.info.pop('historico_savepoints', None)
+
+    @app.cli.command('auditoria-recuperar')
+    def auditoria_recuperar_command():
+        """Grava no banco o histórico deixado em arquivos por processos que caíram"""
+        if escritor is None or not escritor.spool:
+            print("AUDITORIA_DURABILIDADE não é 'spool': não há arquivos para recuperar")
+            return
+        print(f"{escritor.recuperar_spool()} registro(s) recuperado(s)")
@@ -16,9 +16,15 @@ class User(UserMixin):
         """Verifica se a senha está correta"""
         return check_password_hash(self.password_hash, password)
 
+_usuario = None
+
 def get_user():
     """Retorna o usuário administrador"""
-    # Hash da senha jeferson123 (gerado uma vez)
-    password_hash = generate_password_hash(ADMIN_PASSWORD)
-    return User(id=1, email=ADMIN_EMAIL, password_hash=password_hash)
+    global _usuario
+    # Hash da senha jeferson123 (gerado uma vez por processo: o user_loader chama
+    # get_user() a cada requisição e o hash custa dezenas de milissegundos)
+    if _usuario is None:
+        password_hash = generate_password_hash(ADMIN_PASSWORD)
+        _usuario = User(id=1, email=ADMIN_EMAIL, password_hash=password_hash)
+    return _usuario
 
@@ -0,0 +1,317 @@
+"""Backup completo (todas as tabelas) em um único arquivo compactado, e restauração em lote
+
+Formato: JSON Lines compactado com gzip.
+    {"formato": "brainrot-backup", "versao_formato": 1, "criado_em": ..., "tabelas": [...]}
+    {"tabela": "conta", "colunas": ["id", "nome", ...]}
+    [1, "Conta A", ...]                      <- uma linha por registro
+    {"fim_tabela": "conta", "linhas": 123}
+    ...
+
+As tabelas saem na ordem de dependência das chaves estrangeiras (metadata.sorted_tables),
+todas lidas na mesma transação (REPEATABLE READ no Postgres), então o arquivo é um retrato
+consistente. A restauração apaga as tabelas na ordem inversa e carrega cada uma em lotes:
+COPY no Postgres, executemany nos demais bancos, tudo em uma única transação.
+
+Uso:
+    flask backup criar backup.jsonl.gz
+    flask backup restaurar backup.jsonl.gz --sim
+"""
+import csv
+import gzip
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+import click
+from sqlalchemy import JSON, Date, DateTime, func, select, text
+
+from sincronizacao import registrar_reinicio
+
+FORMATO = 'brainrot-backup'
+VERSAO_FORMATO = 1
+LOTE = 5000
+
+_estado = {}
+
+
+class ErroBackup(ValueError):
+    """Arquivo de backup inválido ou incompatível"""
+
+
+def _tabelas():
+    """Tabelas da aplicação na ordem de dependência (pais antes dos filhos)"""
+    return list(_estado['db'].metadata.sorted_tables)
+
+
+def _serializar(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def _linhas_backup(conexao):
+    """Gera as linhas (texto) do backup lendo cada tabela em streaming"""
+    tabelas = _tabelas()
+    yield json.dumps({
+        'formato': FORMATO,
+        'versao_formato': VERSAO_FORMATO,
+        'criado_em': datetime.utcnow().isoformat(),
+        'banco': conexao.dialect.name,
+        'tabelas': [t.name for t in tabelas],
+    }, ensure_ascii=False) + '\n'
+    for tabela in tabelas:
+        colunas = [c.name for c in tabela.columns]
+        yield json.dumps({'tabela': tabela.name, 'colunas': colunas}) + '\n'
+        total = 0
+        chave = list(tabela.primary_key.columns) or list(tabela.columns)
+        resultado = conexao.execution_options(stream_results=True, yield_per=LOTE).execute(
+            select(*tabela.columns).order_by(*chave)
+        )
+        for linha in resultado:
+            yield json.dumps([_serializar(v) for v in linha], ensure_ascii=False, default=str) + '\n'
+            total += 1
+        yield json.dumps({'fim_tabela': tabela.name, 'linhas': total}) + '\n'
+
+
+def _abrir_transacao_consistente(engine):
+    conexao = engine.connect()
+    if conexao.dialect.name == 'postgresql':
+        conexao = conexao.execution_options(isolation_level='REPEATABLE READ', postgresql_readonly=True)
+    conexao.begin()
+    return conexao
+
+
+def gerar_backup_compactado(engine, tamanho_bloco=64 * 1024):
+    """Gerador de blocos gzip com o backup completo (para respostas HTTP em streaming)"""
+    conexao = _abrir_transacao_consistente(engine)
+    compressor = zlib.compressobj(3, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    buffer = []
+    tamanho = 0
+    try:
+        for linha in _linhas_backup(conexao):
+            dados = linha.encode('utf-8')
+            buffer.append(dados)
+            tamanho += len(dados)
+            if tamanho >= tamanho_bloco:
+                bloco = compressor.compress(b''.join(buffer))
+                buffer, tamanho = [], 0
+                if bloco:
+                    yield bloco
+        yield compressor.compress(b''.join(buffer)) + compressor.flush()
+    finally:
+        conexao.rollback()
+        conexao.close()
+
+
+def criar_backup(engine, caminho):
+    """Grava o backup completo em `caminho`; retorna {tabela: linhas}"""
+    contagem = {}
+    conexao = _abrir_transacao_consistente(engine)
+    try:
+        with gzip.open(caminho, 'wt', encoding='utf-8', compresslevel=3) as arquivo:
+            for linha in _linhas_backup(conexao):
+                arquivo.write(linha)
+                if linha.startswith('{"fim_tabela"'):
+                    fim = json.loads(linha)
+                    contagem[fim['fim_tabela']] = fim['linhas']
+    finally:
+        conexao.rollback()
+        conexao.close()
+    return contagem
+
+
+def _conversores(tabela, colunas, dialeto):
+    """Lista de (posição, função) que convertem os valores do JSON para o formato do driver
+
+    Datas voltam de texto ISO para datetime e passam pelo bind_processor do tipo da
+    coluna (o mesmo que o SQLAlchemy aplicaria), sem o custo do ORM por linha.
+    """
+    conversores = []
+    for posicao, nome in enumerate(colunas):
+        coluna = tabela.columns.get(nome)
+        if coluna is None:
+            raise ErroBackup(f'Coluna {tabela.name}.{nome} não existe neste banco')
+        processar = coluna.type.dialect_impl(dialeto).bind_processor(dialeto)
+        if isinstance(coluna.type, DateTime):
+            ler = datetime.fromisoformat
+        elif isinstance(coluna.type, Date):
+            ler = date.fromisoformat
+        elif isinstance(coluna.type, JSON):
+            # Backups antigos guardam o JSON das colunas que eram texto
+            ler = _ler_json
+        else:
+            ler = None
+        if ler and processar:
+            conversores.append((posicao, lambda v, ler=ler, processar=processar: processar(ler(v))))
+        elif ler or processar:
+            conversores.append((posicao, ler or processar))
+    return conversores
+
+
+def _ler_json(valor):
+    if not isinstance(valor, str):
+        return valor
+    try:
+        return json.loads(valor)
+    except ValueError:
+        # Texto vazio/inválido já era lido como vazio pelo modelo
+        return None
+
+
+def _converter(linha, conversores):
+    for posicao, converter in conversores:
+        valor = linha[posicao]
+        if valor is not None:
+            linha[posicao] = converter(valor)
+    return linha
+
+
+def _copiar_postgres(conexao, tabela, colunas, linhas):
+    """Carrega um lote com COPY ... FROM STDIN (CSV)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for linha in linhas:
+        escritor.writerow(['\\N' if v is None else json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+                           for v in linha])
+    buffer.seek(0)
+    nomes = ', '.join(f'"{c}"' for c in colunas)
+    cursor = conexao.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY "{tabela.name}" ({nomes}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')', buffer)
+    finally:
+        cursor.close()
+
+
+def _insert_compilado(conexao, tabela, colunas):
+    """INSERT compilado uma vez por tabela, para executemany direto no driver"""
+    compilado = tabela.insert().compile(dialect=conexao.dialect, column_keys=colunas)
+    if compilado.positional:
+        posicoes = [colunas.index(nome) for nome in compilado.positiontup]
+        if posicoes == list(range(len(colunas))):
+            return compilado.string, tuple
+        return compilado.string, lambda valores: tuple(valores[i] for i in posicoes)
+    return compilado.string, lambda valores: dict(zip(colunas, valores))
+
+
+def _carregar_lote(conexao, tabela, colunas, linhas, conversores, insert):
+    if conexao.dialect.name == 'postgresql':
+        # COPY aceita o texto ISO das datas diretamente
+        _copiar_postgres(conexao, tabela, colunas, linhas)
+    else:
+        sql, parametros = insert
+        conexao.exec_driver_sql(sql, [parametros(_converter(l, conversores)) for l in linhas])
+
+
+def _ajustar_sequencias(conexao, tabelas):
+    """No Postgres, avança as sequências dos ids para depois do maior id restaurado"""
+    if conexao.dialect.name != 'postgresql':
+        return
+    for tabela in tabelas:
+        if 'id' in tabela.columns and tabela.columns['id'].autoincrement in (True, 'auto'):
+            conexao.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{tabela.name}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM \"{tabela.name}\"), 0) + 1, false)"
+            ))
+
+
+def restaurar_backup(engine, caminho, progresso=None):
+    """Substitui todo o conteúdo do banco pelo do backup, em uma única transação
+
+    Retorna {tabela: linhas restauradas}.
+    """
+    tabelas = {t.name: t for t in _tabelas()}
+    VersaoDados = _estado['VersaoDados']
+    contagem = {}
+    with gzip.open(caminho, 'rt', encoding='utf-8') as arquivo, engine.begin() as conexao:
+        cabecalho = json.loads(arquivo.readline() or '{}')
+        if cabecalho.get('formato') != FORMATO:
+            raise ErroBackup('Arquivo não é um backup do Brainrot Manager')
+        if cabecalho.get('versao_formato', 0) > VERSAO_FORMATO:
+            raise ErroBackup(f'Formato de backup {cabecalho["versao_formato"]} não suportado')
+        desconhecidas = [t for t in cabecalho['tabelas'] if t not in tabelas]
+        if desconhecidas:
+            raise ErroBackup(f'Tabelas desconhecidas no backup: {", ".join(desconhecidas)}')
+
+        versao_anterior = conexao.execute(select(func.max(VersaoDados.__table__.c.versao))).scalar() or 0
+
+        # Apaga filhos antes dos pais
+        for tabela in reversed(list(tabelas.values())):
+            conexao.execute(tabela.delete())
+
+        tabela = colunas = conversores = insert = None
+        lote = []
+        for texto in arquivo:
+            if texto.startswith('['):
+                lote.append(json.loads(texto))
+                if len(lote) >= LOTE:
+                    _carregar_lote(conexao, tabela, colunas, lote, conversores, insert)
+                    contagem[tabela.name] += len(lote)
+                    lote = []
+                continue
+            marcador = json.loads(texto)
+            if 'tabela' in marcador:
+                tabela = tabelas[marcador['tabela']]
+                colunas = marcador['colunas']
+                conversores = _conversores(tabela, colunas, conexao.dialect)
+                insert = _insert_compilado(conexao, tabela, colunas)
+                contagem[tabela.name] = 0
+            elif 'fim_tabela' in marcador:
+                if lote:
+                    _carregar_lote(conexao, tabela, colunas, lote, conversores, insert)
+                    contagem[tabela.name] += len(lote)
+                    lote = []
+                if contagem[tabela.name] != marcador['linhas']:
+                    raise ErroBackup(f'Backup incompleto na tabela {tabela.name}')
+                if progresso:
+                    progresso(tabela.name, contagem[tabela.name])
+        if set(contagem) != set(cabecalho['tabelas']):
+            raise ErroBackup('Backup incompleto (arquivo truncado)')
+
+        _ajustar_sequencias(conexao, tabelas.values())
+
+        # A versão precisa subir além da anterior: caches dos workers são chaveados por ela
+        tabela_versao = VersaoDados.__table__
+        restaurada = conexao.execute(select(func.max(tabela_versao.c.versao))).scalar() or 0
+        nova = max(versao_anterior, restaurada) + 1
+        conexao.execute(tabela_versao.delete())
+        conexao.execute(tabela_versao.insert().values(id=1, versao=nova))
+        # Clientes da sincronização incremental (?since=) precisam recarregar tudo
+        registrar_reinicio(conexao, nova)
+    return contagem
+
+
+def init_backup(app, db, VersaoDados):
+    """Registra os comandos `flask backup criar` e `flask backup restaurar`"""
+    _estado.update(db=db, VersaoDados=VersaoDados)
+
+    @app.cli.group('backup')
+    def backup_cli():
+        """Backup e restauração completos do banco"""
+
+    @backup_cli.command('criar')
+    @click.argument('caminho', default='backup.jsonl.gz')
+    def criar_command(caminho):
+        """Grava todas as tabelas em um arquivo .jsonl.gz"""
+        import time
+        inicio = time.perf_counter()
+        contagem = criar_backup(db.engine, caminho)
+        for nome, linhas in contagem.items():
+            print(f"  {nome:<24} {linhas:>10} linha(s)")
+        print(f"Backup gravado em {caminho} ({time.perf_counter() - inicio:.1f}s)")
+
+    @backup_cli.command('restaurar')
+    @click.argument('caminho')
+    @click.option('--sim', is_flag=True, help='Confirma a substituição de TODOS os dados atuais')
+    def restaurar_command(caminho, sim):
+        """Substitui todos os dados do banco pelos do backup"""
+        import time
+        if not sim:
+            raise click.ClickException('A restauração apaga todos os dados atuais. Use --sim para confirmar.')
+        inicio = time.perf_counter()
+        try:
+            restaurar_backup(db.engine, caminho,
+                             progresso=lambda nome, linhas: print(f"  {nome:<24} {linhas:>10} linha(s)"))
+        except ErroBackup as e:
+            raise click.ClickException(str(e))
+        print(f"Backup restaurado em {time.perf_counter() - inicio:.1f}s")
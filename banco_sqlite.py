@@ -0,0 +1,72 @@
+"""Modo SQLite (instalações de um único servidor, sem Postgres)
+
+Para engines SQLite, cada conexão nova recebe os PRAGMAs abaixo (configuráveis por
+variável de ambiente):
+
+    SQLITE_JOURNAL_MODE   'WAL' (padrão): leitores não bloqueiam o escritor e vice-versa
+    SQLITE_SYNCHRONOUS    'NORMAL' (padrão): seguro com WAL, fsync só nos checkpoints
+    SQLITE_CACHE_MB       Cache de páginas por conexão (padrão 64)
+    SQLITE_MMAP_MB        Leitura do arquivo por mmap (padrão 256, 0 desativa)
+    SQLITE_BUSY_TIMEOUT_MS  Espera pelo lock de escrita antes de 'database is locked' (padrão 5000)
+
+Concorrência entre workers: o SQLite aceita um escritor por vez. Uma transação que começa
+lendo (BEGIN comum) e depois tenta escrever pode falhar na hora com SQLITE_BUSY, sem esperar
+o busy_timeout, se outro worker escreveu nesse meio tempo. Por isso as requisições que
+escrevem (POST/PUT/PATCH/DELETE) abrem a transação com BEGIN IMMEDIATE: pegam o lock de
+escrita no início e, se ele estiver ocupado, esperam até SQLITE_BUSY_TIMEOUT_MS. As leituras
+continuam com BEGIN comum e nunca esperam.
+"""
+import os
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+METODOS_ESCRITA = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def _configurar_conexao(app):
+    config = app.config
+
+    def _ao_conectar(dbapi_connection, connection_record):
+        # O pysqlite não emite BEGIN sozinho; o evento 'begin' abaixo decide o tipo
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+            cursor.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+            cursor.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+            # Valor negativo = tamanho em KiB
+            cursor.execute(f"PRAGMA cache_size = {-int(config['SQLITE_CACHE_MB'] * 1024)}")
+            cursor.execute(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_MB'] * 1024 * 1024)}")
+            cursor.execute("PRAGMA temp_store = MEMORY")
+        finally:
+            cursor.close()
+
+    return _ao_conectar
+
+
+def _ao_iniciar_transacao(conn):
+    if has_request_context() and request.method in METODOS_ESCRITA:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    else:
+        conn.exec_driver_sql("BEGIN")
+
+
+def e_sqlite(engine):
+    return engine.dialect.name == 'sqlite'
+
+
+def init_sqlite(app, db):
+    """Aplica os PRAGMAs e a estratégia de transação em todos os engines SQLite do app"""
+    app.config.setdefault('SQLITE_JOURNAL_MODE', os.getenv('SQLITE_JOURNAL_MODE', 'WAL'))
+    app.config.setdefault('SQLITE_SYNCHRONOUS', os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'))
+    app.config.setdefault('SQLITE_CACHE_MB', float(os.getenv('SQLITE_CACHE_MB', 64)))
+    app.config.setdefault('SQLITE_MMAP_MB', float(os.getenv('SQLITE_MMAP_MB', 256)))
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)))
+
+    with app.app_context():
+        engines = [engine for engine in db.engines.values() if e_sqlite(engine)]
+    ao_conectar = _configurar_conexao(app)
+    for engine in engines:
+        event.listen(engine, 'connect', ao_conectar)
+        event.listen(engine, 'begin', _ao_iniciar_transacao)
@@ -0,0 +1,368 @@
+"""Benchmark dos endpoints do Brainrot Manager com dados sintéticos
+
+Popula um banco local (SQLite por padrão, ou Postgres via --database-url) com
+brainrots, contas, eventos, tags e histórico, mede a latência (p50/p95/p99) e a
+quantidade de consultas SQL de cada endpoint de routes.py e grava o resultado em
+JSON para comparar regressões entre commits.
+
+Uso:
+    python benchmarks/bench_endpoints.py --brainrots 10000 --contas 1000
+    python benchmarks/bench_endpoints.py --output atual.json --comparar base.json
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark dos endpoints com dados sintéticos')
+    parser.add_argument('--brainrots', type=int, default=1000, help='Quantidade de brainrots (ex: 1000, 10000, 100000)')
+    parser.add_argument('--contas', type=int, default=100, help='Quantidade de contas')
+    parser.add_argument('--nomes-unicos', type=float, default=0.15,
+                        help='Proporção de nomes únicos em relação ao total (duplicação realista)')
+    parser.add_argument('--historico', type=int, default=None,
+                        help='Quantidade de registros de histórico (padrão: igual ao número de brainrots)')
+    parser.add_argument('--repeticoes', type=int, default=20, help='Repetições por endpoint')
+    parser.add_argument('--aquecimento', type=int, default=2, help='Execuções descartadas antes de medir')
+    parser.add_argument('--import-linhas', type=int, default=200, help='Linhas do arquivo usado no benchmark de importação')
+    parser.add_argument('--database-url', default=None,
+                        help='URL do banco local (padrão: SQLite temporário). O banco é recriado!')
+    parser.add_argument('--seed', type=int, default=42, help='Semente do gerador aleatório')
+    parser.add_argument('--output', default='bench_results.json', help='Arquivo JSON de saída')
+    parser.add_argument('--comparar', default=None, help='JSON de uma execução anterior para comparar')
+    return parser.parse_args()
+
+
+def commit_atual():
+    """Retorna o hash do commit atual (ou None fora de um repositório git)"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ_PROJETO, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def percentil(valores, p):
+    """Percentil por interpolação linear (valores já ordenados)"""
+    if not valores:
+        return 0.0
+    k = (len(valores) - 1) * (p / 100.0)
+    inferior = int(k)
+    superior = min(inferior + 1, len(valores) - 1)
+    return valores[inferior] + (valores[superior] - valores[inferior]) * (k - inferior)
+
+
+def popular_banco(db, models, args, rng):
+    """Insere os dados sintéticos em lote (sem passar pelos endpoints)"""
+    brainrot_conta = models['brainrot_conta']
+    Brainrot, Conta, Especie = models['Brainrot'], models['Conta'], models['Especie']
+    HistoricoAlteracao, Meta = models['HistoricoAlteracao'], models['Meta']
+    RARIDADES, EVENTOS = models['RARIDADES'], models['EVENTOS']
+    ORDEM_RARIDADES = models['ORDEM_RARIDADES']
+
+    db.drop_all()
+    db.create_all()
+
+    total_nomes = max(1, int(args.brainrots * args.nomes_unicos))
+    especies = [(f'Brainrot {i:06d}', rng.choice(RARIDADES), f'https://img.exemplo/{i}.png')
+                for i in range(total_nomes)]
+    tags_disponiveis = ['troca', 'guardar', 'vender', 'raro', 'evento', 'meta']
+    agora = datetime.utcnow()
+
+    # Catálogo de espécies (ids 1..total_nomes, na ordem da lista)
+    db.session.execute(Especie.__table__.insert(), [{
+        'nome': nome,
+        'nome_chave': nome.lower(),
+        'raridade': raridade,
+        'foto': foto,
+        'data_criacao': agora,
+        'data_atualizacao': agora,
+    } for nome, raridade, foto in especies])
+
+    lote = 5000
+    linhas = []
+    for i in range(args.brainrots):
+        especie_id = rng.randrange(total_nomes)
+        nome, raridade, foto = especies[especie_id]
+        valor = rng.choice([1, 1000, 1000000, 1000000000]) * rng.uniform(1, 999)
+        if valor >= 1000000000:
+            formatado = f'${valor / 1000000000:.1f}B/s'
+        elif valor >= 1000000:
+            formatado = f'${valor / 1000000:.1f}M/s'
+        elif valor >= 1000:
+            formatado = f'${valor / 1000:.1f}K/s'
+        else:
+            formatado = f'${valor:.0f}/s'
+        linhas.append({
+            'nome': nome,
+            'especie_id': especie_id + 1,
+            'raridade': raridade,
+            'raridade_ordem': ORDEM_RARIDADES.get(raridade, 0),
+            'valor_por_segundo': valor,
+            'valor_formatado': formatado,
+            'quantidade': rng.randint(1, 5),
+            'numero_mutacoes': rng.randint(0, 4),
+            'eventos': json.dumps(rng.sample(EVENTOS, rng.randint(0, 3))),
+            'ordem': rng.randint(0, 50),
+            'campos_personalizados': {},
+            'favorito': rng.random() < 0.1,
+            'tags': json.dumps(rng.sample(tags_disponiveis, rng.randint(0, 2))),
+            'data_criacao': agora - timedelta(minutes=i),
+            'data_atualizacao': agora - timedelta(minutes=i),
+        })
+        if len(linhas) >= lote:
+            db.session.execute(Brainrot.__table__.insert(), linhas)
+            linhas = []
+    if linhas:
+        db.session.execute(Brainrot.__table__.insert(), linhas)
+
+    db.session.execute(Conta.__table__.insert(), [{
+        'nome': f'Conta {i:05d}',
+        'roblox_id': str(100000 + i),
+        'espacos': rng.choice([0, 10, 20, 40]),
+        'data_criacao': agora,
+        'data_atualizacao': agora,
+    } for i in range(args.contas)])
+
+    # Cada brainrot em 0-2 contas
+    associacoes = []
+    for brainrot_id in range(1, args.brainrots + 1):
+        for conta_id in rng.sample(range(1, args.contas + 1), min(args.contas, rng.randint(0, 2))):
+            associacoes.append({'brainrot_id': brainrot_id, 'conta_id': conta_id})
+        if len(associacoes) >= lote:
+            db.session.execute(brainrot_conta.insert(), associacoes)
+            associacoes = []
+    if associacoes:
+        db.session.execute(brainrot_conta.insert(), associacoes)
+
+    total_historico = args.brainrots if args.historico is None else args.historico
+    historico = []
+    for i in range(total_historico):
+        historico.append({
+            'tipo_entidade': 'brainrot',
+            'entidade_id': rng.randint(1, max(1, args.brainrots)),
+            'acao': rng.choice(['criar', 'editar', 'editar', 'excluir']),
+            'dados_novos': json.dumps({'nome': rng.choice(especies)[0]}),
+            'data_alteracao': agora - timedelta(seconds=i),
+        })
+        if len(historico) >= lote:
+            db.session.execute(HistoricoAlteracao.__table__.insert(), historico)
+            historico = []
+    if historico:
+        db.session.execute(HistoricoAlteracao.__table__.insert(), historico)
+
+    db.session.execute(Meta.__table__.insert(), [{
+        'nome': f'Meta {i}',
+        'tipo': rng.choice(['raridade', 'quantidade', 'valor', 'evento']),
+        'valor_alvo': rng.randint(10, 1000),
+        'valor_atual': 0,
+        'concluida': False,
+        'data_criacao': agora,
+    } for i in range(20)])
+
+    db.session.commit()
+    return especies
+
+
+class ContadorConsultas:
+    """Conta as consultas SQL executadas pelo engine"""
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.total += 1
+
+
+def medir(client, contador, nome, metodo, url, repeticoes, aquecimento, **kwargs):
+    """Executa o endpoint várias vezes e devolve latências e contagem de consultas"""
+    fabrica = kwargs.pop('fabrica_kwargs', None)
+    for _ in range(aquecimento):
+        extra = fabrica() if fabrica else kwargs
+        getattr(client, metodo)(url, **extra)
+
+    tempos = []
+    consultas = []
+    status = None
+    for _ in range(repeticoes):
+        extra = fabrica() if fabrica else kwargs
+        antes = contador.total
+        inicio = time.perf_counter()
+        resposta = getattr(client, metodo)(url, **extra)
+        resposta.get_data()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        consultas.append(contador.total - antes)
+        status = resposta.status_code
+
+    tempos.sort()
+    resultado = {
+        'endpoint': nome,
+        'metodo': metodo.upper(),
+        'url': url,
+        'status': status,
+        'repeticoes': repeticoes,
+        'p50_ms': round(percentil(tempos, 50), 3),
+        'p95_ms': round(percentil(tempos, 95), 3),
+        'p99_ms': round(percentil(tempos, 99), 3),
+        'media_ms': round(statistics.fmean(tempos), 3),
+        'min_ms': round(tempos[0], 3),
+        'max_ms': round(tempos[-1], 3),
+        'consultas_sql': max(consultas) if consultas else 0,
+    }
+    print(f"  {nome:<40} p50={resultado['p50_ms']:>9.2f}ms  p95={resultado['p95_ms']:>9.2f}ms  "
+          f"sql={resultado['consultas_sql']:>6}  status={status}")
+    return resultado
+
+
+def comparar(atual, anterior_path):
+    """Mostra a variação de p50 e consultas em relação a uma execução anterior"""
+    with open(anterior_path, encoding='utf-8') as f:
+        anterior = json.load(f)
+    anteriores = {r['endpoint']: r for r in anterior.get('resultados', [])}
+    print(f"\nComparação com {anterior_path} (commit {anterior.get('commit')}):")
+    for r in atual['resultados']:
+        base = anteriores.get(r['endpoint'])
+        if not base:
+            continue
+        variacao = ((r['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100) if base['p50_ms'] else 0.0
+        print(f"  {r['endpoint']:<40} p50 {base['p50_ms']:>9.2f} -> {r['p50_ms']:>9.2f}ms ({variacao:+6.1f}%)  "
+              f"sql {base['consultas_sql']} -> {r['consultas_sql']}")
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    args.output = os.path.abspath(args.output)
+    if args.comparar:
+        args.comparar = os.path.abspath(args.comparar)
+
+    # Configurar o banco ANTES de importar o app (app.py lê DATABASE_URL na importação)
+    pasta_temp = None
+    database_url = args.database_url
+    if not database_url:
+        pasta_temp = tempfile.mkdtemp(prefix='brainrot_bench_')
+        database_url = 'sqlite:///' + os.path.join(pasta_temp, 'bench.db')
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, RAIZ_PROJETO)
+    os.chdir(RAIZ_PROJETO)
+
+    from sqlalchemy import event
+    from app import app, db
+    import app as app_module
+    import routes
+    import models
+
+    app.config['LOGIN_DISABLED'] = True
+    app.config['TESTING'] = True
+
+    modelos = {
+        'brainrot_conta': app_module.brainrot_conta,
+        'Brainrot': app_module.Brainrot,
+        'Especie': app_module.Especie,
+        'Conta': app_module.Conta,
+        'HistoricoAlteracao': app_module.HistoricoAlteracao,
+        'Meta': app_module.Meta,
+        'RARIDADES': models.RARIDADES,
+        'ORDEM_RARIDADES': models.ORDEM_RARIDADES,
+        'EVENTOS': routes.EVENTOS,
+    }
+
+    with app.app_context():
+        print(f"Populando {args.brainrots} brainrots / {args.contas} contas em {database_url} ...")
+        inicio = time.perf_counter()
+        especies = popular_banco(db, modelos, args, rng)
+        tempo_seed = time.perf_counter() - inicio
+        print(f"Dados gerados em {tempo_seed:.1f}s")
+
+        contador = ContadorConsultas()
+        event.listen(db.engine, 'before_cursor_execute', contador)
+
+    client = app.test_client()
+    nome_exemplo = especies[0][0]
+    ids_bulk = list(range(1, min(args.brainrots, 100) + 1))
+
+    def arquivo_import():
+        itens = [{
+            'nome': rng.choice(especies)[0],
+            'raridade': rng.choice(models.RARIDADES),
+            'valor_formatado': '$10K/s',
+            'valor_por_segundo': 10000,
+            'quantidade': 1,
+            'eventos': ['Gold'],
+        } for _ in range(args.import_linhas)]
+        conteudo = io.BytesIO(json.dumps(itens).encode('utf-8'))
+        return {'data': {'file': (conteudo, 'import.json')}, 'content_type': 'multipart/form-data'}
+
+    casos = [
+        ('index', 'get', '/', {}),
+        ('brainrots_list', 'get', '/brainrots', {}),
+        ('api_brainrots_list', 'get', '/api/brainrots', {}),
+        ('api_brainrots_list?busca', 'get', f'/api/brainrots?busca={nome_exemplo[:12]}', {}),
+        ('api_brainrots_list?raridade', 'get', '/api/brainrots?raridade=OG', {}),
+        ('api_brainrots_list?valor_formato', 'get', '/api/brainrots?valor_formato=M/s', {}),
+        ('api_brainrots_list?valor_min_max', 'get', '/api/brainrots?valor_min=1000&valor_max=1000000', {}),
+        ('api_brainrots_list?quantidade', 'get', '/api/brainrots?quantidade_min=2&quantidade_max=4', {}),
+        ('api_brainrots_list?mutacoes', 'get', '/api/brainrots?mutacoes_min=1&mutacoes_max=2', {}),
+        ('api_brainrots_list?evento', 'get', '/api/brainrots?evento=Gold', {}),
+        ('api_brainrots_list?tag', 'get', '/api/brainrots?tag=troca&evento=Gold', {}),
+        ('api_brainrots_list?conta_id', 'get', '/api/brainrots?conta_id=1', {}),
+        ('api_brainrots_typeahead', 'get', '/api/brainrots/typeahead?q=Brainrot%200', {}),
+        ('api_contas_list', 'get', '/api/contas', {}),
+        ('api_historico_list', 'get', '/api/historico', {}),
+        ('api_metas_list', 'get', '/api/metas', {}),
+        ('api_export_brainrots?json', 'get', '/api/export/brainrots?format=json', {}),
+        ('api_export_brainrots?csv', 'get', '/api/export/brainrots?format=csv', {}),
+        ('api_export_contas?json', 'get', '/api/export/contas?format=json', {}),
+        ('api_export_contas?csv', 'get', '/api/export/contas?format=csv', {}),
+        ('api_bulk_action?favorito', 'post', '/api/brainrots/bulk',
+         {'json': {'action': 'favorito', 'ids': ids_bulk, 'favorito': True}}),
+        ('api_bulk_action?tag', 'post', '/api/brainrots/bulk',
+         {'json': {'action': 'tag', 'ids': ids_bulk, 'tags': ['bench']}}),
+        ('api_import_brainrots', 'post', '/api/import/brainrots', {'fabrica_kwargs': arquivo_import}),
+    ]
+
+    print(f"\nMedindo {len(casos)} endpoints ({args.repeticoes} repetições cada):")
+    resultados = []
+    for nome, metodo, url, kwargs in casos:
+        # Endpoints de escrita crescem o banco; medir com menos repetições
+        repeticoes = args.repeticoes if metodo == 'get' else max(1, args.repeticoes // 4)
+        resultados.append(medir(client, contador, nome, metodo, url, repeticoes, args.aquecimento, **kwargs))
+
+    saida = {
+        'commit': commit_atual(),
+        'data': datetime.utcnow().isoformat(),
+        'banco': database_url.split(':', 1)[0],
+        'python': sys.version.split()[0],
+        'parametros': {
+            'brainrots': args.brainrots,
+            'contas': args.contas,
+            'nomes_unicos': args.nomes_unicos,
+            'historico': args.brainrots if args.historico is None else args.historico,
+            'repeticoes': args.repeticoes,
+            'import_linhas': args.import_linhas,
+            'seed': args.seed,
+        },
+        'tempo_seed_s': round(tempo_seed, 3),
+        'resultados': resultados,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(saida, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados salvos em {args.output}")
+
+    if args.comparar:
+        comparar(saida, args.comparar)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Teste de carga: `gunicorn app:app` (Procfile antigo) x `gunicorn -c gunicorn.conf.py`
+
+Popula um banco local com os dados sintéticos de bench_endpoints.py, sobe o gunicorn
+em cada configuração, faz login uma vez e dispara requisições concorrentes (várias
+threads, sem pausa) contra uma mistura de endpoints de leitura por alguns segundos.
+Mostra vazão (req/s), latência p50/p95 e erros de cada configuração.
+
+Com o SQLite local as consultas não esperam rede, ao contrário de um Postgres gerenciado;
+--latencia-banco-ms acrescenta essa espera (time.sleep antes de cada consulta, dentro do
+servidor) para reproduzir a carga dominada por I/O em que as threads fazem diferença.
+
+Uso:
+    python benchmarks/bench_gunicorn.py --brainrots 5000 --concorrencia 16 --duracao 20
+    python benchmarks/bench_gunicorn.py --latencia-banco-ms 0      # sem latência simulada
+    WEB_CONCURRENCY=4 GUNICORN_THREADS=8 python benchmarks/bench_gunicorn.py
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_endpoints import percentil, popular_banco  # noqa: E402
+
+APP = 'bench_gunicorn:app_com_latencia()'
+
+CENARIOS = (
+    # -c os.devnull: sem isso o gunicorn carregaria ./gunicorn.conf.py automaticamente
+    ('Procfile antigo (gunicorn app:app)', ['gunicorn', '-c', os.devnull, '-b', '127.0.0.1:{porta}', APP], {}),
+    ('gunicorn.conf.py', ['gunicorn', '-c', 'gunicorn.conf.py', APP], {'PORT': '{porta}'}),
+)
+
+
+def app_com_latencia():
+    """Fábrica usada pelo gunicorn: o app real com a latência de rede simulada no banco"""
+    from sqlalchemy import event
+    from app import app, db
+    atraso = float(os.getenv('BENCH_LATENCIA_BANCO_MS', '0')) / 1000
+    if atraso:
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', lambda *args: time.sleep(atraso))
+    return app
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Teste de carga das configurações do gunicorn')
+    parser.add_argument('--brainrots', type=int, default=5000, help='Quantidade de brainrots')
+    parser.add_argument('--contas', type=int, default=200, help='Quantidade de contas')
+    parser.add_argument('--nomes-unicos', type=float, default=0.15, help='Proporção de nomes únicos')
+    parser.add_argument('--concorrencia', type=int, default=16, help='Clientes simultâneos')
+    parser.add_argument('--duracao', type=float, default=20.0, help='Segundos de carga por cenário')
+    parser.add_argument('--latencia-banco-ms', type=float, default=2.0,
+                        help='Latência de rede simulada por consulta SQL (padrão 2 ms)')
+    parser.add_argument('--database-url', default=None,
+                        help='URL do banco local (padrão: SQLite temporário). O banco é recriado!')
+    parser.add_argument('--seed', type=int, default=42, help='Semente do gerador aleatório')
+    args = parser.parse_args()
+    args.historico = 0
+    return args
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def aguardar(url, limite=60):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.25)
+    raise RuntimeError(f'Servidor não respondeu em {limite}s: {url}')
+
+
+def cookie_de_sessao(base):
+    """Faz login e devolve o cabeçalho Cookie para as requisições de carga"""
+    from auth import ADMIN_EMAIL, ADMIN_PASSWORD
+    cookies = CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cookies))
+    dados = urllib.parse.urlencode({'email': ADMIN_EMAIL, 'password': ADMIN_PASSWORD}).encode()
+    opener.open(base + '/login', dados).read()
+    return '; '.join(f'{c.name}={c.value}' for c in cookies)
+
+
+def carga(base, urls, cookie, concorrencia, duracao):
+    """Dispara requisições por `duracao` segundos; retorna (latências em ms, erros)"""
+    latencias, erros = [], [0]
+    trava = threading.Lock()
+    fim = time.monotonic() + duracao
+
+    def cliente(semente):
+        rng = random.Random(semente)
+        locais = []
+        falhas = 0
+        while time.monotonic() < fim:
+            pedido = urllib.request.Request(base + rng.choice(urls), headers={'Cookie': cookie})
+            inicio = time.perf_counter()
+            try:
+                with urllib.request.urlopen(pedido, timeout=30) as resposta:
+                    resposta.read()
+                locais.append((time.perf_counter() - inicio) * 1000)
+            except (urllib.error.URLError, ConnectionError, OSError):
+                falhas += 1
+        with trava:
+            latencias.extend(locais)
+            erros[0] += falhas
+
+    threads = [threading.Thread(target=cliente, args=(i,)) for i in range(concorrencia)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sorted(latencias), erros[0]
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='brainrot_bench_'), 'bench.db')
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, RAIZ_PROJETO)
+    os.chdir(RAIZ_PROJETO)
+
+    from app import app, db
+    import app as app_module
+    import models
+    import routes
+
+    modelos = {
+        'brainrot_conta': app_module.brainrot_conta,
+        'Brainrot': app_module.Brainrot,
+        'Especie': app_module.Especie,
+        'Conta': app_module.Conta,
+        'HistoricoAlteracao': app_module.HistoricoAlteracao,
+        'Meta': app_module.Meta,
+        'RARIDADES': models.RARIDADES,
+        'ORDEM_RARIDADES': models.ORDEM_RARIDADES,
+        'EVENTOS': routes.EVENTOS,
+    }
+    with app.app_context():
+        print(f"Populando {args.brainrots} brainrots / {args.contas} contas em {database_url} ...")
+        especies = popular_banco(db, modelos, args, rng)
+        db.engine.dispose()
+
+    nome = urllib.parse.quote(especies[0][0])
+    urls = [
+        '/api/brainrots/typeahead?q=Brainrot%200',
+        f'/api/brainrots/buscar-dados-por-nome?nome={nome}',
+        '/api/brainrots/1/copiar',
+    ]
+
+    resultados = []
+    for titulo, comando, ambiente in CENARIOS:
+        porta = porta_livre()
+        env = dict(os.environ, **{k: v.format(porta=porta) for k, v in ambiente.items()})
+        env.setdefault('GUNICORN_MAX_REQUESTS', '0')
+        env['BENCH_LATENCIA_BANCO_MS'] = str(args.latencia_banco_ms)
+        env['PYTHONPATH'] = os.pathsep.join([RAIZ_PROJETO, os.path.join(RAIZ_PROJETO, 'benchmarks')])
+        processo = subprocess.Popen([c.format(porta=porta) for c in comando], env=env,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base = f'http://127.0.0.1:{porta}'
+        try:
+            aguardar(base + '/login')
+            cookie = cookie_de_sessao(base)
+            carga(base, urls, cookie, args.concorrencia, min(3.0, args.duracao))  # aquecimento
+            latencias, erros = carga(base, urls, cookie, args.concorrencia, args.duracao)
+        finally:
+            processo.terminate()
+            processo.wait(timeout=60)
+        resultados.append((titulo, len(latencias) / args.duracao, percentil(latencias, 50),
+                           percentil(latencias, 95), erros))
+
+    print(f"\n{args.concorrencia} clientes simultâneos, {args.duracao:.0f}s por cenário, {os.cpu_count()} CPU(s), "
+          f"latência simulada do banco {args.latencia_banco_ms:g} ms:")
+    for titulo, vazao, p50, p95, erros in resultados:
+        print(f"  {titulo:<36} {vazao:>8.1f} req/s   p50 {p50:>8.1f} ms   p95 {p95:>8.1f} ms   erros {erros}")
+
+
+if __name__ == '__main__':
+    main()
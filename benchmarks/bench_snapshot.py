@@ -0,0 +1,137 @@
+"""Benchmark de memória e tempo: snapshot em memória x objetos do ORM
+
+Popula um banco local com os mesmos dados sintéticos de bench_endpoints.py e compara,
+para a listagem de brainrots:
+    - memória retida (tracemalloc) pelos objetos Brainrot carregados pelo ORM e pelas
+      linhas do snapshot (snapshot.py), em bytes por linha;
+    - tempo de GET /api/brainrots (com e sem filtro) nos dois caminhos.
+
+Uso:
+    python benchmarks/bench_snapshot.py --brainrots 100000 --contas 1000
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_endpoints import popular_banco  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Memória e tempo do snapshot em memória x ORM')
+    parser.add_argument('--brainrots', type=int, default=20000, help='Quantidade de brainrots')
+    parser.add_argument('--contas', type=int, default=200, help='Quantidade de contas')
+    parser.add_argument('--nomes-unicos', type=float, default=0.15, help='Proporção de nomes únicos')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Repetições por medição de tempo')
+    parser.add_argument('--database-url', default=None,
+                        help='URL do banco local (padrão: SQLite temporário). O banco é recriado!')
+    parser.add_argument('--seed', type=int, default=42, help='Semente do gerador aleatório')
+    args = parser.parse_args()
+    args.historico = 0
+    return args
+
+
+def memoria_retida(carregar):
+    """Bytes alocados (e ainda vivos) por carregar(); retorna (bytes, resultado)"""
+    gc.collect()
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    resultado = carregar()
+    gc.collect()
+    depois = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return depois - antes, resultado
+
+
+def tempo_ms(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='brainrot_bench_'), 'bench.db')
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, RAIZ_PROJETO)
+    os.chdir(RAIZ_PROJETO)
+
+    from app import app, db
+    import app as app_module
+    import models
+    import routes
+    from snapshot import SnapshotBrainrots
+    from versioning import obter_versao
+
+    app.config['LOGIN_DISABLED'] = True
+    app.config['TESTING'] = True
+    modelos = {
+        'brainrot_conta': app_module.brainrot_conta,
+        'Brainrot': app_module.Brainrot,
+        'Especie': app_module.Especie,
+        'Conta': app_module.Conta,
+        'HistoricoAlteracao': app_module.HistoricoAlteracao,
+        'Meta': app_module.Meta,
+        'RARIDADES': models.RARIDADES,
+        'ORDEM_RARIDADES': models.ORDEM_RARIDADES,
+        'EVENTOS': routes.EVENTOS,
+    }
+    Brainrot = app_module.Brainrot
+
+    with app.app_context():
+        print(f"Populando {args.brainrots} brainrots / {args.contas} contas em {database_url} ...")
+        popular_banco(db, modelos, args, rng)
+
+        # Memória: objetos do ORM (com as contas carregadas, como na listagem)
+        def carregar_orm():
+            brainrots = Brainrot.query.all()
+            for br in brainrots:
+                br.contas_carregadas = br.contas.all()
+            return brainrots
+        bytes_orm, brainrots = memoria_retida(carregar_orm)
+        total = len(brainrots)
+        del brainrots
+        db.session.expunge_all()
+
+        # Memória: snapshot compacto
+        def carregar_snapshot():
+            snapshot = SnapshotBrainrots()
+            snapshot.recarregar(obter_versao())
+            return snapshot
+        bytes_snapshot, _ = memoria_retida(carregar_snapshot)
+
+    client = app.test_client()
+    tempos = {}
+    for nome, url in (('sem filtro', '/api/brainrots'), ('raridade=OG', '/api/brainrots?raridade=OG'),
+                      ('evento=Gold', '/api/brainrots?evento=Gold')):
+        for ativo in (False, True):
+            app.config['SNAPSHOT_ATIVO'] = ativo
+            client.get(url)  # aquecimento (carga inicial do snapshot)
+            tempos[(nome, ativo)] = tempo_ms(lambda: client.get(url).get_data(), args.repeticoes)
+
+    print(f"\nMemória retida para {total} brainrots:")
+    print(f"  ORM       {bytes_orm / 1024 / 1024:>9.1f} MB  ({bytes_orm / max(total, 1):>7.0f} bytes/linha)")
+    print(f"  Snapshot  {bytes_snapshot / 1024 / 1024:>9.1f} MB  ({bytes_snapshot / max(total, 1):>7.0f} bytes/linha)")
+    print(f"  Redução   {bytes_orm / max(bytes_snapshot, 1):>9.1f}x")
+    print("\nGET /api/brainrots (mediana):")
+    for nome in ('sem filtro', 'raridade=OG', 'evento=Gold'):
+        print(f"  {nome:<12} ORM {tempos[(nome, False)]:>9.1f} ms   snapshot {tempos[(nome, True)]:>9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Cache LRU em memória (por processo) com limite de itens e, opcionalmente, de bytes"""
+import threading
+from collections import OrderedDict
+
+from metrics import registrar_cache
+
+
+class CacheLRU:
+    """Cache LRU thread-safe; registra hits/misses nas métricas com o nome informado
+
+    Com max_bytes, `medir(valor)` dá o tamanho de cada item e os menos usados saem até o
+    total caber no limite (um item maior que o limite inteiro não é guardado).
+    """
+
+    def __init__(self, nome, max_itens=256, max_bytes=None, medir=None):
+        self.nome = nome
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self.medir = medir or len
+        self.bytes = 0
+        self._itens = OrderedDict()
+        self._tamanhos = {}
+        self._lock = threading.Lock()
+
+    def get(self, chave, padrao=None):
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                registrar_cache(self.nome, True)
+                return self._itens[chave]
+        registrar_cache(self.nome, False)
+        return padrao
+
+    def set(self, chave, valor):
+        tamanho = self.medir(valor) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and tamanho > self.max_bytes:
+            return
+        with self._lock:
+            self.bytes += tamanho - self._tamanhos.get(chave, 0)
+            self._itens[chave] = valor
+            self._tamanhos[chave] = tamanho
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                antiga, _ = self._itens.popitem(last=False)
+                self.bytes -= self._tamanhos.pop(antiga)
+
+    def obter_ou_calcular(self, chave, calcular):
+        """Retorna o valor em cache ou calcula, guarda e retorna"""
+        sentinela = object()
+        valor = self.get(chave, sentinela)
+        if valor is sentinela:
+            valor = calcular()
+            self.set(chave, valor)
+        return valor
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._tamanhos.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._itens)
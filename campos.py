@@ -0,0 +1,278 @@
+"""Campos personalizados tipados: normalização na gravação, filtros e índices por campo
+
+brainrot.campos_personalizados é uma coluna JSON (JSONB no Postgres, com o índice GIN
+ix_brainrot_campos_personalizados; texto JSON no SQLite). A cada flush, os valores dos
+campos declarados em CampoPersonalizado são gravados no tipo do campo:
+
+    'numero'    número JSON (1.5, 10)
+    'data'      texto 'AAAA-MM-DD' (aceita também 'DD/MM/AAAA')
+    'booleano'  true/false (aceita sim/não, 1/0, on/off)
+    'texto'     texto
+
+Valores que não convertem ficam como foram enviados e não entram nos filtros tipados.
+
+Filtros da listagem (request.args ou filtro salvo), pelo nome do campo declarado:
+
+    campo.<nome>=<valor>        igualdade (todos os tipos)
+    campo.<nome>.min=<valor>    limite inferior (numero, data)
+    campo.<nome>.max=<valor>    limite superior (numero, data)
+
+No Postgres a igualdade vira `campos_personalizados @> '{"<nome>": <valor>}'` (usa o índice
+GIN) e os limites comparam `campos_personalizados -> '<nome>'`, que tem um índice de
+expressão próprio para cada campo numero/data (ix_brainrot_campo_<id>, criado junto com o
+campo). No SQLite cada campo declarado ganha um índice em
+json_extract(campos_personalizados, '$."<nome>"'), usado nos dois casos.
+"""
+import math
+import re
+from datetime import date, datetime
+
+from sqlalchemy import and_, column, event, func, inspect, literal, select, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+TIPOS = ('texto', 'numero', 'data', 'booleano')
+
+# Tipos com filtro por faixa (.min/.max)
+TIPOS_COM_LIMITES = ('numero', 'data')
+
+PREFIXO_FILTRO = 'campo.'
+OPERADORES_LIMITE = {'min': '>=', 'max': '<='}
+
+VERDADEIROS = {'true', '1', 'sim', 's', 'yes', 'on'}
+FALSOS = {'false', '0', 'não', 'nao', 'n', 'no', 'off'}
+
+DATA_ISO = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+_estado = {}
+
+
+class ErroCampo(ValueError):
+    """Definição de campo personalizado inválida"""
+
+
+def validar_campo(nome, tipo):
+    """Valida nome e tipo de um campo novo; retorna o nome sem espaços nas pontas"""
+    nome = (nome or '').strip()
+    if not nome:
+        raise ErroCampo('Nome do campo é obrigatório')
+    if '"' in nome:
+        # O nome entra entre aspas no caminho JSON do SQLite
+        raise ErroCampo('O nome do campo não pode conter aspas duplas')
+    if tipo not in TIPOS:
+        raise ErroCampo(f"Tipo inválido: {tipo} (use {', '.join(TIPOS)})")
+    return nome
+
+
+def converter_valor(tipo, valor):
+    """Valor no formato gravado para o tipo do campo; ValueError se não converter"""
+    if tipo == 'numero':
+        if isinstance(valor, bool):
+            raise ValueError(valor)
+        if isinstance(valor, str):
+            valor = valor.strip()
+            if valor.count(',') == 1 and '.' not in valor:
+                valor = valor.replace(',', '.')  # Vírgula decimal
+        numero = float(valor)
+        if not math.isfinite(numero):
+            raise ValueError(valor)
+        return int(numero) if numero.is_integer() else numero
+    if tipo == 'data':
+        if isinstance(valor, datetime):
+            return valor.date().isoformat()
+        if isinstance(valor, date):
+            return valor.isoformat()
+        valor = str(valor).strip()
+        if '/' in valor:
+            return datetime.strptime(valor, '%d/%m/%Y').date().isoformat()
+        return datetime.fromisoformat(valor).date().isoformat()
+    if tipo == 'booleano':
+        if isinstance(valor, bool):
+            return valor
+        valor = str(valor).strip().lower()
+        if valor in VERDADEIROS:
+            return True
+        if valor in FALSOS:
+            return False
+        raise ValueError(valor)
+    if tipo == 'texto' and valor is not None and not isinstance(valor, str):
+        return str(valor)
+    return valor
+
+
+def normalizar_campos(campos, tipos):
+    """Converte os valores dos campos declarados ({nome: tipo}); os demais ficam como estão"""
+    normalizados = {}
+    for nome, valor in campos.items():
+        if nome in tipos and valor not in (None, ''):
+            try:
+                valor = converter_valor(tipos[nome], valor)
+            except (TypeError, ValueError):
+                pass
+        normalizados[nome] = valor
+    return normalizados
+
+
+def tipos_declarados(session=None):
+    """{nome: tipo} dos campos declarados"""
+    CampoPersonalizado = _estado['CampoPersonalizado']
+    session = session or _estado['db'].session
+    return dict(session.execute(select(CampoPersonalizado.nome, CampoPersonalizado.tipo)).all())
+
+
+def ler_filtros_campos(filtros):
+    """Filtros campo.<nome>[.min|.max] -> lista ordenada de (nome, tipo, operador, valor)
+
+    Como nos demais filtros da listagem, campos não declarados e valores que não
+    convertem para o tipo do campo são ignorados.
+    """
+    chaves = [chave for chave in filtros if chave.startswith(PREFIXO_FILTRO)]
+    if not chaves:
+        return []
+    tipos = tipos_declarados()
+    resultado = []
+    for chave in chaves:
+        nome, operador = chave[len(PREFIXO_FILTRO):], '='
+        if nome not in tipos:
+            nome, _, sufixo = nome.rpartition('.')
+            operador = OPERADORES_LIMITE.get(sufixo)
+            if operador is None or tipos.get(nome) not in TIPOS_COM_LIMITES:
+                continue
+        if '"' in nome:
+            continue
+        valor = filtros.get(chave)
+        if valor is None or (isinstance(valor, str) and not valor.strip()):
+            continue
+        try:
+            valor = converter_valor(tipos[nome], valor)
+        except (TypeError, ValueError):
+            continue
+        resultado.append((nome, tipos[nome], operador, valor))
+    return sorted(resultado, key=lambda filtro: filtro[:3])
+
+
+# ---------- SQL ----------
+
+def _caminho_sqlite(nome):
+    return f'$."{nome}"'
+
+
+def _valor_do_campo(coluna, nome, dialeto):
+    """Expressão com o valor do campo; o nome vai como literal no SQL para casar com o índice"""
+    if dialeto == 'postgresql':
+        return coluna.op('->', return_type=JSONB)(literal(nome, literal_execute=True))
+    return func.json_extract(coluna, literal(_caminho_sqlite(nome), literal_execute=True))
+
+
+def _tipo_confere_sql(coluna, nome, tipo, dialeto, valor_campo):
+    """Condição que restringe a comparação aos valores gravados no tipo do campo"""
+    if dialeto == 'postgresql':
+        tipo_json = func.jsonb_typeof(valor_campo)
+        if tipo == 'numero':
+            return tipo_json == 'number'
+        texto = coluna.op('->>')(literal(nome, literal_execute=True))
+        return and_(tipo_json == 'string', texto.op('~')(DATA_ISO.pattern))
+    tipo_json = func.json_type(coluna, literal(_caminho_sqlite(nome), literal_execute=True))
+    if tipo == 'numero':
+        return tipo_json.in_(('integer', 'real'))
+    return and_(tipo_json == 'text',
+                valor_campo.op('GLOB')('[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'))
+
+
+def condicao_campo(coluna, filtro, dialeto):
+    """Condição SQL de um filtro (nome, tipo, operador, valor) de ler_filtros_campos()"""
+    nome, tipo, operador, valor = filtro
+    valor_campo = _valor_do_campo(coluna, nome, dialeto)
+    if operador == '=':
+        if dialeto == 'postgresql':
+            # Contém {nome: valor}: só casa com o mesmo tipo JSON e usa o índice GIN
+            return coluna.op('@>')(literal({nome: valor}, JSONB))
+        caminho = literal(_caminho_sqlite(nome), literal_execute=True)
+        if isinstance(valor, bool):
+            # json_extract devolve 1/0 para true/false; json_type separa do número
+            return and_(valor_campo == int(valor), func.json_type(coluna, caminho) == ('true' if valor else 'false'))
+        tipos_sqlite = ('integer', 'real') if tipo == 'numero' else ('text',)
+        return and_(valor_campo == valor, func.json_type(coluna, caminho).in_(tipos_sqlite))
+    limite = literal(valor, JSONB) if dialeto == 'postgresql' else valor
+    comparacao = valor_campo >= limite if operador == '>=' else valor_campo <= limite
+    return and_(comparacao, _tipo_confere_sql(coluna, nome, tipo, dialeto, valor_campo))
+
+
+def aplicar_filtros_campos(query, coluna, filtros):
+    """Aplica os filtros de ler_filtros_campos() à query"""
+    dialeto = _estado['db'].engine.dialect.name
+    for filtro in filtros:
+        query = query.filter(condicao_campo(coluna, filtro, dialeto))
+    return query
+
+
+# ---------- Em memória (snapshot) ----------
+
+def _tipo_confere(tipo, valor):
+    if tipo == 'numero':
+        return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+    if tipo == 'booleano':
+        return isinstance(valor, bool)
+    if tipo == 'data':
+        return isinstance(valor, str) and DATA_ISO.match(valor) is not None
+    return isinstance(valor, str)
+
+
+def atende_filtro(campos, filtro):
+    """Equivalente em memória de condicao_campo() para um dicionário de campos"""
+    nome, tipo, operador, esperado = filtro
+    valor = campos.get(nome) if isinstance(campos, dict) else None
+    if not _tipo_confere(tipo, valor):
+        return False
+    if operador == '=':
+        return valor == esperado
+    return valor >= esperado if operador == '>=' else valor <= esperado
+
+
+# ---------- Índices por campo ----------
+
+def nome_indice(campo_id):
+    return f'ix_brainrot_campo_{campo_id}'
+
+
+def criar_indice_campo(conexao, campo_id, nome, tipo):
+    """Cria o índice de expressão do campo (no Postgres só numero/data; igualdade usa o GIN)
+
+    Retorna se o campo tem índice próprio.
+    """
+    dialeto = conexao.dialect.name
+    if '"' in nome or (dialeto == 'postgresql' and tipo not in TIPOS_COM_LIMITES):
+        return False
+    expressao = _valor_do_campo(column('campos_personalizados'), nome, dialeto).compile(
+        dialect=conexao.dialect, compile_kwargs={'literal_binds': True})
+    conexao.execute(text(f'CREATE INDEX IF NOT EXISTS {nome_indice(campo_id)} ON brainrot (({expressao}))'))
+    return True
+
+
+def criar_indices_campos(conexao):
+    """Cria os índices que faltam para todos os campos declarados; retorna quantos campos têm índice"""
+    CampoPersonalizado = _estado['CampoPersonalizado']
+    campos = conexao.execute(select(CampoPersonalizado.id, CampoPersonalizado.nome, CampoPersonalizado.tipo)).all()
+    return sum(criar_indice_campo(conexao, *campo) for campo in campos)
+
+
+def init_campos(app, db, Brainrot, CampoPersonalizado):
+    """Registra a normalização dos campos no flush e o comando que recria os índices"""
+    _estado.update(db=db, Brainrot=Brainrot, CampoPersonalizado=CampoPersonalizado)
+
+    @event.listens_for(db.session, 'before_flush')
+    def _normalizar_campos(session, flush_context, instances):
+        alterados = [obj for obj in (*session.new, *session.dirty)
+                     if isinstance(obj, Brainrot) and isinstance(obj.campos_personalizados, dict)
+                     and inspect(obj).attrs.campos_personalizados.history.has_changes()]
+        if not alterados:
+            return
+        with session.no_autoflush:
+            tipos = tipos_declarados(session)
+        for brainrot in alterados:
+            brainrot.campos_personalizados = normalizar_campos(brainrot.campos_personalizados, tipos)
+
+    @app.cli.command('campos-indices')
+    def campos_indices_command():
+        """Cria os índices de expressão dos campos personalizados declarados"""
+        with db.engine.begin() as conexao:
+            print(f"{criar_indices_campos(conexao)} campo(s) com índice")
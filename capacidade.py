@@ -0,0 +1,121 @@
+"""Verificação de espaços das contas, segura sob concorrência
+
+Toda alteração de associações brainrot <-> conta passa por verificar_capacidade():
+    1. trava as linhas das contas afetadas (SELECT ... FOR UPDATE, sempre na ordem do id,
+       para evitar deadlock entre requisições concorrentes);
+    2. calcula a ocupação de todas elas em uma única consulta agregada;
+    3. confere quais dos brainrots adicionados/removidos já estão associados (uma consulta).
+
+São sempre no máximo três consultas, independente de quantas contas ou brainrots.
+Como as contas ficam travadas até o commit, duas requisições não conseguem lotar a
+mesma conta ao mesmo tempo.
+"""
+from collections import defaultdict
+
+from sqlalchemy import func, select
+
+_estado = {}
+
+
+class ErroCapacidade(ValueError):
+    """Uma ou mais contas ficariam acima do número de espaços"""
+
+    def __init__(self, mensagem, contas_cheias):
+        super().__init__(mensagem)
+        self.contas_cheias = contas_cheias
+
+
+def init_capacidade(db, Conta, brainrot_conta):
+    _estado.update(db=db, Conta=Conta, brainrot_conta=brainrot_conta)
+
+
+def bloquear_contas(conta_ids):
+    """Trava as linhas das contas (até o fim da transação) e retorna {id: (nome, espacos)}"""
+    db, Conta = _estado['db'], _estado['Conta']
+    conta_ids = sorted(set(conta_ids))
+    if not conta_ids:
+        return {}
+    linhas = db.session.execute(
+        select(Conta.id, Conta.nome, Conta.espacos)
+        .where(Conta.id.in_(conta_ids))
+        .order_by(Conta.id)
+        .with_for_update()
+    ).all()
+    return {linha.id: (linha.nome, linha.espacos or 0) for linha in linhas}
+
+
+def verificar_capacidade(adicoes, remocoes=None):
+    """Verifica se as contas comportam as alterações; lança ErroCapacidade se não
+
+    adicoes: {conta_id: ids de brainrots a associar}
+    remocoes: {conta_id: ids de brainrots a desassociar}
+    Retorna {conta_id: ocupação final} das contas com limite de espaços.
+    """
+    db, tabela = _estado['db'], _estado['brainrot_conta']
+    adicoes = {c: set(ids) for c, ids in adicoes.items() if ids}
+    remocoes = {c: set(ids) for c, ids in (remocoes or {}).items() if ids}
+    if not adicoes:
+        # Só remoções nunca estouram o limite
+        return {}
+
+    contas = bloquear_contas(set(adicoes) | set(remocoes))
+    limitadas = [c for c in adicoes if contas.get(c, (None, 0))[1] > 0]
+    if not limitadas:
+        return {}
+
+    # Ocupação atual de todas as contas limitadas (uma consulta)
+    ocupacao = dict(db.session.execute(
+        select(tabela.c.conta_id, func.count())
+        .where(tabela.c.conta_id.in_(limitadas))
+        .group_by(tabela.c.conta_id)
+    ).all())
+
+    # Quais dos pares tocados já existem (uma consulta)
+    pares = {(c, b) for c in limitadas for b in adicoes.get(c, ())}
+    pares |= {(c, b) for c in limitadas for b in remocoes.get(c, ())}
+    existentes = set()
+    if pares:
+        brainrot_ids = {b for _, b in pares}
+        existentes = {
+            (linha.conta_id, linha.brainrot_id)
+            for linha in db.session.execute(
+                select(tabela.c.conta_id, tabela.c.brainrot_id)
+                .where(tabela.c.conta_id.in_(limitadas), tabela.c.brainrot_id.in_(brainrot_ids))
+            )
+        }
+
+    final = {}
+    cheias = []
+    for conta_id in limitadas:
+        nome, espacos = contas[conta_id]
+        novos = sum(1 for b in adicoes[conta_id] if (conta_id, b) not in existentes)
+        saindo = sum(1 for b in remocoes.get(conta_id, ()) if (conta_id, b) in existentes)
+        final[conta_id] = ocupacao.get(conta_id, 0) + novos - saindo
+        if final[conta_id] > espacos:
+            cheias.append((conta_id, nome, espacos, final[conta_id]))
+
+    if cheias:
+        if len(cheias) == 1:
+            _, nome, espacos, total = cheias[0]
+            mensagem = (f'A conta "{nome}" tem apenas {espacos} espaço(s), '
+                        f'mas ficaria com {total} brainrot(s).')
+        else:
+            mensagem = f'As seguintes contas estão cheias: {", ".join(c[1] for c in cheias)}'
+        raise ErroCapacidade(mensagem, [c[0] for c in cheias])
+
+    return final
+
+
+def ocupacao_contas(conta_ids):
+    """Ocupação atual de várias contas em uma única consulta agregada (sem travar)"""
+    db, tabela = _estado['db'], _estado['brainrot_conta']
+    conta_ids = list(set(conta_ids))
+    if not conta_ids:
+        return {}
+    resultado = defaultdict(int)
+    resultado.update(db.session.execute(
+        select(tabela.c.conta_id, func.count())
+        .where(tabela.c.conta_id.in_(conta_ids))
+        .group_by(tabela.c.conta_id)
+    ).all())
+    return resultado
@@ -0,0 +1,112 @@
+"""Catálogo de espécies (nome, raridade e foto) referenciado por cada brainrot
+
+Cada Brainrot é uma instância de uma Especie (brainrot.especie_id). O vínculo é mantido
+automaticamente a cada flush: brainrots novos ou renomeados são ligados à espécie com
+o mesmo nome (chave_especie), criada na hora se ainda não existir. Todas as espécies
+necessárias em um flush são buscadas em uma única consulta, então importações grandes
+não fazem uma consulta por linha.
+
+Com isso, agrupar por nome vira comparar inteiros, trocar a foto altera uma única
+linha (Especie.foto) e buscar os dados de um nome é uma leitura pela chave única.
+"""
+from sqlalchemy import event, inspect, select, text
+
+from models import chave_especie
+
+# Quantidade máxima de chaves por IN (...) ao buscar espécies
+LOTE_CHAVES = 500
+
+_estado = {}
+
+
+def _precisa_vincular(brainrot):
+    especie = brainrot.especie
+    return (especie is None
+            or especie.nome_chave != chave_especie(brainrot.nome)
+            or brainrot.__dict__.get('_foto_pendente'))
+
+
+def buscar_especies(session, chaves):
+    """Retorna {nome_chave: Especie} para as chaves que já existem no catálogo"""
+    Especie = _estado['Especie']
+    chaves = list(chaves)
+    encontradas = {}
+    with session.no_autoflush:
+        for inicio in range(0, len(chaves), LOTE_CHAVES):
+            lote = chaves[inicio:inicio + LOTE_CHAVES]
+            for especie in session.scalars(select(Especie).where(Especie.nome_chave.in_(lote))):
+                encontradas[especie.nome_chave] = especie
+    return encontradas
+
+
+def vincular_especies(session, brainrots):
+    """Liga cada brainrot à espécie do seu nome (criando as que faltam) e aplica fotos pendentes"""
+    Especie = _estado['Especie']
+    chaves = {chave_especie(br.nome) for br in brainrots}
+    especies = buscar_especies(session, chaves)
+    for br in brainrots:
+        chave = chave_especie(br.nome)
+        especie = especies.get(chave)
+        if especie is None:
+            especie = Especie(nome=(br.nome or '').strip(), nome_chave=chave, raridade=br.raridade or 'Comum')
+            session.add(especie)
+            especies[chave] = especie
+        if br.especie is not especie:
+            br.especie = especie
+        foto = br.__dict__.pop('_foto_pendente', None)
+        if foto:
+            especie.foto = foto
+
+
+def consolidar_especies(lote=1000):
+    """Liga ao catálogo os brainrots ainda sem espécie (bancos criados sem a migração)
+
+    Se a tabela ainda tiver a coluna antiga brainrot.foto, as fotos vão para as espécies.
+    Retorna a quantidade de brainrots vinculados.
+    """
+    db, Brainrot = _estado['db'], _estado['Brainrot']
+    fotos = {}
+    if 'foto' in {coluna['name'] for coluna in inspect(db.engine).get_columns('brainrot')}:
+        fotos = dict(db.session.execute(text(
+            "SELECT id, foto FROM brainrot WHERE especie_id IS NULL AND foto IS NOT NULL AND foto <> ''"
+        )).all())
+    total = 0
+    while True:
+        brainrots = Brainrot.query.filter(Brainrot.especie_id.is_(None)).order_by(Brainrot.id).limit(lote).all()
+        if not brainrots:
+            return total
+        for br in brainrots:
+            if fotos.get(br.id):
+                br.__dict__['_foto_pendente'] = fotos[br.id]
+        vincular_especies(db.session, brainrots)
+        db.session.flush()
+        total += len(brainrots)
+
+
+def especie_por_nome(nome):
+    """Espécie do catálogo com esse nome (sem diferenciar maiúsculas), ou None"""
+    db, Especie = _estado['db'], _estado['Especie']
+    return db.session.execute(
+        select(Especie).where(Especie.nome_chave == chave_especie(nome))
+    ).scalar_one_or_none()
+
+
+def init_catalogo(db, Brainrot, Especie):
+    """Registra o listener que mantém brainrot.especie_id coerente com o nome"""
+    _estado.update(db=db, Brainrot=Brainrot, Especie=Especie)
+
+    @event.listens_for(db.session, 'before_flush')
+    def _vincular_ao_catalogo(session, flush_context, instances):
+        brainrots = [obj for obj in session.new if isinstance(obj, Brainrot)]
+        for obj in session.dirty:
+            if not isinstance(obj, Brainrot) or obj in session.deleted:
+                continue
+            estado = inspect(obj)
+            if 'raridade' in estado.committed_state and obj.especie is not None \
+                    and obj.especie.nome_chave == chave_especie(obj.nome):
+                # Raridade editada em uma instância vale para a espécie
+                obj.especie.raridade = obj.raridade
+            if _precisa_vincular(obj):
+                brainrots.append(obj)
+        if brainrots:
+            vincular_especies(session, brainrots)
@@ -0,0 +1,319 @@
+"""Feed de alterações em tempo real (Server-Sent Events em GET /api/events)
+
+Cada transação confirmada que cria, altera ou exclui brainrots, contas ou espécies gera
+uma mensagem compacta com a nova versão dos dados:
+
+    id: 42
+    event: alteracao
+    data: {"versao": 42, "alteracoes": [{"entidade": "brainrot", "id": 7, "acao": "atualizar"}]}
+
+Acima de EVENTOS_MAX_ALTERACOES itens (ações em lote) a lista vai vazia com
+"completo": false, e o cliente recarrega o que precisar.
+
+Entrega entre workers:
+    - Postgres: a mensagem é publicada com NOTIFY depois do commit; cada worker tem uma
+      thread com LISTEN que repassa para as conexões SSE locais (inclusive no worker que
+      fez a escrita).
+    - Outros bancos (SQLite): a mensagem vai direto para as conexões do próprio worker, e
+      uma thread confere versao_dados a cada EVENTOS_INTERVALO_VERSAO_S; se outro worker
+      mudou os dados, envia {"versao": N, "alteracoes": [], "completo": false}.
+
+Cada conexão tem uma fila limitada (EVENTOS_FILA_MAX). Um cliente lento que deixa a
+fila encher perde as mensagens pendentes e recebe um evento 'reset' (recarregar tudo),
+sem travar a publicação para os demais. Sem mensagens, um comentário de heartbeat sai a
+cada EVENTOS_HEARTBEAT_S. Cada conexão ocupa uma thread do worker: há um limite por
+worker (EVENTOS_MAX_CONEXOES, acima dele 503) e cada stream dura no máximo
+EVENTOS_DURACAO_MAX_S (o EventSource reconecta sozinho). No gunicorn os dois vêm do
+worker (ajustar_ao_servidor): o limite deixa sempre uma thread livre para as demais
+requisições (no modo sync, com uma thread só, /api/events responde sempre 503 e a página
+recarrega a lista por conta própria) e o stream termina antes do timeout do worker.
+"""
+import json
+import logging
+import os
+import queue
+import select as select_io
+import threading
+import time
+
+from flask import Response, current_app, request
+from sqlalchemy import event, func, select
+
+from metrics import definir_tamanho_fila
+
+logger = logging.getLogger('brainrot.eventos')
+
+CANAL = 'brainrot_eventos'
+
+# Fração do timeout do gunicorn que um stream pode durar
+FRACAO_TIMEOUT = 0.8
+
+# Marcador colocado na fila de um assinante que ficou para trás
+_TRANSBORDO = object()
+
+_estado = {}
+
+
+class Assinante:
+    """Uma conexão SSE: fila limitada de mensagens ainda não enviadas"""
+
+    def __init__(self, tamanho_fila):
+        self.fila = queue.Queue(maxsize=tamanho_fila)
+
+    def entregar(self, mensagem):
+        try:
+            self.fila.put_nowait(mensagem)
+        except queue.Full:
+            # Cliente lento: descarta o que estava pendente e pede para recarregar
+            while True:
+                try:
+                    self.fila.get_nowait()
+                except queue.Empty:
+                    break
+            self.fila.put_nowait(_TRANSBORDO)
+
+
+class Distribuidor:
+    """Repassa as mensagens para todas as conexões SSE deste worker"""
+
+    def __init__(self):
+        self._assinantes = set()
+        self._trava = threading.Lock()
+        self.ultima_versao = 0
+
+    def __len__(self):
+        return len(self._assinantes)
+
+    def adicionar(self, assinante):
+        with self._trava:
+            self._assinantes.add(assinante)
+            definir_tamanho_fila('sse_conexoes', len(self._assinantes))
+
+    def remover(self, assinante):
+        with self._trava:
+            self._assinantes.discard(assinante)
+            definir_tamanho_fila('sse_conexoes', len(self._assinantes))
+
+    def publicar(self, mensagem):
+        with self._trava:
+            if mensagem['versao'] and mensagem['versao'] <= self.ultima_versao and mensagem['alteracoes'] == []:
+                return
+            self.ultima_versao = max(self.ultima_versao, mensagem['versao'] or 0)
+            assinantes = list(self._assinantes)
+        for assinante in assinantes:
+            assinante.entregar(mensagem)
+
+
+distribuidor = Distribuidor()
+
+
+def registrar_alteracao(entidade, ids, acao):
+    """Registra alterações feitas fora do ORM (ex: associações em lote) na transação atual"""
+    pendentes = _estado['db'].session.info.setdefault('eventos_pendentes', {})
+    for id_ in ids:
+        pendentes.setdefault((entidade, id_), acao)
+
+
+def _mensagem(versao, pendentes, limite):
+    alteracoes = [{'entidade': entidade, 'id': id_, 'acao': acao} for (entidade, id_), acao in pendentes.items()]
+    if len(alteracoes) > limite:
+        return {'versao': versao, 'alteracoes': [], 'completo': False}
+    return {'versao': versao, 'alteracoes': alteracoes}
+
+
+def _publicar(mensagem):
+    db = _estado['db']
+    engine = db.engines[None]
+    if engine.dialect.name != 'postgresql':
+        distribuidor.publicar(mensagem)
+        return
+    try:
+        with engine.connect() as conexao:
+            conexao.execute(select(func.pg_notify(CANAL, json.dumps(mensagem, separators=(',', ':')))))
+            conexao.commit()
+    except Exception as e:
+        # A escrita já foi confirmada; sem NOTIFY os outros workers só veem a versão nova depois
+        logger.warning(f"Falha ao publicar evento: {e}")
+        distribuidor.publicar(mensagem)
+
+
+def _ouvir_postgres(app):
+    """Thread do worker: LISTEN no canal e repasse para as conexões locais"""
+    espera = 1
+    while True:
+        try:
+            with app.app_context():
+                conexao = _estado['db'].engines[None].raw_connection()
+            try:
+                conexao.driver_connection.autocommit = True
+                cursor = conexao.cursor()
+                cursor.execute(f"LISTEN {CANAL}")
+                espera = 1
+                while True:
+                    if select_io.select([conexao.driver_connection], [], [], 30) == ([], [], []):
+                        continue
+                    conexao.driver_connection.poll()
+                    while conexao.driver_connection.notifies:
+                        notificacao = conexao.driver_connection.notifies.pop(0)
+                        distribuidor.publicar(json.loads(notificacao.payload))
+            finally:
+                conexao.invalidate()
+        except Exception as e:
+            logger.warning(f"LISTEN {CANAL} interrompido ({e}); nova tentativa em {espera}s")
+            time.sleep(espera)
+            espera = min(espera * 2, 30)
+
+
+def _vigiar_versao(app):
+    """Thread do worker (bancos sem NOTIFY): detecta escritas feitas por outros workers"""
+    VersaoDados = _estado['VersaoDados']
+    consulta = select(VersaoDados.__table__.c.versao).where(VersaoDados.__table__.c.id == 1)
+    while True:
+        time.sleep(app.config['EVENTOS_INTERVALO_VERSAO_S'])
+        if not len(distribuidor):
+            continue
+        try:
+            with app.app_context():
+                with _estado['db'].engines[None].connect() as conexao:
+                    versao = conexao.execute(consulta).scalar() or 0
+        except Exception as e:
+            logger.warning(f"Falha ao consultar a versão dos dados: {e}")
+            continue
+        if versao > distribuidor.ultima_versao:
+            distribuidor.publicar({'versao': versao, 'alteracoes': [], 'completo': False})
+
+
+def _iniciar_thread(app):
+    with _estado['trava']:
+        if _estado.get('thread_pid') == os.getpid():
+            return
+        with app.app_context():
+            postgres = _estado['db'].engines[None].dialect.name == 'postgresql'
+        alvo = _ouvir_postgres if postgres else _vigiar_versao
+        threading.Thread(target=alvo, args=(app,), name='brainrot-eventos', daemon=True).start()
+        # Por pid: depois do fork do gunicorn cada worker inicia a sua
+        _estado['thread_pid'] = os.getpid()
+
+
+def _sse(nome, dados, id_=None):
+    linhas = [f"id: {id_}"] if id_ is not None else []
+    linhas += [f"event: {nome}", f"data: {json.dumps(dados, separators=(',', ':'))}"]
+    return '\n'.join(linhas) + '\n\n'
+
+
+def stream_eventos(versao_atual):
+    """Resposta SSE para GET /api/events (503 se o worker já estiver no limite de conexões)"""
+    app = current_app._get_current_object()
+    config = app.config
+    if len(distribuidor) >= config['EVENTOS_MAX_CONEXOES']:
+        return Response('Muitas conexões de eventos neste worker', status=503,
+                        headers={'Retry-After': str(int(config['EVENTOS_HEARTBEAT_S']))})
+    _iniciar_thread(app)
+    # O stream pode durar minutos: não segurar conexão/transação do banco enquanto isso
+    _estado['db'].session.close()
+    distribuidor.ultima_versao = max(distribuidor.ultima_versao, versao_atual)
+
+    ultimo_id = request.headers.get('Last-Event-ID', type=int)
+    assinante = Assinante(config['EVENTOS_FILA_MAX'])
+    distribuidor.adicionar(assinante)
+
+    def gerar():
+        fim = time.monotonic() + config['EVENTOS_DURACAO_MAX_S']
+        try:
+            yield f"retry: {int(config['EVENTOS_RECONEXAO_MS'])}\n\n"
+            # Reconexão depois de perder mensagens: o cliente precisa recarregar
+            if ultimo_id is not None and ultimo_id < versao_atual:
+                yield _sse('reset', {'versao': versao_atual}, versao_atual)
+            else:
+                yield _sse('versao', {'versao': versao_atual}, versao_atual)
+            while True:
+                restante = fim - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    # Nunca esperar além do fim do stream (que fica abaixo do timeout do worker)
+                    mensagem = assinante.fila.get(timeout=min(config['EVENTOS_HEARTBEAT_S'], restante))
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+                    continue
+                if mensagem is _TRANSBORDO:
+                    yield _sse('reset', {'versao': distribuidor.ultima_versao}, distribuidor.ultima_versao)
+                else:
+                    yield _sse('alteracao', mensagem, mensagem['versao'])
+        finally:
+            distribuidor.remover(assinante)
+
+    return Response(gerar(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def ajustar_ao_servidor(app, threads, timeout):
+    """Limites do SSE para um worker do gunicorn com `threads` threads e `timeout` segundos
+
+    Sem EVENTOS_MAX_CONEXOES no ambiente o limite é threads - 1; com ele, o menor dos dois.
+    """
+    config = app.config
+    livres = max(0, threads - 1)
+    if 'EVENTOS_MAX_CONEXOES' in os.environ:
+        livres = min(livres, config['EVENTOS_MAX_CONEXOES'])
+    config['EVENTOS_MAX_CONEXOES'] = livres
+    if timeout:
+        config['EVENTOS_DURACAO_MAX_S'] = min(config['EVENTOS_DURACAO_MAX_S'], timeout * FRACAO_TIMEOUT)
+
+
+def init_eventos(app, db, VersaoDados, modelos):
+    """Registra a coleta de alterações por transação e a publicação após o commit
+
+    modelos: {classe do modelo: nome da entidade nas mensagens}
+    """
+    _estado.update(db=db, VersaoDados=VersaoDados, trava=threading.Lock())
+    app.config.setdefault('EVENTOS_FILA_MAX', int(os.getenv('EVENTOS_FILA_MAX', 256)))
+    app.config.setdefault('EVENTOS_HEARTBEAT_S', float(os.getenv('EVENTOS_HEARTBEAT_S', 15)))
+    app.config.setdefault('EVENTOS_MAX_CONEXOES', int(os.getenv('EVENTOS_MAX_CONEXOES', 2)))
+    app.config.setdefault('EVENTOS_DURACAO_MAX_S', float(os.getenv('EVENTOS_DURACAO_MAX_S', 300)))
+    app.config.setdefault('EVENTOS_RECONEXAO_MS', int(os.getenv('EVENTOS_RECONEXAO_MS', 3000)))
+    app.config.setdefault('EVENTOS_MAX_ALTERACOES', int(os.getenv('EVENTOS_MAX_ALTERACOES', 100)))
+    app.config.setdefault('EVENTOS_INTERVALO_VERSAO_S', float(os.getenv('EVENTOS_INTERVALO_VERSAO_S', 1)))
+    tipos = tuple(modelos)
+
+    @event.listens_for(db.session, 'after_flush')
+    def _coletar(session, flush_context):
+        pendentes = session.info.setdefault('eventos_pendentes', {})
+        for acao, colecao in (('criar', session.new), ('atualizar', session.dirty), ('excluir', session.deleted)):
+            for obj in colecao:
+                if not isinstance(obj, tipos):
+                    continue
+                if acao == 'atualizar' and not session.is_modified(obj, include_collections=True):
+                    continue
+                chave = (modelos[type(obj)], obj.id)
+                # Criar + atualizar na mesma transação continua sendo 'criar'; excluir prevalece
+                if acao == 'excluir' or chave not in pendentes:
+                    pendentes[chave] = acao
+
+    @event.listens_for(db.session, 'after_transaction_create')
+    def _abrir_savepoint(session, transacao):
+        # Cópia das pendências para restaurar se o savepoint for desfeito
+        if transacao.nested:
+            savepoints = session.info.setdefault('eventos_savepoints', {})
+            savepoints[transacao] = dict(session.info.get('eventos_pendentes', {}))
+
+    @event.listens_for(db.session, 'after_commit')
+    def _publicar_apos_commit(session):
+        # Liberar um savepoint também dispara after_commit: só publica no commit de verdade
+        if session.in_nested_transaction():
+            return
+        session.info.pop('eventos_savepoints', None)
+        pendentes = session.info.pop('eventos_pendentes', None)
+        versao = session.info.pop('versao_nova', None)
+        if pendentes:
+            _publicar(_mensagem(versao, pendentes, app.config['EVENTOS_MAX_ALTERACOES']))
+
+    @event.listens_for(db.session, 'after_soft_rollback')
+    def _descartar(session, previous_transaction):
+        if previous_transaction.nested:
+            anteriores = session.info.get('eventos_savepoints', {}).pop(previous_transaction, None)
+            if anteriores is not None:
+                session.info['eventos_pendentes'] = anteriores
+            return
+        session.info.pop('eventos_pendentes', None)
+        session.info.pop('eventos_savepoints', None)
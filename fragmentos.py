@@ -0,0 +1,63 @@
+"""Cache de fragmentos de template (HTML já renderizado) pela versão dos dados
+
+Nos templates, um bloco caro fica dentro de:
+
+    {% call fragmento('index:top30') %}
+        {% set top_30_brainrots = carregar_top_30() %}
+        ...
+    {% endcall %}
+
+O HTML do bloco é guardado em um CacheLRU do worker com a chave (nome, partes extras,
+versão dos dados). Qualquer escrita em brainrots, contas ou espécies muda a versão, e o
+bloco é renderizado de novo no próximo acesso (as versões antigas saem pelo LRU). Os dados
+do bloco são carregados dentro dele, por funções passadas pela view, para que um acerto
+não consulte o banco. O conteúdo não pode depender do usuário nem de dados fora da versão
+(ex: metas).
+
+FRAGMENTOS_MAX_MB limita a memória ocupada pelo HTML em cache (padrão 16 MB por worker);
+FRAGMENTOS_ATIVO=0 desativa o cache.
+"""
+import os
+import sys
+
+from markupsafe import Markup
+
+from cache import CacheLRU
+from versioning import obter_versao
+
+_estado = {}
+
+
+def sob_demanda(calcular):
+    """Função que calcula na primeira chamada e reaproveita o resultado (dados de vários blocos)"""
+    resultado = []
+
+    def obter():
+        if not resultado:
+            resultado.append(calcular())
+        return resultado[0]
+    return obter
+
+
+def fragmento(nome, *partes, caller):
+    """Global do Jinja usado com {% call fragmento(nome, ...) %}"""
+    cache = _estado.get('cache')
+    if cache is None:
+        return caller()
+    chave = (nome, partes, obter_versao())
+    html = cache.get(chave)
+    if html is None:
+        html = str(caller())
+        cache.set(chave, html)
+    return Markup(html)
+
+
+def init_fragmentos(app):
+    """Registra o global 'fragmento' nos templates"""
+    app.config.setdefault('FRAGMENTOS_ATIVO', os.getenv('FRAGMENTOS_ATIVO', '1') == '1')
+    app.config.setdefault('FRAGMENTOS_MAX_MB', float(os.getenv('FRAGMENTOS_MAX_MB', 16)))
+    if app.config['FRAGMENTOS_ATIVO']:
+        _estado['cache'] = CacheLRU('fragmentos', max_itens=4096,
+                                    max_bytes=int(app.config['FRAGMENTOS_MAX_MB'] * 1024 * 1024),
+                                    medir=sys.getsizeof)
+    app.jinja_env.globals['fragmento'] = fragmento
@@ -0,0 +1,130 @@
+"""Configuração do gunicorn para produção (carregada com `gunicorn -c gunicorn.conf.py app:app`)
+
+- Workers e threads calculados a partir das CPUs e da memória disponíveis (respeitando os
+  limites do container/cgroup), com variáveis de ambiente para sobrescrever.
+- Modo `gthread` por padrão: as requisições passam a maior parte do tempo esperando o
+  banco, então algumas threads por worker aumentam a vazão sem multiplicar a memória.
+- `preload_app`: o app (e o init_db) é carregado uma única vez no processo master; os
+  workers herdam o código por fork e descartam as conexões do banco herdadas.
+- max_requests com jitter para reciclar workers sem reiniciar todos ao mesmo tempo, e
+  graceful_timeout para terminar as requisições em andamento em deploys.
+- Tempo de inicialização de cada worker registrado no log (hook post_worker_init).
+- Limites do feed SSE (/api/events) ajustados às threads e ao timeout do worker: no modo
+  `sync` (uma thread) o feed fica desativado, para um stream não travar o worker.
+
+Variáveis de ambiente:
+    PORT                        Porta (padrão 5000)
+    WEB_CONCURRENCY             Número de workers (padrão: calculado)
+    GUNICORN_WORKER_CLASS       'gthread' (padrão) ou 'sync'
+    GUNICORN_THREADS            Threads por worker no modo gthread (padrão 4)
+    GUNICORN_MEMORIA_WORKER_MB  Memória estimada por worker para o cálculo (padrão 200)
+    GUNICORN_TIMEOUT            Timeout de requisição em segundos (padrão 60)
+    GUNICORN_GRACEFUL_TIMEOUT   Espera no desligamento em segundos (padrão 30)
+    GUNICORN_MAX_REQUESTS       Requisições até reciclar o worker (padrão 2000, 0 desativa)
+    GUNICORN_PRELOAD            '0' desativa o preload_app
+"""
+import os
+import time
+
+
+def _inteiro(nome, padrao):
+    try:
+        return int(os.getenv(nome, padrao))
+    except ValueError:
+        return padrao
+
+
+def _ler(caminho):
+    try:
+        with open(caminho) as arquivo:
+            return arquivo.read().strip()
+    except OSError:
+        return None
+
+
+def cpus_disponiveis():
+    """CPUs utilizáveis pelo processo (afinidade e cota do cgroup)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    cota = _ler('/sys/fs/cgroup/cpu.max')  # cgroup v2: "<cota> <período>" ou "max <período>"
+    if cota and not cota.startswith('max'):
+        limite, periodo = cota.split()
+        cpus = min(cpus, max(1, int(limite) // int(periodo)))
+    return max(1, cpus)
+
+
+def memoria_disponivel_mb():
+    """Memória disponível em MB (limite do cgroup, se houver, senão a memória física)"""
+    for caminho in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        valor = _ler(caminho)
+        if valor and valor.isdigit() and int(valor) < 1 << 60:
+            return int(valor) // (1024 * 1024)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def calcular_workers(cpus, memoria_mb, memoria_por_worker_mb, modo):
+    """2*CPU+1 workers síncronos (ou CPU+1 com threads), limitado pela memória"""
+    workers = cpus + 1 if modo == 'gthread' else 2 * cpus + 1
+    if memoria_mb:
+        workers = min(workers, max(1, memoria_mb // memoria_por_worker_mb))
+    return max(1, workers)
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = _inteiro('GUNICORN_THREADS', 4) if worker_class == 'gthread' else 1
+workers = _inteiro('WEB_CONCURRENCY', 0) or calcular_workers(
+    cpus_disponiveis(), memoria_disponivel_mb(), _inteiro('GUNICORN_MEMORIA_WORKER_MB', 200), worker_class
+)
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
+
+timeout = _inteiro('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _inteiro('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = 5
+
+# Recicla cada worker depois de N requisições (+ jitter para não reciclar todos juntos)
+max_requests = _inteiro('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """Master: limpa as métricas de execuções anteriores antes de criar os workers"""
+    from metrics import limpar_diretorio_metricas
+    limpar_diretorio_metricas()
+    server.log.info(f"Configuração: {workers} worker(s) {worker_class}, {threads} thread(s) cada, "
+                    f"preload={'sim' if preload_app else 'não'}")
+
+
+def post_fork(server, worker):
+    """Worker recém-criado: descarta as conexões do banco herdadas do master"""
+    worker.inicio_boot = time.perf_counter()
+    if preload_app:
+        from app import app, db
+        with app.app_context():
+            for engine in db.engines.values():
+                # close=False: não fecha os sockets que ainda pertencem ao master
+                engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Ajusta o SSE ao worker e registra quanto tempo ele levou do fork até ficar pronto"""
+    from app import app
+    from eventos import ajustar_ao_servidor
+    ajustar_ao_servidor(app, threads, timeout)
+    duracao_ms = (time.perf_counter() - getattr(worker, 'inicio_boot', time.perf_counter())) * 1000
+    worker.log.info(f"Worker {worker.pid} pronto em {duracao_ms:.0f} ms")
+
+
+def child_exit(server, worker):
+    """Remove os gauges 'live' do worker encerrado do diretório de métricas"""
+    from metrics import marcar_processo_encerrado
+    marcar_processo_encerrado(worker.pid)
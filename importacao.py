@@ -0,0 +1,165 @@
+"""Importação de brainrots com detecção de duplicados por impressão digital
+
+Cada brainrot guarda em brainrot.impressao_digital o SHA-1 da sua forma canônica
+(nome, valor, mutações e eventos; ver models.impressao_digital), calculado no flush.
+A importação processa o arquivo em lotes: para cada lote, as impressões das linhas são
+comparadas com a coluna indexada em uma única consulta (IN), e cada linha é inserida,
+ignorada ou usada para atualizar o brainrot existente, conforme o modo:
+
+    - 'inserir':   insere todas as linhas (comportamento original)
+    - 'pular':     ignora linhas cujo brainrot já existe (no banco ou antes no arquivo)
+    - 'atualizar': atualiza o brainrot existente com os demais campos da linha
+
+Cada linha traz só os campos presentes no arquivo (mais os da impressão): ao inserir,
+os que faltam recebem PADROES_INSERCAO; ao atualizar, ficam como estão no brainrot.
+
+O custo é O(n) no tamanho do arquivo: uma consulta por lote, nunca uma por linha.
+"""
+import json
+
+from sqlalchemy import event, select, text
+
+from models import impressao_digital
+
+MODOS = ('inserir', 'pular', 'atualizar')
+
+# Linhas por lote (uma consulta de impressões + um flush por lote)
+LOTE_IMPORTACAO = 1000
+
+# Campos que formam a impressão digital (não mudam em uma atualização)
+CAMPOS_IMPRESSAO = ('nome', 'valor_formatado', 'valor_por_segundo', 'numero_mutacoes', 'eventos')
+
+# Valores de um brainrot novo para os campos que a linha não trouxe
+PADROES_INSERCAO = {'foto': '', 'raridade': 'Comum', 'quantidade': 1, 'favorito': False}
+
+_estado = {}
+
+
+class ErroImportacao(ValueError):
+    """Parâmetros de importação inválidos"""
+
+
+def impressao_da_linha(campos):
+    """Impressão digital de uma linha do arquivo (mesma regra do brainrot salvo)"""
+    return impressao_digital(campos.get('nome'), campos.get('valor_formatado'), campos.get('valor_por_segundo'),
+                             campos.get('numero_mutacoes'), campos.get('eventos'))
+
+
+def _impressao_do_brainrot(brainrot):
+    return impressao_digital(brainrot.nome, brainrot.valor_formatado, brainrot.valor_por_segundo,
+                             brainrot.numero_mutacoes, brainrot.get_eventos())
+
+
+def _novo_brainrot(campos):
+    Brainrot = _estado['Brainrot']
+    campos = {**PADROES_INSERCAO, **campos}
+    brainrot = Brainrot(**{campo: valor for campo, valor in campos.items() if campo not in ('eventos', 'tags')})
+    if 'eventos' in campos:
+        brainrot.set_eventos(campos['eventos'])
+    if 'tags' in campos:
+        brainrot.set_tags(campos['tags'])
+    return brainrot
+
+
+def _atualizar(brainrot, campos):
+    """Aplica os campos presentes na linha que não fazem parte da impressão; retorna se algo mudou"""
+    alterado = False
+    for campo, valor in campos.items():
+        if campo in CAMPOS_IMPRESSAO:
+            continue
+        if campo == 'tags':
+            if brainrot.get_tags() != valor:
+                brainrot.set_tags(valor)
+                alterado = True
+        elif campo == 'foto':
+            if valor and valor != brainrot.foto:
+                brainrot.foto = valor
+                alterado = True
+        elif getattr(brainrot, campo) != valor:
+            setattr(brainrot, campo, valor)
+            alterado = True
+    return alterado
+
+
+def _existentes(impressoes, carregar):
+    """Brainrots já salvos com essas impressões (uma consulta)
+
+    carregar=False retorna só o conjunto de impressões; True retorna {impressão: Brainrot}
+    com o brainrot de menor id de cada impressão.
+    """
+    db, Brainrot = _estado['db'], _estado['Brainrot']
+    if not carregar:
+        return set(db.session.execute(
+            select(Brainrot.impressao_digital).where(Brainrot.impressao_digital.in_(impressoes)).distinct()
+        ).scalars())
+    encontrados = {}
+    for brainrot in Brainrot.query.filter(Brainrot.impressao_digital.in_(impressoes)).order_by(Brainrot.id):
+        encontrados.setdefault(brainrot.impressao_digital, brainrot)
+    return encontrados
+
+
+def importar_brainrots(linhas, modo='inserir', lote=LOTE_IMPORTACAO):
+    """Importa linhas já convertidas (dicionários de campos do Brainrot)
+
+    Retorna {'inseridos', 'atualizados', 'ignorados'}. Não faz commit.
+    """
+    if modo not in MODOS:
+        raise ErroImportacao(f'Modo de importação inválido: {modo} (use {", ".join(MODOS)})')
+    db = _estado['db']
+    relatorio = {'inseridos': 0, 'atualizados': 0, 'ignorados': 0}
+    # Impressões já vistas neste arquivo: {impressão: Brainrot} (ou True no modo 'pular')
+    vistos = {}
+    for inicio in range(0, len(linhas), lote):
+        parte = linhas[inicio:inicio + lote]
+        impressoes = [impressao_da_linha(campos) for campos in parte]
+        if modo != 'inserir':
+            novas = {impressao for impressao in impressoes if impressao not in vistos}
+            if novas:
+                existentes = _existentes(novas, carregar=modo == 'atualizar')
+                vistos.update(existentes if modo == 'atualizar' else dict.fromkeys(existentes, True))
+        for campos, impressao in zip(parte, impressoes):
+            existente = vistos.get(impressao)
+            if existente is None:
+                brainrot = _novo_brainrot(campos)
+                db.session.add(brainrot)
+                relatorio['inseridos'] += 1
+                if modo != 'inserir':
+                    vistos[impressao] = brainrot if modo == 'atualizar' else True
+            elif modo == 'atualizar' and _atualizar(existente, campos):
+                relatorio['atualizados'] += 1
+            else:
+                relatorio['ignorados'] += 1
+        db.session.flush()
+    return relatorio
+
+
+def recalcular_impressoes(somente_vazias=True, lote=LOTE_IMPORTACAO):
+    """Preenche brainrot.impressao_digital (ex: linhas inseridas fora do ORM); retorna o total"""
+    db, Brainrot = _estado['db'], _estado['Brainrot']
+    tabela = Brainrot.__table__
+    consulta = select(tabela.c.id, tabela.c.nome, tabela.c.valor_formatado, tabela.c.valor_por_segundo,
+                      tabela.c.numero_mutacoes, tabela.c.eventos).order_by(tabela.c.id)
+    if somente_vazias:
+        consulta = consulta.where(tabela.c.impressao_digital.is_(None))
+    pares = []
+    for id_, nome, valor_formatado, valor_por_segundo, mutacoes, eventos in db.session.execute(consulta).all():
+        try:
+            lista = json.loads(eventos) if eventos else []
+        except ValueError:
+            lista = []
+        pares.append({'impressao': impressao_digital(nome, valor_formatado, valor_por_segundo, mutacoes, lista),
+                      'brainrot_id': id_})
+    for inicio in range(0, len(pares), lote):
+        db.session.execute(text("UPDATE brainrot SET impressao_digital = :impressao WHERE id = :brainrot_id"),
+                           pares[inicio:inicio + lote])
+    return len(pares)
+
+
+def init_importacao(db, Brainrot):
+    """Registra os eventos que mantêm brainrot.impressao_digital atualizada"""
+    _estado.update(db=db, Brainrot=Brainrot)
+
+    @event.listens_for(Brainrot, 'before_insert')
+    @event.listens_for(Brainrot, 'before_update')
+    def _atualizar_impressao(mapper, connection, brainrot):
+        brainrot.impressao_digital = _impressao_do_brainrot(brainrot)
@@ -0,0 +1,161 @@
+"""Instrumentação por requisição: contagem/tempo de SQL, Server-Timing e detecção de N+1"""
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+
+from flask import g, has_app_context, request, template_rendered, before_render_template
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('brainrot.instrumentation')
+
+# Normalização de SQL para identificar o "formato" da consulta (ignora valores e listas IN)
+_RE_LISTA_IN = re.compile(r'\bIN\s*\((?:[^()]|\([^()]*\))*\)', re.IGNORECASE)
+_RE_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_RE_ESPACOS = re.compile(r'\s+')
+
+
+def formato_consulta(statement):
+    """Retorna a consulta normalizada (sem literais) para agrupar consultas repetidas"""
+    forma = _RE_LISTA_IN.sub('IN (?)', statement)
+    forma = _RE_LITERAL.sub('?', forma)
+    return _RE_ESPACOS.sub(' ', forma).strip()
+
+
+def _stats():
+    """Retorna as estatísticas da requisição atual (ou None fora de uma requisição)"""
+    if not has_app_context():
+        return None
+    return g.get('_instrumentacao')
+
+
+class _JSONProviderInstrumentado(DefaultJSONProvider):
+    """Provider JSON que mede o tempo gasto serializando respostas"""
+
+    def dumps(self, obj, **kwargs):
+        stats = _stats()
+        if stats is None:
+            return super().dumps(obj, **kwargs)
+        inicio = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            stats['serialize_ms'] += (time.perf_counter() - inicio) * 1000
+
+
+def _antes_cursor(conn, cursor, statement, parameters, context, executemany):
+    stats = _stats()
+    if stats is not None:
+        conn.info.setdefault('_inicio_consulta', []).append(time.perf_counter())
+
+
+def _depois_cursor(conn, cursor, statement, parameters, context, executemany):
+    stats = _stats()
+    if stats is None:
+        return
+    inicios = conn.info.get('_inicio_consulta')
+    if not inicios:
+        return
+    duracao = (time.perf_counter() - inicios.pop()) * 1000
+    stats['db_ms'] += duracao
+    stats['consultas'] += 1
+    stats['formatos'][formato_consulta(statement)] += 1
+    if duracao >= stats['limite_consulta_lenta_ms']:
+        stats['consultas_lentas'].append({
+            'duracao_ms': round(duracao, 2),
+            'sql': _RE_ESPACOS.sub(' ', statement)[:500]
+        })
+
+
+def _antes_render(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None:
+        stats['_render_inicio'].append(time.perf_counter())
+
+
+def _depois_render(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None and stats['_render_inicio']:
+        stats['render_ms'] += (time.perf_counter() - stats['_render_inicio'].pop()) * 1000
+
+
+def init_instrumentation(app):
+    """Registra os hooks de instrumentação no app e nos engines do SQLAlchemy"""
+    app.config.setdefault('INSTRUMENTACAO_ATIVA', os.getenv('INSTRUMENTACAO_ATIVA', '1') == '1')
+    app.config.setdefault('REQUISICAO_LENTA_MS', float(os.getenv('REQUISICAO_LENTA_MS', 500)))
+    app.config.setdefault('CONSULTA_LENTA_MS', float(os.getenv('CONSULTA_LENTA_MS', 100)))
+    app.config.setdefault('LIMITE_N_MAIS_1', int(os.getenv('LIMITE_N_MAIS_1', 10)))
+
+    if not app.config['INSTRUMENTACAO_ATIVA']:
+        return
+
+    app.json = _JSONProviderInstrumentado(app)
+
+    # Ouvir todos os engines (primário e réplicas, se houver)
+    if not event.contains(Engine, 'before_cursor_execute', _antes_cursor):
+        event.listen(Engine, 'before_cursor_execute', _antes_cursor)
+        event.listen(Engine, 'after_cursor_execute', _depois_cursor)
+
+    before_render_template.connect(_antes_render, app)
+    template_rendered.connect(_depois_render, app)
+
+    @app.before_request
+    def _iniciar_instrumentacao():
+        g._instrumentacao = {
+            'inicio': time.perf_counter(),
+            'db_ms': 0.0,
+            'serialize_ms': 0.0,
+            'render_ms': 0.0,
+            'consultas': 0,
+            'formatos': Counter(),
+            'consultas_lentas': [],
+            'limite_consulta_lenta_ms': app.config['CONSULTA_LENTA_MS'],
+            '_render_inicio': [],
+        }
+
+    @app.after_request
+    def _finalizar_instrumentacao(response):
+        stats = g.pop('_instrumentacao', None)
+        if stats is None:
+            return response
+
+        total_ms = (time.perf_counter() - stats['inicio']) * 1000
+        response.headers['Server-Timing'] = ', '.join([
+            f"db;dur={stats['db_ms']:.2f};desc=\"{stats['consultas']} consultas\"",
+            f"serialize;dur={stats['serialize_ms']:.2f}",
+            f"render;dur={stats['render_ms']:.2f}",
+            f"total;dur={total_ms:.2f}",
+        ])
+
+        limite_n1 = app.config['LIMITE_N_MAIS_1']
+        repetidas = [
+            {'sql': forma[:300], 'vezes': vezes}
+            for forma, vezes in stats['formatos'].most_common()
+            if vezes > limite_n1
+        ]
+        lenta = total_ms >= app.config['REQUISICAO_LENTA_MS']
+
+        if lenta or repetidas or stats['consultas_lentas']:
+            entrada = {
+                'evento': 'requisicao_lenta' if lenta else 'alerta_sql',
+                'rota': request.endpoint,
+                'metodo': request.method,
+                'caminho': request.path,
+                'parametros': request.args.to_dict(),
+                'argumentos_rota': request.view_args or {},
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'db_ms': round(stats['db_ms'], 2),
+                'serialize_ms': round(stats['serialize_ms'], 2),
+                'render_ms': round(stats['render_ms'], 2),
+                'consultas': stats['consultas'],
+                'consultas_lentas': stats['consultas_lentas'][:10],
+                'possivel_n_mais_1': repetidas[:5],
+            }
+            logger.warning(json.dumps(entrada, ensure_ascii=False, default=str))
+
+        return response
@@ -0,0 +1,345 @@
+"""Operações em lote em uma única requisição (POST /api/batch)
+
+Corpo:
+
+    {"modo": "atomico", "operacoes": [
+        {"op": "criar", "entidade": "brainrot", "ref": "novo", "dados": {"nome": "X", "raridade": "OG"}},
+        {"op": "atualizar", "entidade": "brainrot", "id": "novo", "dados": {"tags": ["pvp"], "favorito": true}},
+        {"op": "excluir", "entidade": "meta", "id": 3}
+    ]}
+
+Entidades: 'brainrot', 'conta' e 'meta'. Os campos de 'dados' são os mesmos das rotas
+individuais, mas 'atualizar' só altera os campos enviados. O 'id' pode ser o 'ref' de um
+'criar' anterior do mesmo lote (também nas listas 'contas' do brainrot e 'brainrots' da
+conta).
+
+Tudo roda em uma única transação: uma versão dos dados, um evento no feed SSE e um
+commit. Os registros citados por id são carregados antes, com uma consulta por entidade,
+assim como as contas com os nomes usados no lote (verificação de nome repetido).
+
+    - 'atomico' (padrão): a primeira operação que falha desfaz o lote inteiro.
+    - 'parcial': cada operação roda em um savepoint; as que falham são desfeitas e as
+      demais são confirmadas.
+
+A resposta traz um resultado por operação ({indice, success, id} ou {indice, success,
+error}) e a versão dos dados gerada (para continuar com ?since=).
+"""
+import json
+import os
+
+from auditoria import registrar_historico
+from capacidade import verificar_capacidade
+from metas import atualizar_meta, recalcular_meta
+from versioning import obter_versao
+
+MODOS = ('atomico', 'parcial')
+OPERACOES = ('criar', 'atualizar', 'excluir')
+ENTIDADES = ('brainrot', 'conta', 'meta')
+
+# Ids por consulta IN no carregamento antecipado
+LOTE_CONSULTA = 1000
+
+# Campos simples do brainrot e a conversão aplicada (como nas rotas POST/PUT)
+CAMPOS_BRAINROT = {
+    'nome': None,
+    'raridade': None,
+    'valor_formatado': None,
+    'valor_por_segundo': float,
+    'quantidade': int,
+    'numero_mutacoes': int,
+    'favorito': None,
+}
+
+_estado = {}
+
+
+class ErroLote(ValueError):
+    """Corpo do lote inválido (nenhuma operação é executada)"""
+
+
+class ErroOperacao(ValueError):
+    """Uma operação do lote não pode ser aplicada"""
+
+
+def _validar(corpo, maximo):
+    if not isinstance(corpo, dict):
+        raise ErroLote('Corpo deve ser um objeto JSON com a lista "operacoes"')
+    modo = corpo.get('modo', 'atomico')
+    if modo not in MODOS:
+        raise ErroLote(f'Modo inválido: {modo} (use {", ".join(MODOS)})')
+    operacoes = corpo.get('operacoes')
+    if not isinstance(operacoes, list) or not operacoes:
+        raise ErroLote('"operacoes" deve ser uma lista não vazia')
+    if len(operacoes) > maximo:
+        raise ErroLote(f'No máximo {maximo} operações por lote')
+
+    refs = set()
+    for indice, operacao in enumerate(operacoes):
+        if not isinstance(operacao, dict):
+            raise ErroLote(f'Operação {indice}: deve ser um objeto')
+        if operacao.get('op') not in OPERACOES:
+            raise ErroLote(f'Operação {indice}: "op" deve ser {", ".join(OPERACOES)}')
+        if operacao.get('entidade') not in ENTIDADES:
+            raise ErroLote(f'Operação {indice}: "entidade" deve ser {", ".join(ENTIDADES)}')
+        if operacao['op'] != 'criar' and operacao.get('id') is None:
+            raise ErroLote(f'Operação {indice}: "id" é obrigatório para {operacao["op"]}')
+        if not isinstance(operacao.get('dados', {}), dict):
+            raise ErroLote(f'Operação {indice}: "dados" deve ser um objeto')
+        ref = operacao.get('ref')
+        if ref is not None:
+            if operacao['op'] != 'criar' or not isinstance(ref, str):
+                raise ErroLote(f'Operação {indice}: "ref" (texto) só vale para criar')
+            if ref in refs:
+                raise ErroLote(f'Operação {indice}: ref "{ref}" repetida')
+            refs.add(ref)
+    return modo, operacoes
+
+
+def _inteiro(valor):
+    """Id numérico (int ou texto com dígitos); None para refs"""
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, int):
+        return valor
+    if isinstance(valor, str) and valor.isdigit():
+        return int(valor)
+    return None
+
+
+class _Lote:
+    """Estado compartilhado entre as operações: registros carregados, refs e nomes de contas"""
+
+    def __init__(self, operacoes):
+        self.modelos = {'brainrot': _estado['Brainrot'], 'conta': _estado['Conta'], 'meta': _estado['Meta']}
+        self.carregados = {entidade: {} for entidade in ENTIDADES}
+        self.refs = {}
+        self.contas_por_nome = {}
+        self._carregar(operacoes)
+
+    def _carregar(self, operacoes):
+        ids = {entidade: set() for entidade in ENTIDADES}
+        nomes = set()
+        for operacao in operacoes:
+            entidade, dados = operacao['entidade'], operacao.get('dados') or {}
+            ids[entidade].add(_inteiro(operacao.get('id')))
+            if entidade == 'brainrot':
+                ids['conta'].update(_inteiro(c) for c in dados.get('contas') or ())
+            elif entidade == 'conta':
+                ids['brainrot'].update(_inteiro(b) for b in dados.get('brainrots') or ())
+                if isinstance(dados.get('nome'), str):
+                    nomes.add(dados['nome'].strip())
+
+        for entidade, Modelo in self.modelos.items():
+            lista = sorted(ids[entidade] - {None})
+            for inicio in range(0, len(lista), LOTE_CONSULTA):
+                for obj in Modelo.query.filter(Modelo.id.in_(lista[inicio:inicio + LOTE_CONSULTA])):
+                    self.carregados[entidade][obj.id] = obj
+
+        Conta, lista = self.modelos['conta'], sorted(nomes)
+        for inicio in range(0, len(lista), LOTE_CONSULTA):
+            for conta in Conta.query.filter(Conta.nome.in_(lista[inicio:inicio + LOTE_CONSULTA])):
+                self.carregados['conta'][conta.id] = conta
+                self.contas_por_nome[conta.nome] = conta.id
+
+    def _id(self, valor):
+        if isinstance(valor, str) and valor in self.refs:
+            return self.refs[valor]
+        id_ = _inteiro(valor)
+        if id_ is None:
+            raise ErroOperacao(f'Referência desconhecida: {valor!r}')
+        return id_
+
+    def obter(self, entidade, valor):
+        id_ = self._id(valor)
+        obj = self.carregados[entidade].get(id_)
+        if obj is None:
+            obj = _estado['db'].session.get(self.modelos[entidade], id_)
+        if obj is None:
+            raise ErroOperacao(f'{entidade} {id_} não encontrado(a)')
+        return obj
+
+    def registrar(self, operacao, obj):
+        """Atualiza o estado compartilhado depois de uma operação bem-sucedida"""
+        entidade = operacao['entidade']
+        if operacao['op'] == 'excluir':
+            self.carregados[entidade].pop(obj.id, None)
+            return
+        self.carregados[entidade][obj.id] = obj
+        if operacao.get('ref') is not None:
+            self.refs[operacao['ref']] = obj.id
+        if entidade == 'conta':
+            self.contas_por_nome[obj.nome] = obj.id
+
+    def aplicar(self, operacao):
+        """Executa uma operação (com flush); retorna o registro criado/alterado/excluído"""
+        entidade, op = operacao['entidade'], operacao['op']
+        dados = operacao.get('dados') or {}
+        if op == 'criar':
+            obj = getattr(self, f'_criar_{entidade}')(dados)
+        else:
+            obj = self.obter(entidade, operacao['id'])
+            getattr(self, f'_{op}_{entidade}')(obj, dados)
+        _estado['db'].session.flush()
+        return obj
+
+    # Brainrots
+
+    def _preencher_brainrot(self, brainrot, dados):
+        for campo, converter in CAMPOS_BRAINROT.items():
+            if campo in dados:
+                setattr(brainrot, campo, converter(dados[campo]) if converter else dados[campo])
+        if not dados.get('valor_formatado') and 'valor_por_segundo' in dados:
+            brainrot.valor_formatado = f"${dados['valor_por_segundo']}/s"
+        if 'foto' in dados:
+            brainrot.foto = (dados['foto'] or '').strip()
+        if dados.get('eventos') is not None:
+            brainrot.set_eventos(dados['eventos'])
+        if dados.get('tags') is not None:
+            brainrot.set_tags(dados['tags'])
+        if dados.get('campos_personalizados') is not None:
+            brainrot.set_campos_personalizados(dados['campos_personalizados'])
+
+    def _associar_contas(self, brainrot, valores, atuais):
+        novas = {self._id(c) for c in valores}
+        verificar_capacidade({c: {brainrot.id} for c in novas - atuais},
+                             {c: {brainrot.id} for c in atuais - novas})
+        brainrot.contas = [self.obter('conta', c) for c in novas]
+
+    def _historico(self, brainrot, acao, anteriores=None, novos=None):
+        registrar_historico('brainrot', brainrot.id, acao, anteriores, novos)
+
+    def _criar_brainrot(self, dados):
+        db, Brainrot = _estado['db'], _estado['Brainrot']
+        brainrot = Brainrot(raridade='Comum', valor_por_segundo=0.0, quantidade=1, numero_mutacoes=0,
+                            favorito=False, valor_formatado='$0/s')
+        brainrot.set_eventos([])
+        brainrot.set_tags([])
+        self._preencher_brainrot(brainrot, dados)
+        db.session.add(brainrot)
+        db.session.flush()
+        self._historico(brainrot, 'criar', novos=json.dumps(brainrot.to_dict()))
+        if dados.get('contas'):
+            self._associar_contas(brainrot, dados['contas'], set())
+        return brainrot
+
+    def _atualizar_brainrot(self, brainrot, dados):
+        anteriores = json.dumps(brainrot.to_dict())
+        self._preencher_brainrot(brainrot, dados)
+        if dados.get('contas') is not None:
+            tabela = _estado['brainrot_conta']
+            atuais = {linha.conta_id for linha in _estado['db'].session.query(tabela.c.conta_id)
+                      .filter(tabela.c.brainrot_id == brainrot.id)}
+            self._associar_contas(brainrot, dados['contas'], atuais)
+        _estado['db'].session.flush()
+        self._historico(brainrot, 'editar', anteriores, json.dumps(brainrot.to_dict()))
+
+    def _excluir_brainrot(self, brainrot, dados):
+        self._historico(brainrot, 'excluir', anteriores=json.dumps(brainrot.to_dict()))
+        _estado['db'].session.delete(brainrot)
+
+    # Contas
+
+    def _verificar_nome(self, nome, conta=None):
+        existente = self.carregados['conta'].get(self.contas_por_nome.get(nome))
+        # O nome registrado pode estar desatualizado (conta renomeada depois)
+        if existente is not None and existente is not conta and existente.nome == nome:
+            raise ErroOperacao(f'Já existe uma conta com o nome "{nome}".')
+
+    def _associar_brainrots(self, conta, valores, atuais):
+        novos = {self._id(b) for b in valores}
+        verificar_capacidade({conta.id: novos}, {conta.id: atuais - novos})
+        conta.brainrots = [self.obter('brainrot', b) for b in novos]
+
+    def _criar_conta(self, dados):
+        db, Conta = _estado['db'], _estado['Conta']
+        nome = (dados.get('nome') or '').strip()
+        self._verificar_nome(nome)
+        conta = Conta(nome=nome, roblox_id=dados.get('roblox_id', ''), espacos=int(dados.get('espacos', 0)) or 0)
+        db.session.add(conta)
+        if dados.get('brainrots'):
+            db.session.flush()
+            self._associar_brainrots(conta, dados['brainrots'], set())
+        return conta
+
+    def _atualizar_conta(self, conta, dados):
+        if 'nome' in dados:
+            nome = (dados['nome'] or '').strip()
+            if nome != conta.nome:
+                self._verificar_nome(nome, conta)
+            conta.nome = nome
+        if 'roblox_id' in dados:
+            conta.roblox_id = dados['roblox_id']
+        if 'espacos' in dados:
+            conta.espacos = int(dados['espacos']) or 0
+        if dados.get('brainrots') is not None:
+            tabela = _estado['brainrot_conta']
+            atuais = {linha.brainrot_id for linha in _estado['db'].session.query(tabela.c.brainrot_id)
+                      .filter(tabela.c.conta_id == conta.id)}
+            self._associar_brainrots(conta, dados['brainrots'], atuais)
+
+    def _excluir_conta(self, conta, dados):
+        _estado['db'].session.delete(conta)
+
+    # Metas
+
+    def _criar_meta(self, dados):
+        meta = _estado['Meta'](
+            nome=dados.get('nome'),
+            descricao=dados.get('descricao', ''),
+            tipo=dados.get('tipo'),
+            parametro=dados.get('parametro') or None,
+            valor_alvo=int(dados.get('valor_alvo', 0))
+        )
+        recalcular_meta(meta)
+        _estado['db'].session.add(meta)
+        return meta
+
+    def _atualizar_meta(self, meta, dados):
+        atualizar_meta(meta, dados)
+
+    def _excluir_meta(self, meta, dados):
+        _estado['db'].session.delete(meta)
+
+
+def executar_lote(corpo):
+    """Executa as operações do lote; retorna a resposta (success=False se o lote atômico falhou)
+
+    Lança ErroLote se o corpo for inválido. Faz commit (ou rollback) da sessão.
+    """
+    db = _estado['db']
+    modo, operacoes = _validar(corpo, _estado['app'].config['LOTE_MAX_OPERACOES'])
+    lote = _Lote(operacoes)
+    resultados = []
+    for indice, operacao in enumerate(operacoes):
+        try:
+            if modo == 'parcial':
+                with db.session.begin_nested():
+                    obj = lote.aplicar(operacao)
+            else:
+                obj = lote.aplicar(operacao)
+        except Exception as e:
+            resultados.append({'indice': indice, 'success': False, 'error': str(e)})
+            if modo == 'atomico':
+                db.session.rollback()
+                return {'success': False, 'error': f'Operação {indice}: {e}',
+                        'aplicadas': 0, 'resultados': resultados}
+            continue
+        lote.registrar(operacao, obj)
+        resultados.append({'indice': indice, 'success': True, 'id': obj.id})
+
+    aplicadas = sum(1 for resultado in resultados if resultado['success'])
+    versao = db.session.info.get('versao_nova')
+    if aplicadas:
+        db.session.commit()
+    else:
+        db.session.rollback()
+    if versao is None:
+        # Só metas (sem versão nova) ou nada aplicado: versão atual
+        versao = obter_versao()
+    return {'success': True, 'modo': modo, 'aplicadas': aplicadas, 'falhas': len(resultados) - aplicadas,
+            'versao': versao, 'resultados': resultados}
+
+
+def init_lote(app, db, Brainrot, Conta, Meta, brainrot_conta):
+    _estado.update(app=app, db=db, Brainrot=Brainrot, Conta=Conta, Meta=Meta, brainrot_conta=brainrot_conta)
+    app.config.setdefault('LOTE_MAX_OPERACOES', int(os.getenv('LOTE_MAX_OPERACOES', 1000)))
@@ -0,0 +1,239 @@
+"""Motor incremental de progresso das metas
+
+Cada brainrot contribui para as metas conforme o tipo:
+    - 'quantidade': 1 por brainrot cadastrado
+    - 'raridade':   1 por brainrot cuja raridade é igual a Meta.parametro
+    - 'evento':     1 por brainrot que tem o evento Meta.parametro
+    - 'valor':      renda por segundo do brainrot multiplicada pela quantidade, arredondada
+                    para inteiro por brainrot
+
+A cada flush da sessão, as contribuições antigas e novas dos brainrots criados,
+alterados ou excluídos viram deltas, aplicados com alguns UPDATEs por tipo de meta
+(sem reler a tabela de brainrots). recalcular_todas() refaz tudo do zero para reparo.
+Como cada contribuição já é inteira, somar os deltas dá exatamente o mesmo total do
+recálculo (arredondar só o delta perderia mudanças menores que 1 em cada flush).
+
+A conclusão acompanha o progresso: uma meta calculada que volta a ficar abaixo do alvo
+(ex: depois de excluir brainrots) deixa de estar concluída.
+"""
+import json
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, inspect, or_, update
+from sqlalchemy.orm.base import NO_VALUE
+
+from models import parse_valor_formatado
+
+TIPOS_CALCULADOS = ('quantidade', 'raridade', 'evento', 'valor')
+
+# Campos do brainrot que influenciam as metas
+CAMPOS_RELEVANTES = ('raridade', 'eventos', 'valor_formatado', 'valor_por_segundo', 'quantidade')
+
+_estado = {}
+
+
+def valor_renda(valor_formatado, valor_por_segundo, quantidade):
+    """Renda total por segundo do brainrot (mesma regra do dashboard)"""
+    valor = parse_valor_formatado(valor_formatado) if valor_formatado else (valor_por_segundo or 0)
+    return valor * (quantidade or 1)
+
+
+def _eventos(valor):
+    if not valor:
+        return []
+    try:
+        return json.loads(valor) if isinstance(valor, str) else list(valor)
+    except (ValueError, TypeError):
+        return []
+
+
+def contribuicao(campos):
+    """Retorna as contribuições (inteiras) de um brainrot: {(tipo, parametro): valor}"""
+    resultado = {
+        ('quantidade', None): 1,
+        ('raridade', campos.get('raridade')): 1,
+        ('valor', None): int(round(valor_renda(campos.get('valor_formatado'), campos.get('valor_por_segundo'),
+                                               campos.get('quantidade')))),
+    }
+    for evento in set(_eventos(campos.get('eventos'))):
+        resultado[('evento', evento)] = 1
+    return resultado
+
+
+def _campos_atuais(obj):
+    return {campo: getattr(obj, campo) for campo in CAMPOS_RELEVANTES}
+
+
+def _campos_anteriores(obj):
+    """Valores do brainrot como estavam no banco antes das alterações pendentes"""
+    estado = inspect(obj)
+    campos = {}
+    for campo in CAMPOS_RELEVANTES:
+        anterior = estado.committed_state.get(campo, NO_VALUE)
+        campos[campo] = getattr(obj, campo) if anterior is NO_VALUE else anterior
+    return campos
+
+
+def _acumular(deltas, campos, sinal):
+    for chave, valor in contribuicao(campos).items():
+        deltas[chave] += sinal * valor
+
+
+def init_metas(db, Brainrot, Meta):
+    """Registra o listener que mantém o progresso das metas atualizado"""
+    _estado.update(db=db, Brainrot=Brainrot, Meta=Meta)
+
+    @event.listens_for(db.session, 'before_flush')
+    def _atualizar_metas(session, flush_context, instances):
+        deltas = defaultdict(int)
+        for obj in session.new:
+            if isinstance(obj, Brainrot):
+                _acumular(deltas, _campos_atuais(obj), 1)
+        for obj in session.deleted:
+            if isinstance(obj, Brainrot):
+                _acumular(deltas, _campos_anteriores(obj), -1)
+        for obj in session.dirty:
+            if isinstance(obj, Brainrot) and session.is_modified(obj, include_collections=False):
+                estado = inspect(obj)
+                if not any(campo in estado.committed_state for campo in CAMPOS_RELEVANTES):
+                    continue
+                _acumular(deltas, _campos_anteriores(obj), -1)
+                _acumular(deltas, _campos_atuais(obj), 1)
+        if deltas:
+            aplicar_deltas(session, deltas)
+
+
+def aplicar_deltas(session, deltas):
+    """Aplica deltas {(tipo, parametro): valor} às metas com UPDATEs agregados"""
+    meta = _estado['Meta'].__table__
+    tipos_afetados = set()
+    reduzidas = []
+    for (tipo, parametro), delta in deltas.items():
+        if not delta:
+            continue
+        condicao = meta.c.tipo == tipo
+        if parametro is not None:
+            condicao = condicao & (meta.c.parametro == parametro)
+        session.execute(
+            update(meta).where(condicao).values(valor_atual=meta.c.valor_atual + delta)
+        )
+        tipos_afetados.add(tipo)
+        if delta < 0:
+            reduzidas.append(condicao)
+
+    if tipos_afetados:
+        _marcar_concluidas(session, tipos_afetados)
+    if reduzidas:
+        _desmarcar_abaixo_do_alvo(session, or_(*reduzidas))
+
+
+def _marcar_concluidas(session, tipos=None):
+    """Marca como concluídas as metas que atingiram o alvo"""
+    meta = _estado['Meta'].__table__
+    condicao = (meta.c.concluida.is_(False) | meta.c.concluida.is_(None)) & (meta.c.valor_atual >= meta.c.valor_alvo)
+    if tipos:
+        condicao = condicao & meta.c.tipo.in_(list(tipos))
+    session.execute(
+        update(meta).where(condicao).values(concluida=True, data_conclusao=datetime.utcnow())
+    )
+
+
+def _desmarcar_abaixo_do_alvo(session, condicao):
+    """Metas que atendem à condição e voltaram a ficar abaixo do alvo deixam de estar concluídas"""
+    meta = _estado['Meta'].__table__
+    session.execute(
+        update(meta)
+        .where(condicao & meta.c.concluida.is_(True) & (meta.c.valor_atual < meta.c.valor_alvo))
+        .values(concluida=False, data_conclusao=None)
+    )
+
+
+def _totais(session, Brainrot, lote=2000):
+    """Percorre os brainrots (apenas colunas relevantes) e soma as contribuições"""
+    totais = defaultdict(int)
+    colunas = [getattr(Brainrot, campo) for campo in CAMPOS_RELEVANTES]
+    resultado = session.execute(
+        session.query(*colunas).statement.execution_options(yield_per=lote)
+    )
+    for linha in resultado:
+        for chave, valor in contribuicao(dict(zip(CAMPOS_RELEVANTES, linha))).items():
+            totais[chave] += valor
+    return totais
+
+
+def valor_calculado(totais, meta):
+    if meta.tipo in ('quantidade', 'valor'):
+        return totais.get((meta.tipo, None), 0)
+    return totais.get((meta.tipo, meta.parametro), 0)
+
+
+def recalcular_meta(meta):
+    """Calcula o progresso de uma única meta (ex: ao criar ou mudar o tipo/parâmetro)"""
+    if meta.tipo not in TIPOS_CALCULADOS:
+        return
+    db, Brainrot = _estado['db'], _estado['Brainrot']
+    query = db.session.query(Brainrot)
+    if meta.tipo == 'quantidade':
+        meta.valor_atual = query.count()
+    elif meta.tipo == 'raridade':
+        meta.valor_atual = query.filter(Brainrot.raridade == meta.parametro).count()
+    elif meta.tipo == 'evento':
+        meta.valor_atual = query.filter(Brainrot.eventos.contains(f'"{meta.parametro}"')).count()
+    else:
+        meta.valor_atual = valor_calculado(_totais(db.session, Brainrot), meta)
+    if meta.valor_alvo and meta.valor_atual >= meta.valor_alvo and not meta.concluida:
+        meta.concluida = True
+        meta.data_conclusao = datetime.utcnow()
+    elif meta.concluida and meta.valor_atual < (meta.valor_alvo or 0):
+        meta.concluida = False
+        meta.data_conclusao = None
+
+
+def atualizar_meta(meta, dados):
+    """Aplica os campos enviados (PUT /api/metas/<id> e /api/batch) à meta"""
+    if 'nome' in dados:
+        meta.nome = dados['nome']
+    if 'descricao' in dados:
+        meta.descricao = dados['descricao']
+    if 'tipo' in dados or 'parametro' in dados:
+        meta.tipo = dados.get('tipo', meta.tipo)
+        meta.parametro = dados.get('parametro', meta.parametro) or None
+        recalcular_meta(meta)
+    if 'valor_alvo' in dados:
+        meta.valor_alvo = int(dados['valor_alvo'])
+    if 'valor_atual' in dados:
+        # Ajuste manual (metas calculadas voltam a ser atualizadas pelas próximas alterações)
+        meta.valor_atual = int(dados['valor_atual'])
+    if meta.valor_alvo and meta.valor_atual >= meta.valor_alvo and not meta.concluida:
+        meta.concluida = True
+        meta.data_conclusao = datetime.utcnow()
+    if 'concluida' in dados:
+        meta.concluida = dados['concluida']
+        if dados['concluida'] and not meta.data_conclusao:
+            meta.data_conclusao = datetime.utcnow()
+
+
+def _calculaveis(meta):
+    """Condição das metas calculadas pelo motor (raridade/evento só com o parâmetro definido)"""
+    return meta.c.tipo.in_(('quantidade', 'valor')) | (meta.c.tipo.in_(('raridade', 'evento')) & meta.c.parametro.isnot(None))
+
+
+def recalcular_progresso():
+    """Recalcula do zero o progresso de todas as metas calculáveis, sem commit; retorna quantas"""
+    db, Brainrot, Meta = _estado['db'], _estado['Brainrot'], _estado['Meta']
+    totais = _totais(db.session, Brainrot)
+    metas = Meta.query.filter(_calculaveis(Meta.__table__)).all()
+    for meta in metas:
+        meta.valor_atual = valor_calculado(totais, meta)
+    db.session.flush()
+    _marcar_concluidas(db.session)
+    _desmarcar_abaixo_do_alvo(db.session, _calculaveis(Meta.__table__))
+    return len(metas)
+
+
+def recalcular_todas():
+    """Recalcula do zero o progresso de todas as metas calculáveis (reparo)"""
+    total = recalcular_progresso()
+    _estado['db'].session.commit()
+    return total
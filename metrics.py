@@ -0,0 +1,178 @@
+"""Métricas no formato Prometheus agregadas entre os workers do gunicorn
+
+Usa o modo multiprocesso do prometheus_client: cada worker grava seus valores em
+arquivos mmap dentro de PROMETHEUS_MULTIPROC_DIR e o endpoint /metrics soma os
+arquivos de todos os processos. Se o prometheus_client não estiver instalado, as
+funções viram no-op e /metrics responde 503.
+
+O diretório padrão é instance/metricas, do próprio deploy (não compartilhado em /tmp com
+outras instalações). O gunicorn o limpa ao iniciar; processos fora dele (python app.py,
+comandos flask, benchmarks) apagam os próprios arquivos ao sair, para que /metrics não
+some para sempre os contadores de processos que já terminaram.
+"""
+import atexit
+import glob
+import os
+import shutil
+import sys
+import time
+
+from flask import g, request
+
+# O diretório precisa existir antes de importar o prometheus_client (ainda sem o app: a
+# pasta instance/ ao lado deste arquivo é o app.instance_path padrão do Flask)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'metricas'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+try:
+    from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram,
+                                   CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+except ImportError:
+    multiprocess = None
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST if multiprocess else 'text/plain; charset=utf-8'
+
+if multiprocess:
+    REQUISICOES = Counter(
+        'brainrot_http_requests_total', 'Requisições HTTP por endpoint',
+        ['endpoint', 'metodo', 'status']
+    )
+    LATENCIA = Histogram(
+        'brainrot_http_request_duration_seconds', 'Latência das requisições HTTP por endpoint',
+        ['endpoint', 'metodo'],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    )
+    EM_ANDAMENTO = Gauge(
+        'brainrot_http_requests_in_flight', 'Requisições em andamento',
+        multiprocess_mode='livesum'
+    )
+    POOL_CHECKOUTS = Counter(
+        'brainrot_db_pool_checkouts_total', 'Conexões retiradas do pool do banco'
+    )
+    POOL_EM_USO = Gauge(
+        'brainrot_db_pool_checked_out', 'Conexões do pool em uso',
+        multiprocess_mode='livesum'
+    )
+    POOL_OVERFLOW = Gauge(
+        'brainrot_db_pool_overflow', 'Conexões acima do pool_size (overflow)',
+        multiprocess_mode='livesum'
+    )
+    CACHE = Counter(
+        'brainrot_cache_requests_total', 'Consultas a caches internos (hit/miss)',
+        ['cache', 'resultado']
+    )
+    FILA = Gauge(
+        'brainrot_queue_depth', 'Itens pendentes em filas internas',
+        ['fila'], multiprocess_mode='livesum'
+    )
+    ATRASO_FILA = Gauge(
+        'brainrot_queue_lag_seconds', 'Idade do item pendente mais antigo em filas internas',
+        ['fila'], multiprocess_mode='livemax'
+    )
+
+
+def registrar_cache(nome, acerto):
+    """Registra um acerto (hit) ou falha (miss) de cache"""
+    if multiprocess:
+        CACHE.labels(nome, 'hit' if acerto else 'miss').inc()
+
+
+def definir_tamanho_fila(nome, tamanho):
+    """Atualiza a profundidade de uma fila interna deste processo"""
+    if multiprocess:
+        FILA.labels(nome).set(tamanho)
+
+
+def definir_atraso_fila(nome, segundos):
+    """Atualiza a idade (s) do item mais antigo de uma fila interna deste processo"""
+    if multiprocess:
+        ATRASO_FILA.labels(nome).set(segundos)
+
+
+def gerar_metricas():
+    """Retorna o texto Prometheus agregando todos os processos (ou None se indisponível)"""
+    if not multiprocess:
+        return None
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def limpar_diretorio_metricas():
+    """Limpa arquivos de execuções anteriores (chamar no processo master, antes dos workers)"""
+    diretorio = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(diretorio, ignore_errors=True)
+    os.makedirs(diretorio, exist_ok=True)
+
+
+def marcar_processo_encerrado(pid):
+    """Remove os gauges 'live' de um worker encerrado (hook child_exit do gunicorn)"""
+    if multiprocess:
+        multiprocess.mark_process_dead(pid)
+
+
+def _remover_arquivos_do_processo():
+    """Ao sair de um processo fora do gunicorn: remove os arquivos de métricas do pid"""
+    if 'gunicorn.arbiter' in sys.modules:
+        # Workers do gunicorn: os contadores de um worker encerrado continuam somando no
+        # total (senão os counters voltariam para trás); child_exit cuida dos gauges
+        return
+    pid = os.getpid()
+    multiprocess.mark_process_dead(pid)
+    for caminho in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], f'*_{pid}.db')):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+if multiprocess:
+    atexit.register(_remover_arquivos_do_processo)
+
+
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    POOL_CHECKOUTS.inc()
+    POOL_EM_USO.inc()
+    pool = getattr(connection_proxy, '_pool', None)
+    if pool is not None and hasattr(pool, 'overflow'):
+        POOL_OVERFLOW.set(max(0, pool.overflow()))
+
+
+def _pool_checkin(dbapi_connection, connection_record):
+    POOL_EM_USO.dec()
+
+
+def init_metrics(app):
+    """Registra os hooks de métricas de requisição e do pool de conexões"""
+    app.config.setdefault('METRICAS_ATIVAS', os.getenv('METRICAS_ATIVAS', '1') == '1')
+    app.config.setdefault('METRICAS_TOKEN', os.getenv('METRICAS_TOKEN'))
+
+    if not multiprocess or not app.config['METRICAS_ATIVAS']:
+        return
+
+    from sqlalchemy import event
+    from sqlalchemy.pool import Pool
+    if not event.contains(Pool, 'checkout', _pool_checkout):
+        event.listen(Pool, 'checkout', _pool_checkout)
+        event.listen(Pool, 'checkin', _pool_checkin)
+
+    @app.before_request
+    def _iniciar_metricas():
+        g._metricas_inicio = time.perf_counter()
+        EM_ANDAMENTO.inc()
+
+    @app.after_request
+    def _registrar_metricas(response):
+        inicio = g.get('_metricas_inicio')
+        if inicio is not None:
+            # Endpoint do Flask (e não o caminho) para manter a cardinalidade baixa
+            endpoint = request.endpoint or 'nao_encontrado'
+            LATENCIA.labels(endpoint, request.method).observe(time.perf_counter() - inicio)
+            REQUISICOES.labels(endpoint, request.method, str(response.status_code)).inc()
+        return response
+
+    @app.teardown_request
+    def _finalizar_metricas(exc):
+        if g.pop('_metricas_inicio', None) is not None:
+            EM_ANDAMENTO.dec()
@@ -0,0 +1,26 @@
+"""Add index on brainrot.nome for typeahead
+
+Revision ID: add_brainrot_nome_index
+Revises: add_ordem_column
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_brainrot_nome_index'
+down_revision = 'add_ordem_column'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Índice usado pela busca por prefixo do typeahead e pelos agrupamentos por nome
+    op.create_index('ix_brainrot_nome', 'brainrot', ['nome'], unique=False)
+
+
+def downgrade():
+    # Remover índice do nome
+    op.drop_index('ix_brainrot_nome', table_name='brainrot')
@@ -0,0 +1,28 @@
+"""Add lower(nome) expression index on brainrot for the case-insensitive typeahead
+
+Revision ID: add_brainrot_nome_lower
+Revises: add_campos_jsonb
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_brainrot_nome_lower'
+down_revision = 'add_campos_jsonb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Busca por prefixo sem diferenciar maiúsculas (lower(nome) LIKE 'x%'); no Postgres o
+    # LIKE só usa um índice btree com text_pattern_ops
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE INDEX ix_brainrot_nome_lower ON brainrot (lower(nome) text_pattern_ops)")
+    else:
+        op.execute("CREATE INDEX ix_brainrot_nome_lower ON brainrot (lower(nome))")
+
+
+def downgrade():
+    op.drop_index('ix_brainrot_nome_lower', table_name='brainrot')
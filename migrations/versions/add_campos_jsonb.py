@@ -0,0 +1,126 @@
+"""Store brainrot.campos_personalizados as JSONB (GIN index) with typed values and per-field indexes
+
+Revision ID: add_campos_jsonb
+Revises: add_sincronizacao
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+import json
+import math
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_campos_jsonb'
+down_revision = 'add_sincronizacao'
+branch_labels = None
+depends_on = None
+
+LOTE = 5000
+
+
+# Cópia fixa de campos.converter_valor no momento desta migração
+def _converter(tipo, valor):
+    if tipo == 'numero':
+        if isinstance(valor, bool):
+            raise ValueError(valor)
+        if isinstance(valor, str):
+            valor = valor.strip()
+            if valor.count(',') == 1 and '.' not in valor:
+                valor = valor.replace(',', '.')
+        numero = float(valor)
+        if not math.isfinite(numero):
+            raise ValueError(valor)
+        return int(numero) if numero.is_integer() else numero
+    if tipo == 'data':
+        valor = str(valor).strip()
+        if '/' in valor:
+            return datetime.strptime(valor, '%d/%m/%Y').date().isoformat()
+        return datetime.fromisoformat(valor).date().isoformat()
+    if tipo == 'booleano':
+        if isinstance(valor, bool):
+            return valor
+        valor = str(valor).strip().lower()
+        if valor in ('true', '1', 'sim', 's', 'yes', 'on'):
+            return True
+        if valor in ('false', '0', 'não', 'nao', 'n', 'no', 'off'):
+            return False
+        raise ValueError(valor)
+    if tipo == 'texto' and valor is not None and not isinstance(valor, str):
+        return str(valor)
+    return valor
+
+
+def _normalizar(campos, tipos):
+    normalizados = {}
+    for nome, valor in campos.items():
+        if nome in tipos and valor not in (None, ''):
+            try:
+                valor = _converter(tipos[nome], valor)
+            except (TypeError, ValueError):
+                pass
+        normalizados[nome] = valor
+    return normalizados
+
+
+def _indice_campo(conexao, campo_id, nome, tipo):
+    """Mesmo índice de campos.criar_indice_campo"""
+    if '"' in nome:
+        return
+    if conexao.dialect.name == 'postgresql':
+        if tipo not in ('numero', 'data'):
+            return
+        expressao = "campos_personalizados -> '{}'".format(nome.replace("'", "''"))
+    else:
+        expressao = "json_extract(campos_personalizados, '$.\"{}\"')".format(nome.replace("'", "''"))
+    conexao.execute(sa.text(f'CREATE INDEX IF NOT EXISTS ix_brainrot_campo_{campo_id} ON brainrot (({expressao}))'))
+
+
+def upgrade():
+    conexao = op.get_bind()
+    campos_declarados = conexao.execute(sa.text("SELECT id, nome, tipo FROM campo_personalizado")).all()
+    tipos = {nome: tipo for _, nome, tipo in campos_declarados}
+
+    # Valores existentes no tipo declarado do campo; texto vazio ou inválido vira NULL
+    pares = []
+    for id_, texto in conexao.execute(sa.text(
+            "SELECT id, campos_personalizados FROM brainrot WHERE campos_personalizados IS NOT NULL")):
+        try:
+            campos = json.loads(texto) if texto else None
+        except ValueError:
+            campos = None
+        if not isinstance(campos, dict):
+            novo = None
+        else:
+            novo = json.dumps(_normalizar(campos, tipos), ensure_ascii=False)
+        if novo != texto:
+            pares.append({'campos': novo, 'brainrot_id': id_})
+    for inicio in range(0, len(pares), LOTE):
+        conexao.execute(
+            sa.text("UPDATE brainrot SET campos_personalizados = :campos WHERE id = :brainrot_id"),
+            pares[inicio:inicio + LOTE]
+        )
+
+    if conexao.dialect.name == 'postgresql':
+        # No SQLite a coluna continua texto (o SQLAlchemy lê e grava o JSON)
+        op.execute("ALTER TABLE brainrot ALTER COLUMN campos_personalizados TYPE JSONB "
+                   "USING campos_personalizados::jsonb")
+        op.execute("CREATE INDEX ix_brainrot_campos_personalizados ON brainrot "
+                   "USING gin (campos_personalizados jsonb_path_ops)")
+
+    # Índice de expressão de cada campo já declarado
+    for campo_id, nome, tipo in campos_declarados:
+        _indice_campo(conexao, campo_id, nome, tipo)
+
+
+def downgrade():
+    conexao = op.get_bind()
+    for (campo_id,) in conexao.execute(sa.text("SELECT id FROM campo_personalizado")):
+        op.execute(f'DROP INDEX IF EXISTS ix_brainrot_campo_{campo_id}')
+    if conexao.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_brainrot_campos_personalizados')
+        op.execute("ALTER TABLE brainrot ALTER COLUMN campos_personalizados TYPE TEXT "
+                   "USING campos_personalizados::text")
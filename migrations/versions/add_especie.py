@@ -0,0 +1,103 @@
+"""Add especie catalog table referenced by brainrot.especie_id (consolidates existing names)
+
+Revision ID: add_especie
+Revises: add_meta_parametro
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_especie'
+down_revision = 'add_meta_parametro'
+branch_labels = None
+depends_on = None
+
+LOTE = 5000
+
+
+def _chave(nome):
+    # Cópia fixa de models.chave_especie no momento desta migração
+    return (nome or '').strip().lower()
+
+
+def upgrade():
+    # Catálogo de espécies
+    especie = op.create_table('especie',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(length=200), nullable=False),
+        sa.Column('nome_chave', sa.String(length=200), nullable=False),
+        sa.Column('raridade', sa.String(length=50), nullable=False),
+        sa.Column('foto', sa.String(length=500), nullable=True),
+        sa.Column('data_criacao', sa.DateTime(), nullable=True),
+        sa.Column('data_atualizacao', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_especie_nome_chave', 'especie', ['nome_chave'], unique=True)
+
+    with op.batch_alter_table('brainrot') as batch_op:
+        batch_op.add_column(sa.Column('especie_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_brainrot_especie_id', 'especie', ['especie_id'], ['id'])
+        batch_op.create_index('ix_brainrot_especie_id', ['especie_id'], unique=False)
+
+    # Consolidar: uma espécie por nome (sem diferenciar maiúsculas), com a raridade mais
+    # comum entre as instâncias e a primeira foto preenchida (na ordem dos ids)
+    conexao = op.get_bind()
+    linhas = conexao.execute(sa.text(
+        "SELECT id, nome, raridade, foto FROM brainrot ORDER BY id"
+    )).fetchall()
+    grupos = {}
+    for id_, nome, raridade, foto in linhas:
+        grupo = grupos.setdefault(_chave(nome), {'nome': (nome or '').strip(), 'raridades': {}, 'foto': None, 'ids': []})
+        grupo['raridades'][raridade] = grupo['raridades'].get(raridade, 0) + 1
+        if foto and not grupo['foto']:
+            grupo['foto'] = foto
+        grupo['ids'].append(id_)
+
+    agora = datetime.utcnow()
+    chaves = list(grupos)
+    op.bulk_insert(especie, [{
+        'id': posicao,
+        'nome': grupos[chave]['nome'],
+        'nome_chave': chave,
+        'raridade': max(grupos[chave]['raridades'], key=grupos[chave]['raridades'].get) or 'Comum',
+        'foto': grupos[chave]['foto'],
+        'data_criacao': agora,
+        'data_atualizacao': agora,
+    } for posicao, chave in enumerate(chaves, start=1)])
+    if conexao.dialect.name == 'postgresql' and chaves:
+        conexao.execute(sa.text(
+            "SELECT setval(pg_get_serial_sequence('especie', 'id'), (SELECT MAX(id) FROM especie))"
+        ))
+
+    # Apontar cada brainrot para a sua espécie
+    pares = [{'especie_id': posicao, 'brainrot_id': id_}
+             for posicao, chave in enumerate(chaves, start=1) for id_ in grupos[chave]['ids']]
+    for inicio in range(0, len(pares), LOTE):
+        conexao.execute(
+            sa.text("UPDATE brainrot SET especie_id = :especie_id WHERE id = :brainrot_id"),
+            pares[inicio:inicio + LOTE]
+        )
+
+    # A foto agora pertence à espécie
+    with op.batch_alter_table('brainrot') as batch_op:
+        batch_op.drop_column('foto')
+
+
+def downgrade():
+    # Devolver a foto para cada instância e remover o catálogo
+    with op.batch_alter_table('brainrot') as batch_op:
+        batch_op.add_column(sa.Column('foto', sa.String(length=500), nullable=True))
+    op.get_bind().execute(sa.text(
+        "UPDATE brainrot SET foto = (SELECT foto FROM especie WHERE especie.id = brainrot.especie_id)"
+    ))
+    with op.batch_alter_table('brainrot') as batch_op:
+        batch_op.drop_index('ix_brainrot_especie_id')
+        batch_op.drop_constraint('fk_brainrot_especie_id', type_='foreignkey')
+        batch_op.drop_column('especie_id')
+    op.drop_index('ix_especie_nome_chave', table_name='especie')
+    op.drop_table('especie')
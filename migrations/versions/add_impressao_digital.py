@@ -0,0 +1,73 @@
+"""Add indexed impressao_digital (duplicate fingerprint) column to brainrot
+
+Revision ID: add_impressao_digital
+Revises: add_especie
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+import hashlib
+import json
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_impressao_digital'
+down_revision = 'add_especie'
+branch_labels = None
+depends_on = None
+
+LOTE = 5000
+
+
+# Cópia fixa de models.parse_valor_formatado / models.impressao_digital no momento desta migração
+def _valor(valor_str):
+    valor_str = str(valor_str).strip().upper()
+    match = re.search(r'([\d.]+)', valor_str)
+    if not match:
+        return 0.0
+    try:
+        numero = float(match.group(1))
+    except ValueError:
+        return 0.0
+    for sufixo, multiplicador in (('K', 1000), ('M', 1000000), ('B', 1000000000), ('T', 1000000000000)):
+        if sufixo in valor_str:
+            return numero * multiplicador
+    return numero
+
+
+def _impressao(nome, valor_formatado, valor_por_segundo, numero_mutacoes, eventos):
+    valor = _valor(valor_formatado) if valor_formatado else (valor_por_segundo or 0)
+    canonico = [(nome or '').strip().lower(), round(float(valor), 2), int(numero_mutacoes or 0), sorted(set(eventos or []))]
+    return hashlib.sha1(json.dumps(canonico, ensure_ascii=False, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def upgrade():
+    # Adicionar coluna com a impressão digital e índice para a busca por lote
+    op.add_column('brainrot', sa.Column('impressao_digital', sa.String(length=40), nullable=True))
+    op.create_index('ix_brainrot_impressao_digital', 'brainrot', ['impressao_digital'], unique=False)
+
+    # Preencher as linhas existentes
+    conexao = op.get_bind()
+    pares = []
+    for id_, nome, valor_formatado, valor_por_segundo, mutacoes, eventos in conexao.execute(sa.text(
+            "SELECT id, nome, valor_formatado, valor_por_segundo, numero_mutacoes, eventos FROM brainrot")):
+        try:
+            lista = json.loads(eventos) if eventos else []
+        except ValueError:
+            lista = []
+        pares.append({'impressao': _impressao(nome, valor_formatado, valor_por_segundo, mutacoes, lista),
+                      'brainrot_id': id_})
+    for inicio in range(0, len(pares), LOTE):
+        conexao.execute(
+            sa.text("UPDATE brainrot SET impressao_digital = :impressao WHERE id = :brainrot_id"),
+            pares[inicio:inicio + LOTE]
+        )
+
+
+def downgrade():
+    # Remover índice e coluna
+    op.drop_index('ix_brainrot_impressao_digital', table_name='brainrot')
+    op.drop_column('brainrot', 'impressao_digital')
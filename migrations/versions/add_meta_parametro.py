@@ -0,0 +1,81 @@
+"""Add parametro to meta and widen progress columns to BIGINT
+
+Revision ID: add_meta_parametro
+Revises: add_versao_dados
+Create Date: 2026-10-19 13:30:00.000000
+
+"""
+import re
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_meta_parametro'
+down_revision = 'add_versao_dados'
+branch_labels = None
+depends_on = None
+
+
+# Cópia fixa de models.parse_valor_formatado / metas.contribuicao no momento desta migração
+def _valor(valor_str):
+    valor_str = str(valor_str).strip().upper()
+    match = re.search(r'([\d.]+)', valor_str)
+    if not match:
+        return 0.0
+    try:
+        numero = float(match.group(1))
+    except ValueError:
+        return 0.0
+    for sufixo, multiplicador in (('K', 1000), ('M', 1000000), ('B', 1000000000), ('T', 1000000000000)):
+        if sufixo in valor_str:
+            return numero * multiplicador
+    return numero
+
+
+def _recalcular_metas(conexao):
+    """Progresso das metas 'quantidade' e 'valor' calculado a partir dos brainrots
+
+    Até aqui valor_atual era digitado pelo usuário; daqui em diante o motor de metas soma
+    deltas a ele, então o ponto de partida precisa ser o valor calculado. Metas de
+    raridade/evento ainda não têm parâmetro e continuam manuais.
+    """
+    quantidade, renda = 0, 0
+    for valor_formatado, valor_por_segundo, qtd in conexao.execute(sa.text(
+            "SELECT valor_formatado, valor_por_segundo, quantidade FROM brainrot")):
+        valor = _valor(valor_formatado) if valor_formatado else (valor_por_segundo or 0)
+        quantidade += 1
+        renda += int(round(valor * (qtd or 1)))
+    for tipo, total in (('quantidade', quantidade), ('valor', renda)):
+        conexao.execute(sa.text("UPDATE meta SET valor_atual = :total WHERE tipo = :tipo"),
+                        {'total': total, 'tipo': tipo})
+    conexao.execute(sa.text(
+        "UPDATE meta SET concluida = :sim, data_conclusao = :agora "
+        "WHERE tipo IN ('quantidade', 'valor') AND valor_atual >= valor_alvo "
+        "AND (concluida = :nao OR concluida IS NULL)"
+    ), {'sim': True, 'nao': False, 'agora': datetime.utcnow()})
+    conexao.execute(sa.text(
+        "UPDATE meta SET concluida = :nao, data_conclusao = NULL "
+        "WHERE tipo IN ('quantidade', 'valor') AND valor_atual < valor_alvo AND concluida = :sim"
+    ), {'sim': True, 'nao': False})
+
+
+def upgrade():
+    # Raridade/evento alvo das metas e valores grandes (renda por segundo)
+    with op.batch_alter_table('meta', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('parametro', sa.String(length=100), nullable=True))
+        batch_op.alter_column('valor_alvo', existing_type=sa.Integer(), type_=sa.BigInteger(), existing_nullable=False)
+        batch_op.alter_column('valor_atual', existing_type=sa.Integer(), type_=sa.BigInteger(), existing_nullable=True)
+    op.create_index('ix_meta_tipo_parametro', 'meta', ['tipo', 'parametro'], unique=False)
+
+    _recalcular_metas(op.get_bind())
+
+
+def downgrade():
+    op.drop_index('ix_meta_tipo_parametro', table_name='meta')
+    with op.batch_alter_table('meta', schema=None) as batch_op:
+        batch_op.alter_column('valor_atual', existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=True)
+        batch_op.alter_column('valor_alvo', existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=False)
+        batch_op.drop_column('parametro')
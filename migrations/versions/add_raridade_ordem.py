@@ -0,0 +1,41 @@
+"""Add raridade_ordem rank column and display-order index to brainrot
+
+Revision ID: add_raridade_ordem
+Revises: add_brainrot_nome_index
+Create Date: 2026-10-19 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_raridade_ordem'
+down_revision = 'add_brainrot_nome_index'
+branch_labels = None
+depends_on = None
+
+# Cópia fixa da ordem das raridades no momento desta migração
+RARIDADES = ['Comum', 'Raro', 'Épico', 'Lendário', 'Mítico', 'Deus Brainrot', 'Secreto', 'OG']
+
+
+def upgrade():
+    # Adicionar coluna com o rank numérico da raridade
+    op.add_column('brainrot', sa.Column('raridade_ordem', sa.SmallInteger(), nullable=False, server_default='1'))
+    
+    # Preencher o rank a partir da raridade existente
+    casos = ' '.join(f"WHEN :r{i} THEN {i}" for i in range(1, len(RARIDADES) + 1))
+    parametros = {f'r{i}': raridade for i, raridade in enumerate(RARIDADES, start=1)}
+    op.get_bind().execute(
+        sa.text(f"UPDATE brainrot SET raridade_ordem = CASE raridade {casos} ELSE 0 END"),
+        parametros
+    )
+    
+    # Índice composto na ordem exibida pela interface
+    op.create_index('ix_brainrot_ordem_exibicao', 'brainrot', ['raridade_ordem', 'ordem', 'data_criacao'], unique=False)
+
+
+def downgrade():
+    # Remover índice e coluna
+    op.drop_index('ix_brainrot_ordem_exibicao', table_name='brainrot')
+    op.drop_column('brainrot', 'raridade_ordem')
@@ -0,0 +1,44 @@
+"""Add versao_alteracao to brainrot/conta, exclusao (tombstones) and data_atualizacao indexes
+
+Revision ID: add_sincronizacao
+Revises: add_impressao_digital
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_sincronizacao'
+down_revision = 'add_impressao_digital'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Versão da última alteração de cada linha (linhas existentes ficam na versão 0)
+    for tabela in ('brainrot', 'conta'):
+        op.add_column(tabela, sa.Column('versao_alteracao', sa.BigInteger(), nullable=False, server_default='0'))
+        op.create_index(f'ix_{tabela}_versao_alteracao', tabela, ['versao_alteracao'], unique=False)
+        op.create_index(f'ix_{tabela}_data_atualizacao', tabela, ['data_atualizacao'], unique=False)
+
+    # Registros de exclusão para os clientes que sincronizam por delta
+    op.create_table('exclusao',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tipo_entidade', sa.String(length=50), nullable=False),
+        sa.Column('entidade_id', sa.Integer(), nullable=False),
+        sa.Column('versao', sa.BigInteger(), nullable=False),
+        sa.Column('data_exclusao', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_exclusao_versao', 'exclusao', ['versao'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_exclusao_versao', table_name='exclusao')
+    op.drop_table('exclusao')
+    for tabela in ('conta', 'brainrot'):
+        op.drop_index(f'ix_{tabela}_data_atualizacao', table_name=tabela)
+        op.drop_index(f'ix_{tabela}_versao_alteracao', table_name=tabela)
+        op.drop_column(tabela, 'versao_alteracao')
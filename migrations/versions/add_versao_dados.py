@@ -0,0 +1,32 @@
+"""Add versao_dados table (global data version for cache invalidation)
+
+Revision ID: add_versao_dados
+Revises: add_raridade_ordem
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_versao_dados'
+down_revision = 'add_raridade_ordem'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tabela com uma única linha (id = 1) contendo a versão atual dos dados
+    versao_dados = op.create_table('versao_dados',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('versao', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('data_atualizacao', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(versao_dados, [{'id': 1, 'versao': 0}])
+
+
+def downgrade():
+    # Remover tabela de versão
+    op.drop_table('versao_dados')
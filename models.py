@@ -1,5 +1,60 @@
 from datetime import datetime
+import hashlib
 import json
+import re
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import validates
+
+# Lista de raridades disponíveis (na ordem exibida pela interface)
+RARIDADES = ['Comum', 'Raro', 'Épico', 'Lendário', 'Mítico', 'Deus Brainrot', 'Secreto', 'OG']
+
+# Ordem numérica de cada raridade (0 = raridade desconhecida)
+ORDEM_RARIDADES = {raridade: posicao for posicao, raridade in enumerate(RARIDADES, start=1)}
+
+def parse_valor_formatado(valor_str):
+    """Converte valor formatado (ex: $50K/s, $1.5M/s) para número para comparação"""
+    if not valor_str:
+        return 0.0
+    
+    try:
+        # Remover espaços e converter para maiúsculo
+        valor_str = str(valor_str).strip().upper()
+        
+        # Extrair número (pode ter ponto decimal)
+        match = re.search(r'([\d.]+)', valor_str)
+        if not match:
+            return 0.0
+        
+        numero = float(match.group(1))
+        
+        # Multiplicadores baseados no sufixo
+        if 'K' in valor_str:
+            return numero * 1000
+        elif 'M' in valor_str:
+            return numero * 1000000
+        elif 'B' in valor_str:
+            return numero * 1000000000
+        elif 'T' in valor_str:
+            return numero * 1000000000000
+        
+        return numero
+    except (ValueError, AttributeError):
+        return 0.0
+
+def chave_especie(nome):
+    """Chave de busca da espécie no catálogo (nome sem espaços nas pontas e em minúsculas)"""
+    return (nome or '').strip().lower()
+
+def impressao_digital(nome, valor_formatado, valor_por_segundo, numero_mutacoes, eventos):
+    """Impressão digital canônica de um brainrot (nome, valor, mutações e eventos)
+    
+    Duas linhas com o mesmo nome (sem diferenciar maiúsculas), a mesma renda por segundo
+    (ex: $1.5M/s e $1500K/s), o mesmo número de mutações e o mesmo conjunto de eventos
+    têm a mesma impressão. Usada para detectar duplicados na importação.
+    """
+    valor = parse_valor_formatado(valor_formatado) if valor_formatado else (valor_por_segundo or 0)
+    canonico = [chave_especie(nome), round(float(valor), 2), int(numero_mutacoes or 0), sorted(set(eventos or []))]
+    return hashlib.sha1(json.dumps(canonico, ensure_ascii=False, separators=(',', ':')).encode('utf-8')).hexdigest()
 
 # db será importado de app.py depois que este for criado
 # Usamos uma função para inicializar os modelos com db
@@ -13,45 +68,114 @@ def create_models(db):
         db.Column('conta_id', db.Integer, db.ForeignKey('conta.id'), primary_key=True)
     )
     
+    class Especie(db.Model):
+        """Catálogo de espécies: nome, raridade e foto compartilhados por todas as instâncias"""
+        __tablename__ = 'especie'
+        
+        id = db.Column(db.Integer, primary_key=True)
+        nome = db.Column(db.String(200), nullable=False)
+        nome_chave = db.Column(db.String(200), nullable=False, unique=True, index=True)  # chave_especie(nome)
+        raridade = db.Column(db.String(50), nullable=False, default='Comum')
+        foto = db.Column(db.String(500))  # Caminho da imagem (uma linha para todas as instâncias)
+        data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+        data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+        
+        def to_dict(self):
+            """Converte a Espécie para dicionário"""
+            return {
+                'id': self.id,
+                'nome': self.nome,
+                'raridade': self.raridade,
+                'foto': self.foto or ''
+            }
+    
     class Brainrot(db.Model):
-        """Modelo para representar um Brainrot"""
+        """Modelo para representar um Brainrot (uma instância de uma Espécie do catálogo)"""
         __tablename__ = 'brainrot'
         
         id = db.Column(db.Integer, primary_key=True)
-        nome = db.Column(db.String(200), nullable=False)
-        foto = db.Column(db.String(500))  # Caminho da imagem
+        nome = db.Column(db.String(200), nullable=False, index=True)  # Indexado (o typeahead usa ix_brainrot_nome_lower)
+        especie_id = db.Column(db.Integer, db.ForeignKey('especie.id'), index=True)  # Preenchido pelo catálogo no flush
+        impressao_digital = db.Column(db.String(40), index=True)  # SHA-1 de impressao_digital(), mantido no flush
         raridade = db.Column(db.String(50), nullable=False, default='Comum')
+        raridade_ordem = db.Column(db.SmallInteger, nullable=False, default=ORDEM_RARIDADES['Comum'], server_default='1')  # Rank da raridade para ordenar no banco
         valor_por_segundo = db.Column(db.Float, default=0.0)  # Mantido para compatibilidade
         valor_formatado = db.Column(db.String(50), default='$0/s')  # Valor formatado (ex: $1.3B/s)
         quantidade = db.Column(db.Integer, default=1)
         numero_mutacoes = db.Column(db.Integer, default=0)  # Mantido para compatibilidade
         eventos = db.Column(db.Text)  # JSON com lista de eventos
         ordem = db.Column(db.Integer, default=0)  # Ordem personalizada para arrastar e soltar
-        campos_personalizados = db.Column(db.Text)  # JSON com campos dinâmicos
+        campos_personalizados = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'))  # Campos dinâmicos (JSONB no Postgres, ver campos.py)
         favorito = db.Column(db.Boolean, default=False)  # Sistema de favoritos
         tags = db.Column(db.Text)  # JSON com lista de tags
         data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
-        data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+        data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+        # Versão dos dados em que a linha (ou suas associações) mudou por último (?since=)
+        versao_alteracao = db.Column(db.BigInteger, nullable=False, default=0, server_default='0', index=True)
         
         # Relacionamento N:N com Contas
         contas = db.relationship('Conta', secondary=brainrot_conta, back_populates='brainrots', lazy='dynamic')
         
+        # Espécie do catálogo (carregada no mesmo SELECT da instância)
+        especie = db.relationship('Especie', lazy='joined')
+        
+        # Índice na mesma ordem usada pela interface (raridade, ordem personalizada, criação)
+        __table_args__ = (
+            db.Index('ix_brainrot_ordem_exibicao', 'raridade_ordem', 'ordem', 'data_criacao'),
+            # Typeahead por prefixo sem diferenciar maiúsculas (lower(nome) LIKE 'x%')
+            db.Index('ix_brainrot_nome_lower', db.func.lower(nome).label('nome_lower'),
+                     postgresql_ops={'nome_lower': 'text_pattern_ops'}),
+            # Filtro por igualdade nos campos personalizados (@>); só existe no Postgres
+            db.Index('ix_brainrot_campos_personalizados', 'campos_personalizados', postgresql_using='gin',
+                     postgresql_ops={'campos_personalizados': 'jsonb_path_ops'}).ddl_if(dialect='postgresql'),
+        )
+        
+        @property
+        def foto(self):
+            """Foto da espécie (compartilhada por todas as instâncias com o mesmo nome)"""
+            pendente = self.__dict__.get('_foto_pendente')
+            if pendente:
+                return pendente
+            return self.especie.foto if self.especie is not None else None
+        
+        @foto.setter
+        def foto(self, valor):
+            """Troca a foto da espécie; vazio remove a foto da espécie da instância
+            
+            Se a instância ainda não tem espécie (ou acabou de mudar de nome), a foto fica
+            pendente e é aplicada à espécie certa no próximo flush (ver catalogo.py); nesse
+            caso vazio não faz nada, para um brainrot novo não apagar a foto do catálogo.
+            """
+            valor = (valor or '').strip()
+            especie = self.especie
+            if especie is not None and especie.nome_chave == chave_especie(self.nome):
+                especie.foto = valor
+                self.__dict__.pop('_foto_pendente', None)
+            elif valor:
+                self.__dict__['_foto_pendente'] = valor
+        
+        @validates('raridade')
+        def _sincronizar_raridade_ordem(self, key, raridade):
+            """Mantém raridade_ordem sincronizada sempre que a raridade muda"""
+            self.raridade_ordem = ORDEM_RARIDADES.get(raridade, 0)
+            return raridade
+        
         def get_campos_personalizados(self):
             """Retorna os campos personalizados como dicionário"""
-            if self.campos_personalizados:
+            campos = self.campos_personalizados
+            if isinstance(campos, str):
+                # Texto JSON atribuído diretamente (ainda não relido do banco)
                 try:
-                    return json.loads(self.campos_personalizados)
-                except:
+                    campos = json.loads(campos)
+                except ValueError:
                     return {}
-            return {}
+            return dict(campos) if isinstance(campos, dict) else {}
         
         def set_campos_personalizados(self, campos_dict):
             """Define os campos personalizados a partir de um dicionário"""
             # Se o dicionário estiver vazio, salvar como JSON vazio (permitindo remover todos os campos)
-            if campos_dict:
-                self.campos_personalizados = json.dumps(campos_dict)
-            else:
-                self.campos_personalizados = json.dumps({})
+            # Sempre um dicionário novo: alterações dentro do mesmo objeto não são detectadas pelo ORM
+            self.campos_personalizados = dict(campos_dict or {})
         
         def get_eventos(self):
             """Retorna os eventos como lista"""
@@ -87,17 +211,7 @@ def create_models(db):
         
         def get_raridade_ordem(self):
             """Retorna a ordem numérica da raridade para ordenação"""
-            ordem_raridades = {
-                'Comum': 1,
-                'Raro': 2,
-                'Épico': 3,
-                'Lendário': 4,
-                'Mítico': 5,
-                'Deus Brainrot': 6,
-                'Secreto': 7,
-                'OG': 8
-            }
-            return ordem_raridades.get(self.raridade, 0)
+            return ORDEM_RARIDADES.get(self.raridade, 0)
         
         def to_dict(self):
             """Converte o Brainrot para dicionário"""
@@ -134,7 +248,9 @@ def create_models(db):
         roblox_id = db.Column(db.String(100))  # ID opcional do Roblox
         espacos = db.Column(db.Integer, default=0)  # Número de espaços para brainrots
         data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
-        data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+        data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+        # Versão dos dados em que a linha (ou suas associações) mudou por último (?since=)
+        versao_alteracao = db.Column(db.BigInteger, nullable=False, default=0, server_default='0', index=True)
         
         # Relacionamento N:N com Brainrots
         brainrots = db.relationship('Brainrot', secondary=brainrot_conta, back_populates='contas', lazy='dynamic')
@@ -255,12 +371,18 @@ def create_models(db):
         nome = db.Column(db.String(200), nullable=False)
         descricao = db.Column(db.Text)
         tipo = db.Column(db.String(50), nullable=False)  # 'raridade', 'quantidade', 'valor', 'evento'
-        valor_alvo = db.Column(db.Integer, nullable=False)
-        valor_atual = db.Column(db.Integer, default=0)
+        parametro = db.Column(db.String(100))  # Raridade ou evento alvo (metas 'raridade'/'evento')
+        valor_alvo = db.Column(db.BigInteger, nullable=False)
+        valor_atual = db.Column(db.BigInteger, default=0)
         concluida = db.Column(db.Boolean, default=False)
         data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
         data_conclusao = db.Column(db.DateTime)
         
+        # Índice usado pelos UPDATEs incrementais do motor de metas
+        __table_args__ = (
+            db.Index('ix_meta_tipo_parametro', 'tipo', 'parametro'),
+        )
+        
         def get_progresso(self):
             """Retorna o progresso em porcentagem"""
             if self.valor_alvo == 0:
@@ -274,6 +396,7 @@ def create_models(db):
                 'nome': self.nome,
                 'descricao': self.descricao,
                 'tipo': self.tipo,
+                'parametro': self.parametro,
                 'valor_alvo': self.valor_alvo,
                 'valor_atual': self.valor_atual,
                 'concluida': self.concluida,
@@ -282,4 +405,22 @@ def create_models(db):
                 'data_conclusao': self.data_conclusao.isoformat() if self.data_conclusao else None
             }
     
-    return brainrot_conta, Brainrot, Conta, CampoPersonalizado, HistoricoAlteracao, FiltroSalvo, Meta
+    class VersaoDados(db.Model):
+        """Contador global incrementado a cada alteração de brainrots, contas ou associações"""
+        __tablename__ = 'versao_dados'
+        
+        id = db.Column(db.Integer, primary_key=True)
+        versao = db.Column(db.BigInteger, nullable=False, default=0)
+        data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    class Exclusao(db.Model):
+        """Registro de exclusão (tombstone) para a sincronização incremental"""
+        __tablename__ = 'exclusao'
+        
+        id = db.Column(db.Integer, primary_key=True)
+        tipo_entidade = db.Column(db.String(50), nullable=False)  # 'brainrot', 'conta' ou '*' (recarregar tudo)
+        entidade_id = db.Column(db.Integer, nullable=False)
+        versao = db.Column(db.BigInteger, nullable=False, index=True)
+        data_exclusao = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    return brainrot_conta, Brainrot, Conta, CampoPersonalizado, HistoricoAlteracao, FiltroSalvo, Meta, VersaoDados, Especie, Exclusao
@@ -0,0 +1,115 @@
+"""Profiler sob demanda (cProfile) para requisições de administradores
+
+Desativado por padrão: sem PROFILER_ATIVO=1 nenhum hook é registrado, então não há
+custo algum nas requisições. Quando ativo, uma requisição é perfilada se um usuário
+autenticado pedir (?_profile=1 ou cabeçalho X-Profile: 1) ou se cair na amostragem
+configurada em PROFILER_AMOSTRAGEM (0.0 a 1.0).
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import time
+from datetime import datetime
+
+from flask import g, request
+from flask_login import current_user
+
+SEPARADOR = '__'
+
+
+def init_profiling(app):
+    """Registra os hooks do profiler se estiver habilitado na configuração"""
+    app.config.setdefault('PROFILER_ATIVO', os.getenv('PROFILER_ATIVO', '0') == '1')
+    app.config.setdefault('PROFILER_AMOSTRAGEM', float(os.getenv('PROFILER_AMOSTRAGEM', 0)))
+    app.config.setdefault('PROFILER_PASTA', os.getenv('PROFILER_PASTA', 'profiles'))
+    app.config.setdefault('PROFILER_MAX_ARQUIVOS', int(os.getenv('PROFILER_MAX_ARQUIVOS', 200)))
+
+    if not app.config['PROFILER_ATIVO']:
+        return
+
+    os.makedirs(app.config['PROFILER_PASTA'], exist_ok=True)
+    amostragem = app.config['PROFILER_AMOSTRAGEM']
+
+    @app.before_request
+    def _iniciar_profiler():
+        solicitado = request.args.get('_profile') == '1' or request.headers.get('X-Profile') == '1'
+        if solicitado and not (app.config.get('LOGIN_DISABLED') or current_user.is_authenticated):
+            solicitado = False
+        if not solicitado and not (amostragem and random.random() < amostragem):
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Outro profiler já está ativo nesta thread
+            return
+        g._profiler = (profiler, time.perf_counter())
+
+    @app.after_request
+    def _finalizar_profiler(response):
+        dados = g.pop('_profiler', None)
+        if dados is None:
+            return response
+
+        profiler, inicio = dados
+        profiler.disable()
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        try:
+            salvar_perfil(app, profiler, request.endpoint or 'desconhecido', duracao_ms)
+        except OSError as e:
+            app.logger.warning(f'Não foi possível salvar o perfil: {e}')
+        response.headers['X-Profile-Duration'] = f'{duracao_ms:.1f}ms'
+        return response
+
+
+def salvar_perfil(app, profiler, rota, duracao_ms):
+    """Grava o perfil em disco (formato pstats) e remove os mais antigos além do limite"""
+    pasta = app.config['PROFILER_PASTA']
+    carimbo = datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')
+    rota_segura = rota.replace(SEPARADOR, '_').replace('/', '_')
+    nome = f'{carimbo}{SEPARADOR}{rota_segura}{SEPARADOR}{int(duracao_ms)}ms.prof'
+    profiler.dump_stats(os.path.join(pasta, nome))
+
+    arquivos = sorted(f for f in os.listdir(pasta) if f.endswith('.prof'))
+    for antigo in arquivos[:-app.config['PROFILER_MAX_ARQUIVOS']]:
+        try:
+            os.remove(os.path.join(pasta, antigo))
+        except OSError:
+            pass
+    return nome
+
+
+def listar_perfis(app, limite=100):
+    """Lista os perfis salvos, do mais recente para o mais antigo"""
+    pasta = app.config['PROFILER_PASTA']
+    if not os.path.isdir(pasta):
+        return []
+
+    perfis = []
+    for arquivo in sorted(os.listdir(pasta), reverse=True):
+        if not arquivo.endswith('.prof'):
+            continue
+        partes = arquivo[:-len('.prof')].split(SEPARADOR)
+        if len(partes) != 3:
+            continue
+        carimbo, rota, duracao = partes
+        try:
+            data = datetime.strptime(carimbo, '%Y%m%d_%H%M%S_%f')
+            duracao_ms = int(duracao.rstrip('ms'))
+        except ValueError:
+            continue
+        perfis.append({'arquivo': arquivo, 'rota': rota, 'duracao_ms': duracao_ms, 'data': data})
+        if len(perfis) >= limite:
+            break
+    return perfis
+
+
+def resumo_perfil(app, arquivo, ordenacao='cumulative', linhas=60):
+    """Retorna o resumo textual (pstats) de um perfil salvo"""
+    saida = io.StringIO()
+    stats = pstats.Stats(os.path.join(app.config['PROFILER_PASTA'], arquivo), stream=saida)
+    stats.strip_dirs().sort_stats(ordenacao).print_stats(linhas)
+    return saida.getvalue()
@@ -0,0 +1,325 @@
+"""Relatórios em PDF do inventário, gerados em lotes e guardados em disco
+
+O PDF lista todos os brainrots em seções por raridade e por conta, com cabeçalho de
+colunas repetido e número de página, e termina com um resumo por raridade. As linhas
+vêm do banco em lotes (yield_per), então a memória não cresce com o inventário.
+
+Cada PDF é gravado em RELATORIOS_PASTA com um nome derivado da versão dos dados e dos
+parâmetros: um novo download com os mesmos dados é servido direto do disco. A versão
+do nome e do cabeçalho é lida na mesma transação das linhas (REPEATABLE READ no
+Postgres; no SQLite em WAL a transação de leitura já é um retrato), então o arquivo
+corresponde exatamente a ela mesmo que os dados mudem durante a geração. Inventários
+acima de RELATORIOS_LIMITE_SINCRONO linhas são gerados em uma thread em segundo plano
+(um arquivo .lock evita que dois workers gerem o mesmo relatório ao mesmo tempo).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from models import RARIDADES
+from metas import valor_renda
+from versioning import VERSAO_ID
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+DISPONIVEL = canvas is not None
+
+SECOES = ('raridade', 'conta')
+LOTE = 1000
+# Um .lock mais antigo que isso é de uma geração que morreu no meio
+LOCK_EXPIRADO_S = 600
+
+_estado = {}
+_em_andamento = set()
+_lock = threading.Lock()
+
+
+def init_relatorios(app, db, Brainrot, Conta, brainrot_conta, VersaoDados):
+    app.config.setdefault('RELATORIOS_PASTA', os.getenv('RELATORIOS_PASTA', 'relatorios'))
+    app.config.setdefault('RELATORIOS_MAX_ARQUIVOS', int(os.getenv('RELATORIOS_MAX_ARQUIVOS', 20)))
+    app.config.setdefault('RELATORIOS_LIMITE_SINCRONO', int(os.getenv('RELATORIOS_LIMITE_SINCRONO', 5000)))
+    _estado.update(app=app, db=db, Brainrot=Brainrot, Conta=Conta, brainrot_conta=brainrot_conta,
+                   VersaoDados=VersaoDados)
+
+
+def normalizar_parametros(args):
+    """Parâmetros aceitos pelo relatório, em forma canônica (usada na chave do cache)"""
+    secoes = [s for s in (args.get('secoes') or ','.join(SECOES)).split(',') if s in SECOES]
+    return {
+        'secoes': secoes or list(SECOES),
+        'raridade': args.get('raridade') or None,
+        'conta_id': int(args['conta_id']) if args.get('conta_id') else None,
+    }
+
+
+def caminho_relatorio(versao, parametros):
+    pasta = _estado['app'].config['RELATORIOS_PASTA']
+    resumo = hashlib.sha1(json.dumps(parametros, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(pasta, f'brainrots_v{versao}_{resumo}.pdf')
+
+
+def total_linhas(parametros):
+    """Estimativa do tamanho do relatório (linhas que serão desenhadas)"""
+    db, Brainrot, tabela = _estado['db'], _estado['Brainrot'], _estado['brainrot_conta']
+    total = 0
+    if 'raridade' in parametros['secoes']:
+        query = select(func.count()).select_from(Brainrot)
+        if parametros['raridade']:
+            query = query.where(Brainrot.raridade == parametros['raridade'])
+        total += db.session.execute(query).scalar() or 0
+    if 'conta' in parametros['secoes']:
+        query = select(func.count()).select_from(tabela)
+        if parametros['conta_id']:
+            query = query.where(tabela.c.conta_id == parametros['conta_id'])
+        total += db.session.execute(query).scalar() or 0
+    return total
+
+
+class _EscritorPDF:
+    """Desenha linhas em colunas, quebrando páginas e repetindo o cabeçalho da seção"""
+
+    MARGEM = 40
+    ALTURA_LINHA = 14
+
+    def __init__(self, arquivo, titulo):
+        self.pdf = canvas.Canvas(arquivo, pagesize=A4, pageCompression=1)
+        self.pdf.setTitle(titulo)
+        self.largura, self.altura = A4
+        self.titulo = titulo
+        self.pagina = 0
+        self.secao = None
+        self.colunas = None
+        self._nova_pagina()
+
+    def _nova_pagina(self):
+        if self.pagina:
+            self.pdf.showPage()
+        self.pagina += 1
+        self.y = self.altura - self.MARGEM
+        self.pdf.setFont('Helvetica', 8)
+        self.pdf.drawString(self.MARGEM, self.MARGEM / 2, self.titulo)
+        self.pdf.drawRightString(self.largura - self.MARGEM, self.MARGEM / 2, f'Página {self.pagina}')
+        if self.secao:
+            self._cabecalho_secao(continuacao=True)
+
+    def _cabecalho_secao(self, continuacao=False):
+        self.pdf.setFont('Helvetica-Bold', 12)
+        self.pdf.drawString(self.MARGEM, self.y, self.secao + (' (continuação)' if continuacao else ''))
+        self.y -= self.ALTURA_LINHA * 1.5
+        if self.colunas:
+            self.pdf.setFont('Helvetica-Bold', 9)
+            for titulo, x, _ in self.colunas:
+                self.pdf.drawString(self.MARGEM + x, self.y, titulo)
+            self.y -= self.ALTURA_LINHA
+        self.pdf.setFont('Helvetica', 9)
+
+    def titulo_documento(self, texto, subtitulo):
+        self.pdf.setFont('Helvetica-Bold', 18)
+        self.pdf.drawString(self.MARGEM, self.y, texto)
+        self.y -= 22
+        self.pdf.setFont('Helvetica', 10)
+        self.pdf.drawString(self.MARGEM, self.y, subtitulo)
+        self.y -= 28
+
+    def iniciar_secao(self, nome, colunas):
+        """colunas: lista de (título, deslocamento x, largura máxima em caracteres)"""
+        self.secao = nome
+        self.colunas = colunas
+        if self.y < self.MARGEM + self.ALTURA_LINHA * 5:
+            self._nova_pagina()
+        else:
+            self.y -= self.ALTURA_LINHA / 2
+            self._cabecalho_secao()
+
+    def linha(self, valores):
+        if self.y < self.MARGEM + self.ALTURA_LINHA:
+            self._nova_pagina()
+        for (_, x, limite), valor in zip(self.colunas, valores):
+            texto = '' if valor is None else str(valor)
+            if len(texto) > limite:
+                texto = texto[:limite - 1] + '…'
+            self.pdf.drawString(self.MARGEM + x, self.y, texto)
+        self.y -= self.ALTURA_LINHA
+
+    def salvar(self):
+        self.pdf.save()
+
+
+COLUNAS_BRAINROT = [('Nome', 0, 40), ('Raridade', 215, 14), ('Valor', 295, 14),
+                    ('Qtd', 370, 5), ('Mut.', 400, 5), ('Eventos', 430, 22)]
+
+
+def _eventos_texto(valor):
+    try:
+        return ', '.join(json.loads(valor)) if valor else ''
+    except (ValueError, TypeError):
+        return ''
+
+
+def _linha_brainrot(linha):
+    return (linha.nome, linha.raridade, linha.valor_formatado or f'${linha.valor_por_segundo or 0}/s',
+            linha.quantidade, linha.numero_mutacoes, _eventos_texto(linha.eventos))
+
+
+def _abrir_leitura_consistente():
+    """Conexão com uma transação de leitura em que todas as consultas veem o mesmo retrato"""
+    conexao = _estado['db'].engine.connect()
+    if conexao.dialect.name == 'postgresql':
+        conexao = conexao.execution_options(isolation_level='REPEATABLE READ', postgresql_readonly=True)
+    conexao.begin()
+    return conexao
+
+
+def ler_versao(conexao):
+    """Versão dos dados vista pela transação da conexão"""
+    tabela = _estado['VersaoDados'].__table__
+    return conexao.execute(select(tabela.c.versao).where(tabela.c.id == VERSAO_ID)).scalar() or 0
+
+
+def escrever_relatorio(conexao, arquivo, parametros, versao):
+    """Gera o PDF em `arquivo` lendo os brainrots em lotes pela conexão (mesma transação de `versao`)"""
+    Brainrot, Conta, tabela = _estado['Brainrot'], _estado['Conta'], _estado['brainrot_conta']
+    colunas = (Brainrot.nome, Brainrot.raridade, Brainrot.valor_formatado, Brainrot.valor_por_segundo,
+               Brainrot.quantidade, Brainrot.numero_mutacoes, Brainrot.eventos)
+    ordem = (Brainrot.raridade_ordem, Brainrot.ordem, Brainrot.data_criacao, Brainrot.id)
+    escritor = _EscritorPDF(arquivo, 'Relatório de Brainrots')
+    escritor.titulo_documento(
+        'Relatório de Brainrots',
+        f'Gerado em {datetime.now().strftime("%d/%m/%Y %H:%M")} - versão dos dados {versao}'
+    )
+    resumo = defaultdict(lambda: [0, 0.0])
+
+    if 'raridade' in parametros['secoes']:
+        query = select(*colunas).order_by(*ordem)
+        if parametros['raridade']:
+            query = query.where(Brainrot.raridade == parametros['raridade'])
+        raridade_atual = object()
+        for linha in conexao.execute(query.execution_options(yield_per=LOTE)):
+            if linha.raridade != raridade_atual:
+                raridade_atual = linha.raridade
+                escritor.iniciar_secao(f'Raridade: {raridade_atual}', COLUNAS_BRAINROT)
+            escritor.linha(_linha_brainrot(linha))
+            item = resumo[linha.raridade]
+            item[0] += 1
+            item[1] += valor_renda(linha.valor_formatado, linha.valor_por_segundo, linha.quantidade)
+
+    if 'conta' in parametros['secoes']:
+        query = (select(Conta.id.label('conta_id'), Conta.nome.label('conta_nome'), Conta.espacos, *colunas)
+                 .join(tabela, tabela.c.brainrot_id == Brainrot.id)
+                 .join(Conta, Conta.id == tabela.c.conta_id)
+                 .order_by(Conta.nome, Conta.id, *ordem))
+        if parametros['conta_id']:
+            query = query.where(Conta.id == parametros['conta_id'])
+        conta_atual = None
+        for linha in conexao.execute(query.execution_options(yield_per=LOTE)):
+            if linha.conta_id != conta_atual:
+                conta_atual = linha.conta_id
+                espacos = f'{linha.espacos} espaços' if linha.espacos else 'espaços ilimitados'
+                escritor.iniciar_secao(f'Conta: {linha.conta_nome} ({espacos})', COLUNAS_BRAINROT)
+            escritor.linha(_linha_brainrot(linha))
+
+    if resumo:
+        escritor.iniciar_secao('Resumo por raridade', [('Raridade', 0, 30), ('Brainrots', 200, 12),
+                                                       ('Renda total/s', 300, 24)])
+        ordem_raridades = {nome: i for i, nome in enumerate(RARIDADES)}
+        for raridade in sorted(resumo, key=lambda r: ordem_raridades.get(r, len(ordem_raridades))):
+            quantidade, renda = resumo[raridade]
+            escritor.linha((raridade, quantidade, f'{renda:,.0f}'.replace(',', '.')))
+    escritor.salvar()
+
+
+def gerar(parametros):
+    """Gera o relatório no caminho do cache (escrita atômica). Retorna o caminho
+
+    O nome do arquivo usa a versão lida na transação da geração, que pode ser mais nova
+    que a da requisição que pediu o relatório.
+    """
+    app = _estado['app']
+    os.makedirs(app.config['RELATORIOS_PASTA'], exist_ok=True)
+    conexao = _abrir_leitura_consistente()
+    try:
+        versao = ler_versao(conexao)
+        caminho = caminho_relatorio(versao, parametros)
+        temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            escrever_relatorio(conexao, temporario, parametros, versao)
+            os.replace(temporario, caminho)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+    finally:
+        conexao.close()
+    _limpar_antigos(app.config['RELATORIOS_PASTA'], app.config['RELATORIOS_MAX_ARQUIVOS'])
+    return caminho
+
+
+def _limpar_antigos(pasta, maximo):
+    arquivos = sorted(
+        (os.path.join(pasta, nome) for nome in os.listdir(pasta) if nome.endswith('.pdf')),
+        key=os.path.getmtime, reverse=True
+    )
+    for antigo in arquivos[maximo:]:
+        try:
+            os.remove(antigo)
+        except OSError:
+            pass
+
+
+def _adquirir_lock(caminho):
+    """Lock entre processos via arquivo criado com O_EXCL"""
+    lock = caminho + '.lock'
+    try:
+        if time.time() - os.path.getmtime(lock) > LOCK_EXPIRADO_S:
+            os.remove(lock)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return lock
+    except FileExistsError:
+        return None
+
+
+def gerar_em_segundo_plano(parametros, versao):
+    """Dispara a geração em uma thread; retorna False se já está sendo gerado
+
+    `versao` (a da requisição) só identifica a geração em andamento; o arquivo sai com a
+    versão lida pela própria geração.
+    """
+    app = _estado['app']
+    caminho = caminho_relatorio(versao, parametros)
+    os.makedirs(app.config['RELATORIOS_PASTA'], exist_ok=True)
+    with _lock:
+        if caminho in _em_andamento:
+            return False
+        lock = _adquirir_lock(caminho)
+        if lock is None:
+            return False
+        _em_andamento.add(caminho)
+
+    def executar():
+        try:
+            with app.app_context():
+                gerar(parametros)
+        except Exception as e:
+            app.logger.error(f'Erro ao gerar relatório {caminho}: {e}')
+        finally:
+            with _lock:
+                _em_andamento.discard(caminho)
+            try:
+                os.remove(lock)
+            except OSError:
+                pass
+
+    threading.Thread(target=executar, name='relatorio-pdf', daemon=True).start()
+    return True
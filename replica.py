@@ -0,0 +1,210 @@
+"""Leituras em uma réplica do banco (opcional, READ_DATABASE_URL)
+
+Com READ_DATABASE_URL definida, o engine da réplica é registrado como o bind 'leitura'
+e as rotas de leitura marcadas com @leitura_replica consultam a réplica. Continuam no
+primário:
+
+    - requisições que não são GET/HEAD;
+    - qualquer consulta da sessão depois de um flush/commit na mesma requisição
+      (ler o que acabou de ser escrito);
+    - as requisições do mesmo usuário por REPLICA_ATRASO_MAXIMO segundos depois de uma
+      escrita (a réplica ainda pode não ter recebido a alteração);
+    - todas as requisições enquanto a réplica estiver atrasada mais que
+      REPLICA_ATRASO_MAXIMO ou fora do ar (nova tentativa após REPLICA_ESPERA_FALHA_S).
+
+O atraso é medido comparando a linha de versao_dados nos dois bancos (no máximo uma vez
+a cada REPLICA_VERIFICACAO_S por worker): versões iguais = réplica em dia; versões
+diferentes = atraso de, no máximo, agora - data_atualizacao da réplica.
+Se uma consulta na réplica falhar no meio da requisição, a réplica é marcada como fora
+do ar e a view é executada de novo no primário.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, select
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+logger = logging.getLogger('brainrot.replica')
+
+BIND_LEITURA = 'leitura'
+
+_estado = {'fora_do_ar_ate': 0.0, 'verificado_em': 0.0, 'saudavel': False, 'atraso': None}
+_trava = threading.RLock()
+
+
+def configurar_replica(app, url):
+    """Registra o bind da réplica (chamar antes de criar o SQLAlchemy)"""
+    if url:
+        app.config.setdefault('SQLALCHEMY_BINDS', {})[BIND_LEITURA] = {'url': url, 'pool_pre_ping': True}
+
+
+class SessaoRoteada(Session):
+    """Sessão que envia as consultas de leitura para a réplica quando a requisição permite"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._pode_usar_replica(clause):
+            engine = self._db.engines.get(BIND_LEITURA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _pode_usar_replica(self, clause):
+        if not has_app_context() or not g.get('_usar_replica'):
+            return False
+        if self._flushing or self.info.get('escreveu') or self.new or self.dirty or self.deleted:
+            return False
+        # Só SELECTs (UPDATE/DELETE em massa e SQL textual vão sempre para o primário)
+        return clause is None or getattr(clause, 'is_select', False)
+
+
+def _atraso_replica(db, VersaoDados):
+    """Segundos de atraso da réplica (0 se em dia); lança exceção se a réplica falhar"""
+    tabela = VersaoDados.__table__
+    consulta = select(tabela.c.versao, tabela.c.data_atualizacao).where(tabela.c.id == 1)
+    with db.engines[None].connect() as conexao:
+        primario = conexao.execute(consulta).first()
+    with db.engines[BIND_LEITURA].connect() as conexao:
+        replica = conexao.execute(consulta).first()
+    if primario is None or (replica is not None and replica.versao >= primario.versao):
+        return 0.0
+    if replica is None or replica.data_atualizacao is None:
+        return float('inf')
+    return max(0.0, (datetime.utcnow() - replica.data_atualizacao).total_seconds())
+
+
+def _marcar_fora_do_ar(erro, espera):
+    ja_marcada = time.monotonic() < _estado['fora_do_ar_ate']
+    _estado['fora_do_ar_ate'] = time.monotonic() + espera
+    _estado['saudavel'] = False
+    _estado['atraso'] = None
+    if not ja_marcada:
+        logger.warning(f"Réplica indisponível ({erro.__class__.__name__}); usando o primário por {espera:g}s")
+
+
+def marcar_fora_do_ar(erro):
+    with _trava:
+        _marcar_fora_do_ar(erro, _estado['app'].config['REPLICA_ESPERA_FALHA_S'])
+
+
+def replica_disponivel():
+    """Réplica configurada, no ar e com atraso dentro do limite (verificação memorizada)"""
+    db = _estado.get('db')
+    if db is None or BIND_LEITURA not in db.engines:
+        return False
+    config = current_app.config
+    if time.monotonic() < _estado['fora_do_ar_ate']:
+        return False
+    if time.monotonic() - _estado['verificado_em'] < config['REPLICA_VERIFICACAO_S']:
+        return _estado['saudavel']
+    with _trava:
+        agora = time.monotonic()
+        if agora - _estado['verificado_em'] < config['REPLICA_VERIFICACAO_S']:
+            return _estado['saudavel']
+        _estado['verificado_em'] = agora
+        try:
+            atraso = _atraso_replica(db, _estado['VersaoDados'])
+        except (OperationalError, InterfaceError) as erro:
+            _marcar_fora_do_ar(erro, config['REPLICA_ESPERA_FALHA_S'])
+            return False
+        limite = config['REPLICA_ATRASO_MAXIMO']
+        saudavel = atraso <= limite
+        if saudavel != _estado['saudavel']:
+            if saudavel:
+                logger.info(f"Réplica em dia (atraso {atraso:.1f}s); leituras voltam para a réplica")
+            else:
+                logger.warning(f"Réplica atrasada {atraso:.1f}s (limite {limite:g}s); leituras no primário")
+        _estado.update(atraso=atraso, saudavel=saudavel)
+        return saudavel
+
+
+def estado_replica():
+    """Resumo para diagnóstico (flask replica-status)"""
+    return {
+        'configurada': BIND_LEITURA in _estado['db'].engines,
+        'disponivel': replica_disponivel(),
+        'atraso_s': _estado['atraso'],
+    }
+
+
+def _escreveu_recentemente():
+    ultima = session.get('_ultima_escrita')
+    return ultima is not None and time.time() - ultima < current_app.config['REPLICA_ATRASO_MAXIMO']
+
+
+def _executar_no_primario(view, args, kwargs):
+    _estado['db'].session.rollback()
+    g._usar_replica = False
+    g.pop('_versao_dados', None)
+    return view(*args, **kwargs)
+
+
+def leitura_replica(view):
+    """Executa a view consultando a réplica, se permitido (ver docstring do módulo)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or _escreveu_recentemente() or not replica_disponivel():
+            return view(*args, **kwargs)
+        g._usar_replica = True
+        try:
+            resposta = view(*args, **kwargs)
+        except (OperationalError, InterfaceError):
+            if not g.pop('_replica_falhou', False):
+                raise
+            return _executar_no_primario(view, args, kwargs)
+        finally:
+            g._usar_replica = False
+        # Views que tratam o erro e devolvem 500 em JSON também são repetidas no primário
+        if g.pop('_replica_falhou', False):
+            return _executar_no_primario(view, args, kwargs)
+        return resposta
+    return wrapper
+
+
+def init_replica(app, db, VersaoDados):
+    """Registra o rastreamento de escritas e as configurações da réplica"""
+    _estado.update(app=app, db=db, VersaoDados=VersaoDados)
+    app.config.setdefault('REPLICA_ATRASO_MAXIMO', float(os.getenv('REPLICA_ATRASO_MAXIMO', 5)))
+    app.config.setdefault('REPLICA_VERIFICACAO_S', float(os.getenv('REPLICA_VERIFICACAO_S', 2)))
+    app.config.setdefault('REPLICA_ESPERA_FALHA_S', float(os.getenv('REPLICA_ESPERA_FALHA_S', 30)))
+
+    @event.listens_for(db.session, 'before_flush')
+    def _marcar_escrita(sessao, flush_context, instances):
+        if sessao.new or sessao.dirty or sessao.deleted:
+            sessao.info['escreveu'] = True
+            if has_app_context():
+                g._escreveu = True
+
+    if BIND_LEITURA in app.config.get('SQLALCHEMY_BINDS', {}):
+        with app.app_context():
+            engine_replica = db.engines[BIND_LEITURA]
+
+        @event.listens_for(engine_replica, 'handle_error')
+        def _falha_na_replica(contexto):
+            if isinstance(contexto.sqlalchemy_exception, (OperationalError, InterfaceError)):
+                marcar_fora_do_ar(contexto.sqlalchemy_exception)
+                if has_app_context():
+                    g._replica_falhou = True
+
+    @app.after_request
+    def _lembrar_escrita(response):
+        # O usuário que escreveu continua no primário enquanto a réplica pode estar atrasada
+        if g.get('_escreveu') and BIND_LEITURA in db.engines:
+            session['_ultima_escrita'] = time.time()
+        return response
+
+    @app.cli.command('replica-status')
+    def replica_status_command():
+        """Mostra se a réplica de leitura está configurada, no ar e o atraso medido"""
+        estado = estado_replica()
+        if not estado['configurada']:
+            print("READ_DATABASE_URL não definida: todas as leituras usam o primário")
+            return
+        atraso = estado['atraso_s']
+        print(f"Réplica {'disponível' if estado['disponivel'] else 'INDISPONÍVEL'}"
+              + (f", atraso {atraso:.1f}s" if atraso is not None else ""))
@@ -1,16 +1,34 @@
-from app import app, db, Brainrot, Conta, CampoPersonalizado, brainrot_conta, HistoricoAlteracao, FiltroSalvo, Meta
+from app import app, db, Brainrot, Conta, CampoPersonalizado, brainrot_conta, HistoricoAlteracao, FiltroSalvo, Meta, Especie
+from models import RARIDADES, parse_valor_formatado
 from flask import render_template, request, jsonify, redirect, url_for, flash, send_from_directory
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
 from auth import get_user
+from profiling import listar_perfis, resumo_perfil
+from metrics import gerar_metricas, CONTENT_TYPE as METRICAS_CONTENT_TYPE
+from versioning import incrementar_versao, obter_versao
+from cache import CacheLRU
+from fragmentos import sob_demanda
+from metas import recalcular_meta, atualizar_meta, valor_renda
+from alocacao import calcular_alocacao, ErroAlocacao
+from capacidade import verificar_capacidade, bloquear_contas, ocupacao_contas, ErroCapacidade
+import analytics
+from snapshot import obter_snapshot
+import relatorios
+from backup import gerar_backup_compactado
+from catalogo import especie_por_nome
+from importacao import importar_brainrots, ErroImportacao, CAMPOS_IMPRESSAO
+from replica import leitura_replica
+from eventos import stream_eventos, registrar_alteracao
+from sincronizacao import delta, ler_desde, marcar_alterados, ErroSincronizacao
+from lote import executar_lote, ErroLote
+from auditoria import registrar_historico
+from campos import ler_filtros_campos, aplicar_filtros_campos, validar_campo, criar_indice_campo
 import os
 import json
-import re
 from datetime import datetime
 from collections import defaultdict
-
-# Lista de raridades disponíveis
-RARIDADES = ['Comum', 'Raro', 'Épico', 'Lendário', 'Mítico', 'Deus Brainrot', 'Secreto', 'OG']
+from sqlalchemy import and_, func, or_
 
 # Lista de eventos disponíveis
 EVENTOS = [
@@ -24,39 +42,21 @@ EVENTOS = [
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
+# Paginação do typeahead de brainrots (formulários)
+TYPEAHEAD_POR_PAGINA = 20
+TYPEAHEAD_POR_PAGINA_MAX = 50
+
+# Paginação dos resultados de filtros salvos
+FILTROS_POR_PAGINA = 50
+FILTROS_POR_PAGINA_MAX = 200
+
+# Conjuntos de ids dos filtros salvos, por versão dos dados
+_cache_filtros_salvos = CacheLRU('filtros_salvos', max_itens=256)
+_cache_analytics = CacheLRU('analytics', max_itens=16)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def parse_valor_formatado(valor_str):
-    """Converte valor formatado (ex: $50K/s, $1.5M/s) para número para comparação"""
-    if not valor_str:
-        return 0.0
-    
-    try:
-        # Remover espaços e converter para maiúsculo
-        valor_str = str(valor_str).strip().upper()
-        
-        # Extrair número (pode ter ponto decimal)
-        match = re.search(r'([\d.]+)', valor_str)
-        if not match:
-            return 0.0
-        
-        numero = float(match.group(1))
-        
-        # Multiplicadores baseados no sufixo
-        if 'K' in valor_str:
-            return numero * 1000
-        elif 'M' in valor_str:
-            return numero * 1000000
-        elif 'B' in valor_str:
-            return numero * 1000000000
-        elif 'T' in valor_str:
-            return numero * 1000000000000
-        
-        return numero
-    except (ValueError, AttributeError):
-        return 0.0
-
 def formatar_valor_range(valores_formatados):
     """Recebe uma lista de valores formatados e retorna o range (menor - maior)"""
     if not valores_formatados:
@@ -85,6 +85,95 @@ def formatar_valor_range(valores_formatados):
     # Retornar range (menor - maior)
     return f"{menor_formatado} - {maior_formatado}"
 
+def _ler_filtro(filtros, chave, tipo=str):
+    """Lê um filtro de request.args ou de um dicionário (filtro salvo), ignorando valores vazios"""
+    valor = filtros.get(chave)
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    try:
+        return tipo(valor.strip() if isinstance(valor, str) else valor)
+    except (TypeError, ValueError):
+        return None
+
+def ler_filtros_brainrot(filtros):
+    """Converte os filtros de brainrot (request.args ou filtro salvo) para os tipos certos"""
+    tipos = {
+        'busca': str, 'raridade': str, 'valor_formato': str,  # valor_formato: /s, K/s, M/s, B/s
+        'valor_min': float, 'valor_max': float,
+        'quantidade_min': int, 'quantidade_max': int,
+        'mutacoes_min': int, 'mutacoes_max': int,
+        'evento': str, 'tag': str, 'conta_id': int,
+    }
+    valores = {chave: _ler_filtro(filtros, chave, tipo) for chave, tipo in tipos.items()}
+    # Campos personalizados: campo.<nome>=valor, campo.<nome>.min / .max
+    valores['campos'] = ler_filtros_campos(filtros)
+    return valores
+
+def aplicar_filtros_brainrot(query, filtros):
+    """Aplica busca e filtros de brainrot à query. Retorna (query, tem_filtros)"""
+    valores = ler_filtros_brainrot(filtros)
+    busca = valores['busca']
+    raridade = valores['raridade']
+    valor_min = valores['valor_min']
+    valor_max = valores['valor_max']
+    valor_formato = valores['valor_formato']
+    quantidade_min = valores['quantidade_min']
+    quantidade_max = valores['quantidade_max']
+    mutacoes_min = valores['mutacoes_min']
+    mutacoes_max = valores['mutacoes_max']
+    evento = valores['evento']  # Filtro por evento
+    tag = valores['tag']
+    conta_id = valores['conta_id']
+    campos = valores['campos']
+    
+    # autoescape: % e _ digitados são literais, como na busca em memória do snapshot
+    if busca:
+        query = query.filter(Brainrot.nome.icontains(busca, autoescape=True))
+    if raridade:
+        query = query.filter(Brainrot.raridade == raridade)
+    
+    # Filtro por formato de valor (valor_formatado contém o formato)
+    if valor_formato:
+        query = query.filter(Brainrot.valor_formatado.endswith(valor_formato, autoescape=True))
+    
+    # Filtro por valor numérico (pelo valor_por_segundo)
+    if valor_min is not None:
+        query = query.filter(Brainrot.valor_por_segundo >= valor_min)
+    if valor_max is not None:
+        query = query.filter(Brainrot.valor_por_segundo <= valor_max)
+    
+    if quantidade_min is not None:
+        query = query.filter(Brainrot.quantidade >= quantidade_min)
+    if quantidade_max is not None:
+        query = query.filter(Brainrot.quantidade <= quantidade_max)
+    if mutacoes_min is not None:
+        query = query.filter(Brainrot.numero_mutacoes >= mutacoes_min)
+    if mutacoes_max is not None:
+        query = query.filter(Brainrot.numero_mutacoes <= mutacoes_max)
+    
+    # Filtro por evento (lista de eventos em JSON)
+    if evento:
+        query = query.filter(Brainrot.eventos.contains(f'"{evento}"', autoescape=True))
+    
+    # Filtro por tag (lista de tags em JSON)
+    if tag:
+        query = query.filter(Brainrot.tags.contains(f'"{tag}"', autoescape=True))
+    
+    if conta_id:
+        query = query.join(brainrot_conta).filter(brainrot_conta.c.conta_id == conta_id)
+    
+    # Filtros tipados nos campos personalizados (operadores indexáveis, ver campos.py)
+    if campos:
+        query = aplicar_filtros_campos(query, Brainrot.campos_personalizados, campos)
+    
+    tem_filtros = any([
+        busca, raridade, valor_min is not None, valor_max is not None, valor_formato,
+        quantidade_min is not None, quantidade_max is not None,
+        mutacoes_min is not None, mutacoes_max is not None,
+        evento, tag, conta_id, campos
+    ])
+    return query, tem_filtros
+
 # ==================== AUTENTICAÇÃO ====================
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -120,51 +209,46 @@ def logout():
 
 @app.route('/')
 @login_required
+@leitura_replica
 def index():
-    """Página inicial com dashboard"""
-    total_contas = Conta.query.count()
-    total_brainrots = Brainrot.query.count()
-    
-    # Brainrots recentes
-    brainrots_recentes = Brainrot.query.order_by(Brainrot.data_criacao.desc()).limit(5).all()
-    
-    # Top 30 brainrots que mais pagam
-    # Buscar todos os brainrots e ordenar por valor (usando parse_valor_formatado)
-    todos_brainrots = Brainrot.query.all()
-    brainrots_com_valor = []
-    for br in todos_brainrots:
-        valor_num = parse_valor_formatado(br.valor_formatado) if br.valor_formatado else br.valor_por_segundo or 0
-        # Multiplicar pela quantidade para considerar o valor total
-        valor_total = valor_num * (br.quantidade or 1)
-        brainrots_com_valor.append((br, valor_total, valor_num))
-    
-    # Ordenar por valor total (decrescente) e pegar top 30
-    brainrots_com_valor.sort(key=lambda x: x[1], reverse=True)
-    top_30_brainrots = [br[0] for br in brainrots_com_valor[:30]]
+    """Página inicial com dashboard (blocos em cache pela versão dos dados, ver fragmentos.py)"""
+    def carregar_top_30():
+        # Top 30 brainrots que mais pagam
+        # Buscar todos os brainrots e ordenar por valor (usando parse_valor_formatado)
+        todos_brainrots = Brainrot.query.all()
+        brainrots_com_valor = []
+        for br in todos_brainrots:
+            valor_num = parse_valor_formatado(br.valor_formatado) if br.valor_formatado else br.valor_por_segundo or 0
+            # Multiplicar pela quantidade para considerar o valor total
+            valor_total = valor_num * (br.quantidade or 1)
+            brainrots_com_valor.append((br, valor_total, valor_num))
+        
+        # Ordenar por valor total (decrescente) e pegar top 30
+        brainrots_com_valor.sort(key=lambda x: x[1], reverse=True)
+        return [br[0] for br in brainrots_com_valor[:30]]
     
-    # Metas
+    # Metas (fora do cache: não fazem parte da versão dos dados)
     metas = Meta.query.all() if Meta else []
     
     return render_template('index.html',
-                         total_contas=total_contas,
-                         total_brainrots=total_brainrots,
-                         brainrots_recentes=brainrots_recentes,
-                         top_30_brainrots=top_30_brainrots,
+                         contar_contas=lambda: Conta.query.count(),
+                         contar_brainrots=lambda: Brainrot.query.count(),
+                         carregar_recentes=lambda: Brainrot.query.order_by(Brainrot.data_criacao.desc()).limit(5).all(),
+                         carregar_top_30=carregar_top_30,
                          metas=metas)
 
 @app.route('/brainrots')
 @login_required
+@leitura_replica
 def brainrots_list():
     """Lista todos os Brainrots"""
-    # Contar brainrots por raridade
-    total_brainrots = Brainrot.query.count()
-    brainrots_por_raridade = {}
-    for raridade in RARIDADES:
-        brainrots_por_raridade[raridade] = Brainrot.query.filter_by(raridade=raridade).count()
+    # Contar brainrots por raridade (uma consulta, só se os blocos não estiverem em cache)
+    contar_por_raridade = sob_demanda(lambda: dict(
+        db.session.query(Brainrot.raridade, db.func.count(Brainrot.id)).group_by(Brainrot.raridade).all()
+    ))
     
     return render_template('brainrots/list.html', 
-                         total_brainrots=total_brainrots,
-                         brainrots_por_raridade=brainrots_por_raridade)
+                         contar_por_raridade=contar_por_raridade)
 
 @app.route('/brainrots/novo')
 @login_required
@@ -173,16 +257,16 @@ def brainrot_new():
     conta_id = request.args.get('conta_id', type=int)  # ID da conta se vier da página de detalhes
     contas = Conta.query.all()
     campos_personalizados = CampoPersonalizado.query.all()
-    brainrots_existentes = Brainrot.query.all()  # Para opção de copiar
+    # A opção de copiar busca sob demanda em /api/brainrots/typeahead
     return render_template('brainrots/form.html', 
                          brainrot=None, 
                          contas=contas,
+                         ocupacao=ocupacao_contas([c.id for c in contas]),
                          conta_pre_selecionada=conta_id,
                          conta_id_url=conta_id,  # Para usar no JavaScript
                          campos_personalizados=campos_personalizados,
                          raridades=RARIDADES,
-                         eventos=EVENTOS,
-                         brainrots_existentes=brainrots_existentes)
+                         eventos=EVENTOS)
 
 @app.route('/brainrots/<int:id>/editar')
 @login_required
@@ -209,21 +293,21 @@ def brainrot_edit(id):
             'quantidade': inst.quantidade
         })
     
-    brainrots_existentes = Brainrot.query.all()  # Para opção de copiar
     return render_template('brainrots/form.html',
                          brainrot=brainrot,
                          contas=contas,
+                         ocupacao=ocupacao_contas([c.id for c in contas]),
                          contas_associadas=contas_associadas,
                          conta_pre_selecionada=conta_id,  # Para pré-selecionar a conta
                          conta_id_url=conta_id,  # Para usar no JavaScript de redirecionamento
                          campos_personalizados=campos_personalizados,
                          raridades=RARIDADES,
                          eventos=EVENTOS,
-                         instancias=instancias_data,
-                         brainrots_existentes=brainrots_existentes)
+                         instancias=instancias_data)
 
 @app.route('/contas')
 @login_required
+@leitura_replica
 def contas_list():
     """Lista todas as Contas"""
     total_contas = Conta.query.count()
@@ -233,10 +317,10 @@ def contas_list():
 @login_required
 def conta_new():
     """Página para criar nova Conta"""
-    brainrots = Brainrot.query.all()
+    # Brainrots para associar são buscados sob demanda via /api/brainrots/typeahead
     return render_template('contas/form.html', 
                          conta=None, 
-                         brainrots=brainrots,
+                         brainrots=[],
                          brainrots_associados=[])
 
 @app.route('/contas/<int:id>/editar')
@@ -244,9 +328,9 @@ def conta_new():
 def conta_edit(id):
     """Página para editar Conta"""
     conta = Conta.query.get_or_404(id)
-    # Carregar brainrots associados explicitamente
-    brainrots_associados = [b.id for b in conta.brainrots.all()]
-    brainrots = Brainrot.query.all()
+    # Carregar apenas os brainrots já associados; os demais vêm do typeahead
+    brainrots = conta.brainrots.order_by(Brainrot.nome.asc()).all()
+    brainrots_associados = [b.id for b in brainrots]
     return render_template('contas/form.html', 
                          conta=conta, 
                          brainrots=brainrots,
@@ -254,125 +338,25 @@ def conta_edit(id):
 
 @app.route('/contas/<int:id>')
 @login_required
+@leitura_replica
 def conta_detail(id):
     """Página de detalhes da Conta"""
     conta = Conta.query.get_or_404(id)
-    # Carregar brainrots explicitamente para o template
-    brainrots = conta.brainrots.all()
-    return render_template('contas/detail.html', conta=conta, brainrots=brainrots)
+    # Brainrots carregados só se o bloco da conta não estiver em cache
+    return render_template('contas/detail.html', conta=conta, carregar_brainrots=lambda: conta.brainrots.all())
 
 # ==================== API REST ====================
 
-@app.route('/api/brainrots', methods=['GET'])
-@login_required
-def api_brainrots_list():
-    """API para listar Brainrots com busca e filtros"""
-    # Parâmetros de busca e filtro
-    busca = request.args.get('busca', '', type=str)
-    raridade = request.args.get('raridade', '', type=str)
-    valor_min = request.args.get('valor_min', type=float)
-    valor_max = request.args.get('valor_max', type=float)
-    valor_formato = request.args.get('valor_formato', '', type=str)  # /s, K/s, M/s, B/s
-    quantidade_min = request.args.get('quantidade_min', type=int)
-    quantidade_max = request.args.get('quantidade_max', type=int)
-    mutacoes_min = request.args.get('mutacoes_min', type=int)
-    mutacoes_max = request.args.get('mutacoes_max', type=int)
-    evento = request.args.get('evento', '', type=str)  # Filtro por evento
-    conta_id = request.args.get('conta_id', type=int)
-    
-    # Query base
-    query = Brainrot.query
-    
-    # Aplicar filtros
-    if busca:
-        query = query.filter(Brainrot.nome.ilike(f'%{busca}%'))
-    if raridade:
-        query = query.filter(Brainrot.raridade == raridade)
-    
-    # Filtro por formato de valor (valor_formatado contém o formato)
-    if valor_formato:
-        query = query.filter(Brainrot.valor_formatado.like(f'%{valor_formato}'))
-    
-    # Filtro por valor numérico (convertendo baseado no formato)
-    if valor_min is not None or valor_max is not None:
-        # Para filtrar por valor, precisamos converter baseado no formato
-        # Por enquanto, vamos filtrar pelo valor_por_segundo se não houver formato específico
-        if valor_min is not None:
-            query = query.filter(Brainrot.valor_por_segundo >= valor_min)
-        if valor_max is not None:
-            query = query.filter(Brainrot.valor_por_segundo <= valor_max)
-    
-    if quantidade_min is not None:
-        query = query.filter(Brainrot.quantidade >= quantidade_min)
-    if quantidade_max is not None:
-        query = query.filter(Brainrot.quantidade <= quantidade_max)
-    if mutacoes_min is not None:
-        query = query.filter(Brainrot.numero_mutacoes >= mutacoes_min)
-    if mutacoes_max is not None:
-        query = query.filter(Brainrot.numero_mutacoes <= mutacoes_max)
-    
-    # Filtro por evento
-    if evento:
-        # Buscar brainrots que tenham o evento na lista de eventos (JSON)
-        query = query.filter(Brainrot.eventos.contains(f'"{evento}"'))
-    
-    # Filtrar por tag
-    tag = request.args.get('tag', '').strip()
-    if tag:
-        query = query.filter(Brainrot.tags.contains(f'"{tag}"'))
-        query = query.filter(Brainrot.eventos.like(f'%"{evento}"%'))
-    
-    if conta_id:
-        query = query.join(brainrot_conta).filter(brainrot_conta.c.conta_id == conta_id)
-    
-    # Ordenar por raridade primeiro, depois por ordem personalizada
-    # Definir ordem de raridades
-    ordem_raridades = {
-        'Comum': 1,
-        'Raro': 2,
-        'Épico': 3,
-        'Lendário': 4,
-        'Mítico': 5,
-        'Deus Brainrot': 6,
-        'Secreto': 7,
-        'OG': 8
-    }
-    
-    brainrots_filtrados = query.all()
-    
-    # Se houver filtros aplicados, buscar todas as instâncias dos brainrots que passaram no filtro
-    tem_filtros = any([
-        busca, raridade, valor_min is not None, valor_max is not None, valor_formato,
-        quantidade_min is not None, quantidade_max is not None,
-        mutacoes_min is not None, mutacoes_max is not None,
-        evento, tag, conta_id
-    ])
-    
-    if tem_filtros and brainrots_filtrados:
-        # Obter os nomes únicos dos brainrots que passaram no filtro
-        nomes_filtrados = set(br.nome for br in brainrots_filtrados)
-        
-        # Buscar TODAS as instâncias dos brainrots com esses nomes (incluindo as que não passaram no filtro)
-        brainrots_completos = Brainrot.query.filter(Brainrot.nome.in_(nomes_filtrados)).all()
-        
-        # Ordenar: primeiro por raridade, depois por ordem personalizada
-        brainrots_ordenados = sorted(brainrots_completos, key=lambda br: (
-            ordem_raridades.get(br.raridade, 0),
-            getattr(br, 'ordem', 0),
-            br.data_criacao
-        ))
-    else:
-        # Sem filtros, usar todos os brainrots normalmente
-        brainrots_ordenados = sorted(brainrots_filtrados, key=lambda br: (
-            ordem_raridades.get(br.raridade, 0),
-            getattr(br, 'ordem', 0),
-            br.data_criacao
-        ))
-    
-    # Agrupar brainrots por nome para calcular ranges de valores
+def agrupar_brainrots_por_nome(brainrots, para_dict, contas_de):
+    """Agrupa brainrots (já na ordem de exibição) por espécie, com o range de valores das instâncias
+
+    para_dict(br) serializa um brainrot e contas_de(br) retorna os nomes das suas contas;
+    funciona tanto com objetos do ORM quanto com as linhas do snapshot em memória.
+    """
+    # Agrupar brainrots por espécie (inteiro) para calcular ranges de valores
     brainrots_por_nome = defaultdict(list)
-    for br in brainrots_ordenados:
-        brainrots_por_nome[br.nome].append(br)
+    for br in brainrots:
+        brainrots_por_nome[br.especie_id if br.especie_id is not None else br.nome].append(br)
     
     # Criar lista de resultados agrupados
     resultados = []
@@ -399,7 +383,7 @@ def api_brainrots_list():
             
             # Usar o primeiro brainrot como base
             brainrot_base = lista_brainrots[0]
-            brainrot_dict = brainrot_base.to_dict()
+            brainrot_dict = para_dict(brainrot_base)
             
             # Atualizar com range de valores (sobrescrever valor_formatado)
             brainrot_dict['valor_range'] = valor_range
@@ -426,14 +410,14 @@ def api_brainrots_list():
                     'id': inst.id,
                     'valor_formatado': inst_valor,
                     'numero_mutacoes': inst.numero_mutacoes,
-                    'contas': [conta.nome for conta in inst.contas.all()]
+                    'contas': contas_de(inst)
                 }
                 brainrot_dict['instancias'].append(inst_dict)
             
             resultados.append(brainrot_dict)
         else:
             # Apenas um brainrot com esse nome
-            brainrot_dict = lista_brainrots[0].to_dict()
+            brainrot_dict = para_dict(lista_brainrots[0])
             brainrot_dict['tem_multiplos'] = False
             brainrot_dict['total_instancias'] = 1
             # Garantir que favorito e tags estejam presentes
@@ -443,7 +427,54 @@ def api_brainrots_list():
                 brainrot_dict['tags'] = []
             resultados.append(brainrot_dict)
     
-    return jsonify(resultados)
+    return resultados
+
+@app.route('/api/brainrots', methods=['GET'])
+@login_required
+@leitura_replica
+def api_brainrots_list():
+    """API para listar Brainrots com busca e filtros (ou só as alterações, com ?since=<versão>)"""
+    # A versão é lida antes das linhas: o cliente nunca fica com uma versão mais nova que os dados
+    versao = obter_versao()
+    if 'since' in request.args:
+        try:
+            desde = ler_desde(request.args['since'])
+        except ErroSincronizacao as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify(delta(Brainrot, 'brainrot', desde, versao, lambda br: br.to_dict(), 'brainrots'))
+    
+    if app.config.get('SNAPSHOT_ATIVO'):
+        # Modelo de leitura em memória: filtra, agrupa e ordena sem objetos do ORM
+        snapshot = obter_snapshot(versao)
+        resposta = jsonify(agrupar_brainrots_por_nome(
+            snapshot.listar(ler_filtros_brainrot(request.args)), snapshot.para_dict, snapshot.contas_de
+        ))
+        resposta.headers['X-Versao-Dados'] = str(versao)
+        return resposta
+    
+    # Aplicar busca e filtros a partir dos parâmetros da URL
+    query, tem_filtros = aplicar_filtros_brainrot(Brainrot.query, request.args)
+    
+    # Ordenar por raridade primeiro, depois por ordem personalizada (feito pelo banco,
+    # usando o índice ix_brainrot_ordem_exibicao)
+    ordem_exibicao = (Brainrot.raridade_ordem, Brainrot.ordem, Brainrot.data_criacao)
+    
+    # Se houver filtros aplicados, buscar todas as instâncias dos brainrots que passaram no filtro
+    if tem_filtros:
+        # Buscar TODAS as instâncias das espécies que passaram no filtro (incluindo as que
+        # não passaram) em uma única consulta, com as espécies filtradas como subconsulta
+        especies_filtradas = query.with_entities(Brainrot.especie_id).distinct()
+        brainrots_ordenados = Brainrot.query.filter(Brainrot.especie_id.in_(especies_filtradas)) \
+                                            .order_by(*ordem_exibicao).all()
+    else:
+        # Sem filtros, usar todos os brainrots normalmente
+        brainrots_ordenados = query.order_by(*ordem_exibicao).all()
+    
+    resposta = jsonify(agrupar_brainrots_por_nome(
+        brainrots_ordenados, lambda br: br.to_dict(), lambda br: [conta.nome for conta in br.contas.all()]
+    ))
+    resposta.headers['X-Versao-Dados'] = str(versao)
+    return resposta
 
 @app.route('/api/brainrots', methods=['POST'])
 @login_required
@@ -501,28 +532,19 @@ def api_brainrot_create():
         db.session.flush()
         
         # Registrar histórico (agora brainrot.id já está disponível)
-        historico = HistoricoAlteracao(
-            tipo_entidade='brainrot',
-            entidade_id=brainrot.id,
-            acao='criar',
-            dados_novos=json.dumps(brainrot.to_dict())
-        )
-        db.session.add(historico)
+        registrar_historico('brainrot', brainrot.id, 'criar', dados_novos=json.dumps(brainrot.to_dict()))
         
         # Associar contas (verificando espaços disponíveis)
         conta_ids = data.get('contas', [])
         if conta_ids and len(conta_ids) > 0:
             try:
+                # Trava as contas e verifica todas de uma vez
+                verificar_capacidade({int(c): {brainrot.id} for c in conta_ids})
                 contas = Conta.query.filter(Conta.id.in_(conta_ids)).all()
-                # Verificar se todas as contas têm espaço disponível
-                contas_sem_espaco = [c.nome for c in contas if not c.tem_espaco_disponivel()]
-                if contas_sem_espaco:
-                    db.session.rollback()
-                    return jsonify({
-                        'success': False, 
-                        'error': f'As seguintes contas estão cheias: {", ".join(contas_sem_espaco)}'
-                    }), 400
                 brainrot.contas = contas
+            except ErroCapacidade as e:
+                db.session.rollback()
+                return jsonify({'success': False, 'error': str(e)}), 400
             except Exception as e:
                 print(f"AVISO: Erro ao associar contas: {e}")
                 # Continuar mesmo se não conseguir associar contas
@@ -551,26 +573,11 @@ def api_brainrot_update(id):
         data = request.get_json()
         
         brainrot.nome = data.get('nome', brainrot.nome)
-        # Atualizar foto - garantir que seja string (mesmo se vazio)
-        foto_value = data.get('foto', '')
-        if foto_value is None:
-            foto_value = ''
-        foto_value = foto_value.strip() if foto_value else ''
-        
-        # Se a foto foi atualizada e não está vazia, atualizar em todas as instâncias do mesmo Brainrot
-        if foto_value and foto_value != brainrot.foto:
-            # Buscar todas as instâncias com o mesmo nome
-            nome_atual = brainrot.nome
-            outras_instancias = Brainrot.query.filter(
-                Brainrot.nome == nome_atual,
-                Brainrot.id != brainrot.id
-            ).all()
-            
-            # Atualizar foto em todas as outras instâncias
-            for instancia in outras_instancias:
-                instancia.foto = foto_value
-        
-        brainrot.foto = foto_value
+        # A foto pertence à espécie: uma única linha, vale para todas as instâncias
+        # (se o nome mudou, vai para a espécie do novo nome no flush). Vazio remove a foto;
+        # sem o campo 'foto' na requisição, a foto da espécie fica como está
+        if 'foto' in data:
+            brainrot.foto = (data['foto'] or '').strip()
         brainrot.raridade = data.get('raridade', brainrot.raridade)
         
         # Atualizar valor formatado
@@ -611,25 +618,24 @@ def api_brainrot_update(id):
         # Atualizar contas
         conta_ids = data.get('contas', [])
         if conta_ids is not None:
-            contas = Conta.query.filter(Conta.id.in_(conta_ids)).all()
+            novas = {int(c) for c in conta_ids}
+            atuais = {linha.conta_id for linha in db.session.query(brainrot_conta.c.conta_id)
+                      .filter(brainrot_conta.c.brainrot_id == brainrot.id)}
+            verificar_capacidade(
+                {c: {brainrot.id} for c in novas - atuais},
+                {c: {brainrot.id} for c in atuais - novas}
+            )
+            contas = Conta.query.filter(Conta.id.in_(novas)).all()
             brainrot.contas = contas
-        
+
+        # Registrar histórico (gravado depois do commit, fora da requisição)
+        db.session.flush()
+        registrar_historico('brainrot', brainrot.id, 'editar', dados_anteriores, json.dumps(brainrot.to_dict()))
         db.session.commit()
         
         # Recarregar do banco para garantir que está salvo
         db.session.refresh(brainrot)
         
-        # Registrar histórico
-        historico = HistoricoAlteracao(
-            tipo_entidade='brainrot',
-            entidade_id=brainrot.id,
-            acao='editar',
-            dados_anteriores=dados_anteriores,
-            dados_novos=json.dumps(brainrot.to_dict())
-        )
-        db.session.add(historico)
-        db.session.commit()
-        
         return jsonify({'success': True, 'brainrot': brainrot.to_dict()})
         
     except Exception as e:
@@ -708,6 +714,7 @@ def api_brainrot_copiar(id):
 
 @app.route('/api/brainrots/buscar-dados-por-nome', methods=['GET'])
 @login_required
+@leitura_replica
 def api_brainrot_buscar_dados_por_nome():
     """API para buscar dados de um brainrot por nome exato (para preenchimento automático)"""
     nome = request.args.get('nome', '').strip()
@@ -715,21 +722,75 @@ def api_brainrot_buscar_dados_por_nome():
     if not nome:
         return jsonify({'success': False, 'error': 'Nome não fornecido'}), 400
     
-    # Buscar o primeiro brainrot com o nome exato (case-insensitive)
-    brainrot = Brainrot.query.filter(Brainrot.nome.ilike(nome)).first()
+    # Espécie com o nome exato (case-insensitive): leitura pela chave única do catálogo
+    especie = especie_por_nome(nome)
     
-    if brainrot:
+    if especie:
         return jsonify({
             'success': True,
             'dados': {
-                'nome': brainrot.nome,
-                'raridade': brainrot.raridade,
-                'foto': brainrot.foto or ''
+                'nome': especie.nome,
+                'raridade': especie.raridade,
+                'foto': especie.foto or ''
             }
         })
     
     return jsonify({'success': False, 'dados': None})
 
+@app.route('/api/brainrots/typeahead', methods=['GET'])
+@login_required
+@leitura_replica
+def api_brainrots_typeahead():
+    """API paginada e limitada para autocompletar brainrots por prefixo do nome
+
+    Paginação por chave (keyset): a resposta traz em 'proximo' os parâmetros apos_nome e
+    apos_id da página seguinte, que continua logo depois do último item, sem OFFSET.
+    """
+    termo = request.args.get('q', '').strip()
+    apos_nome = request.args.get('apos_nome')
+    apos_id = request.args.get('apos_id', type=int)
+    por_pagina = request.args.get('por_pagina', TYPEAHEAD_POR_PAGINA, type=int) or TYPEAHEAD_POR_PAGINA
+    por_pagina = max(1, min(por_pagina, TYPEAHEAD_POR_PAGINA_MAX))
+    
+    # Selecionar apenas as colunas necessárias (sem carregar objetos ORM completos)
+    nome_minusculo = func.lower(Brainrot.nome)
+    query = db.session.query(Brainrot.id, Brainrot.nome, Brainrot.raridade, Especie.foto) \
+                      .outerjoin(Especie, Brainrot.especie_id == Especie.id)
+    if termo:
+        # Busca por prefixo no índice ix_brainrot_nome_lower (lower(nome))
+        termo_escapado = termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(nome_minusculo.like(func.lower(termo_escapado + '%'), escape='\\'))
+        if db.engine.dialect.name == 'sqlite':
+            # O SQLite não usa índice de expressão no LIKE, mas usa neste intervalo equivalente
+            # (U+10FFFF é o maior caractere: todo nome com o prefixo fica abaixo do limite)
+            query = query.filter(nome_minusculo >= func.lower(termo),
+                                 nome_minusculo < func.lower(termo) + '\U0010ffff')
+    if apos_nome is not None and apos_id is not None:
+        # Continuar depois do último item da página anterior, na mesma ordem do índice
+        query = query.filter(or_(nome_minusculo > func.lower(apos_nome),
+                                 and_(nome_minusculo == func.lower(apos_nome), Brainrot.id > apos_id)))
+    
+    # Buscar um item a mais para saber se existe próxima página
+    linhas = query.order_by(nome_minusculo.asc(), Brainrot.id.asc()) \
+                  .limit(por_pagina + 1) \
+                  .all()
+    
+    tem_mais = len(linhas) > por_pagina
+    linhas = linhas[:por_pagina]
+    itens = [{
+        'id': linha.id,
+        'nome': linha.nome,
+        'raridade': linha.raridade,
+        'foto': linha.foto or ''
+    } for linha in linhas]
+    
+    return jsonify({
+        'itens': itens,
+        'por_pagina': por_pagina,
+        'tem_mais': tem_mais,
+        'proximo': {'apos_nome': linhas[-1].nome, 'apos_id': linhas[-1].id} if tem_mais else None
+    })
+
 @app.route('/api/brainrots/<int:id>', methods=['DELETE'])
 @login_required
 def api_brainrot_delete(id):
@@ -738,13 +799,7 @@ def api_brainrot_delete(id):
         brainrot = Brainrot.query.get_or_404(id)
         
         # Registrar histórico ANTES de deletar
-        historico = HistoricoAlteracao(
-            tipo_entidade='brainrot',
-            entidade_id=brainrot.id,
-            acao='excluir',
-            dados_anteriores=json.dumps(brainrot.to_dict())
-        )
-        db.session.add(historico)
+        registrar_historico('brainrot', brainrot.id, 'excluir', dados_anteriores=json.dumps(brainrot.to_dict()))
         
         db.session.delete(brainrot)
         db.session.commit()
@@ -755,8 +810,17 @@ def api_brainrot_delete(id):
 
 @app.route('/api/contas', methods=['GET'])
 @login_required
+@leitura_replica
 def api_contas_list():
-    """API para listar Contas com busca"""
+    """API para listar Contas com busca (ou só as alterações, com ?since=<versão>)"""
+    versao = obter_versao()
+    if 'since' in request.args:
+        try:
+            desde = ler_desde(request.args['since'])
+        except ErroSincronizacao as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify(delta(Conta, 'conta', desde, versao, lambda conta: conta.to_dict(), 'contas'))
+    
     busca = request.args.get('busca', '', type=str)
     
     query = Conta.query
@@ -767,7 +831,9 @@ def api_contas_list():
     
     # Sempre ordenar por nome alfabeticamente
     contas = query.order_by(Conta.nome.asc()).all()
-    return jsonify([conta.to_dict() for conta in contas])
+    resposta = jsonify([conta.to_dict() for conta in contas])
+    resposta.headers['X-Versao-Dados'] = str(versao)
+    return resposta
 
 @app.route('/api/contas', methods=['POST'])
 @login_required
@@ -797,8 +863,13 @@ def api_conta_create():
         brainrot_ids = data.get('brainrots', [])
         if brainrot_ids and len(brainrot_ids) > 0:
             try:
+                db.session.flush()
+                verificar_capacidade({conta.id: {int(b) for b in brainrot_ids}})
                 brainrots = Brainrot.query.filter(Brainrot.id.in_(brainrot_ids)).all()
                 conta.brainrots = brainrots
+            except ErroCapacidade as e:
+                db.session.rollback()
+                return jsonify({'success': False, 'error': str(e)}), 400
             except Exception as e:
                 print(f"AVISO: Erro ao associar brainrots: {e}")
                 # Continuar mesmo se não conseguir associar brainrots
@@ -840,19 +911,21 @@ def api_conta_update(id):
         # Atualizar brainrots (verificando espaços disponíveis)
         brainrot_ids = data.get('brainrots', [])
         if brainrot_ids is not None:
-            brainrots = Brainrot.query.filter(Brainrot.id.in_(brainrot_ids)).all()
-            # Verificar se há espaço suficiente
-            if conta.espacos > 0 and len(brainrots) > conta.espacos:
-                return jsonify({
-                    'success': False, 
-                    'error': f'A conta tem apenas {conta.espacos} espaço(s), mas você está tentando associar {len(brainrots)} brainrot(s).'
-                }), 400
+            # Substitui a lista inteira: tudo que não está na nova lista sai da conta
+            novos = {int(b) for b in brainrot_ids}
+            atuais = {linha.brainrot_id for linha in db.session.query(brainrot_conta.c.brainrot_id)
+                      .filter(brainrot_conta.c.conta_id == conta.id)}
+            verificar_capacidade({conta.id: novos}, {conta.id: atuais - novos})
+            brainrots = Brainrot.query.filter(Brainrot.id.in_(novos)).all()
             conta.brainrots = brainrots
-        
+
         db.session.commit()
-        
+
         return jsonify({'success': True, 'conta': conta.to_dict()})
-        
+
+    except ErroCapacidade as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -870,6 +943,107 @@ def api_conta_delete(id):
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
+@app.route('/api/contas/alocacao', methods=['POST'])
+@login_required
+def api_contas_alocacao():
+    """Calcula (e opcionalmente aplica) a alocação de brainrots nas contas que maximiza a renda"""
+    try:
+        import time
+        inicio = time.perf_counter()
+        data = request.get_json() or {}
+        aplicar = bool(data.get('aplicar', False))
+        priorizar_favoritos = bool(data.get('priorizar_favoritos', True))
+        fixados = {int(item['brainrot_id']): int(item['conta_id']) for item in data.get('fixados', [])}
+        
+        # Carregar apenas as colunas necessárias (sem objetos ORM)
+        query_contas = db.session.query(Conta.id, Conta.espacos)
+        conta_ids_filtro = data.get('contas')
+        if conta_ids_filtro:
+            query_contas = query_contas.filter(Conta.id.in_(conta_ids_filtro))
+        contas = [(c.id, c.espacos or 0) for c in query_contas.all()]
+        if aplicar:
+            # Trava as contas antes de ler as associações: ninguém altera a ocupação até o commit
+            travadas = bloquear_contas([c[0] for c in contas])
+            contas = [(conta_id, espacos) for conta_id, (_, espacos) in travadas.items()]
+        conta_ids = {c[0] for c in contas}
+        
+        associacoes = db.session.query(brainrot_conta.c.brainrot_id, brainrot_conta.c.conta_id).all()
+        # Com um subconjunto de contas, brainrots que estão em outras contas ficam de fora
+        bloqueados = {b for b, c in associacoes if c not in conta_ids}
+        
+        brainrots = [
+            (b.id, valor_renda(b.valor_formatado, b.valor_por_segundo, b.quantidade), b.favorito)
+            for b in db.session.query(Brainrot.id, Brainrot.valor_formatado, Brainrot.valor_por_segundo,
+                                      Brainrot.quantidade, Brainrot.favorito).all()
+            if b.id not in bloqueados
+        ]
+        
+        resultado = calcular_alocacao(
+            brainrots, contas,
+            [(b, c) for b, c in associacoes if c in conta_ids],
+            fixados=fixados,
+            priorizar_favoritos=priorizar_favoritos
+        )
+        movimentos = resultado['movimentos']
+        
+        if aplicar and movimentos:
+            ids_movidos = [m['brainrot_id'] for m in movimentos]
+            # Trocar as associações em lote, em uma única transação
+            for i in range(0, len(ids_movidos), 1000):
+                lote = ids_movidos[i:i + 1000]
+                db.session.execute(
+                    brainrot_conta.delete().where(
+                        brainrot_conta.c.brainrot_id.in_(lote),
+                        brainrot_conta.c.conta_id.in_(conta_ids)
+                    )
+                )
+            novas = [{'brainrot_id': m['brainrot_id'], 'conta_id': m['para']}
+                     for m in movimentos if m['para'] is not None]
+            if novas:
+                db.session.execute(brainrot_conta.insert(), novas)
+            
+            # Uma linha de histórico por conta afetada, com os brainrots que saíram e entraram
+            saidas, entradas = defaultdict(list), defaultdict(list)
+            for m in movimentos:
+                for conta_id in m['de']:
+                    saidas[conta_id].append(m['brainrot_id'])
+                if m['para'] is not None:
+                    entradas[m['para']].append(m['brainrot_id'])
+            for conta_id in sorted(saidas.keys() | entradas.keys()):
+                registrar_historico('conta', conta_id, 'alocar', dados_novos=json.dumps({
+                    'removidos': saidas.get(conta_id, []),
+                    'adicionados': entradas.get(conta_id, []),
+                    'movimentos': len(movimentos),
+                    'renda_antes': resultado['renda_antes'],
+                    'renda_depois': resultado['renda_depois']
+                }))
+            incrementar_versao()
+            registrar_alteracao('brainrot', ids_movidos, 'atualizar')
+            registrar_alteracao('conta', conta_ids, 'atualizar')
+            marcar_alterados(Brainrot.__table__, ids_movidos)
+            marcar_alterados(Conta.__table__, conta_ids)
+            db.session.commit()
+        
+        capacidade_total = resultado['capacidade_total']
+        return jsonify({
+            'success': True,
+            'aplicado': aplicar,
+            'movimentos': movimentos,
+            'total_movimentos': len(movimentos),
+            'alocados': resultado['alocados'],
+            'capacidade_total': None if capacidade_total == float('inf') else capacidade_total,
+            'renda_antes': resultado['renda_antes'],
+            'renda_depois': resultado['renda_depois'],
+            'tempo_ms': round((time.perf_counter() - inicio) * 1000, 1)
+        })
+    
+    except ErroAlocacao as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 @app.route('/api/campos-personalizados', methods=['GET'])
 def api_campos_personalizados_list():
     """API para listar campos personalizados"""
@@ -879,17 +1053,19 @@ def api_campos_personalizados_list():
 @app.route('/api/campos-personalizados', methods=['POST'])
 @login_required
 def api_campo_personalizado_create():
-    """API para criar campo personalizado"""
+    """API para criar campo personalizado (com o índice de expressão usado pelos filtros)"""
     try:
         data = request.get_json()
         
         campo = CampoPersonalizado(
-            nome=data.get('nome'),
+            nome=validar_campo(data.get('nome'), data.get('tipo', 'texto')),
             tipo=data.get('tipo', 'texto'),
             descricao=data.get('descricao', '')
         )
         
         db.session.add(campo)
+        db.session.flush()
+        criar_indice_campo(db.session.connection(), campo.id, campo.nome, campo.tipo)
         db.session.commit()
         
         return jsonify({'success': True, 'campo': campo.to_dict()}), 201
@@ -1011,9 +1187,21 @@ def api_bulk_action():
             if not conta_id:
                 return jsonify({'success': False, 'error': 'Conta não especificada'}), 400
             conta = Conta.query.get_or_404(conta_id)
-            for br in brainrots:
-                if conta not in br.contas.all():
-                    br.contas.append(conta)
+            verificar_capacidade({conta.id: {br.id for br in brainrots}})
+            # Insere só as associações que ainda não existem, em uma única instrução
+            existentes = {linha.brainrot_id for linha in db.session.query(brainrot_conta.c.brainrot_id).filter(
+                brainrot_conta.c.conta_id == conta.id,
+                brainrot_conta.c.brainrot_id.in_([br.id for br in brainrots])
+            )}
+            novas = [{'brainrot_id': br.id, 'conta_id': conta.id} for br in brainrots if br.id not in existentes]
+            if novas:
+                db.session.execute(brainrot_conta.insert(), novas)
+                incrementar_versao()
+                ids_associados = [nova['brainrot_id'] for nova in novas]
+                registrar_alteracao('brainrot', ids_associados, 'atualizar')
+                registrar_alteracao('conta', [conta.id], 'atualizar')
+                marcar_alterados(Brainrot.__table__, ids_associados)
+                marcar_alterados(Conta.__table__, [conta.id])
             db.session.commit()
             return jsonify({'success': True, 'message': f'{len(brainrots)} brainrots associados'})
         
@@ -1023,13 +1211,60 @@ def api_bulk_action():
         return jsonify({'success': False, 'error': str(e)}), 400
 
 # Filtros Salvos
+def ids_filtro_salvo(filtro):
+    """Retorna os ids (na ordem de exibição) que atendem ao filtro salvo, com cache por versão dos dados"""
+    chave = (filtro.id, filtro.filtros, obter_versao())
+    
+    def calcular():
+        # Uma única consulta, apenas com os ids
+        query, _ = aplicar_filtros_brainrot(db.session.query(Brainrot.id), filtro.get_filtros())
+        query = query.order_by(Brainrot.raridade_ordem, Brainrot.ordem, Brainrot.data_criacao, Brainrot.id)
+        return tuple(linha.id for linha in query.all())
+    
+    return _cache_filtros_salvos.obter_ou_calcular(chave, calcular)
+
 @app.route('/api/filtros-salvos', methods=['GET'])
 @login_required
 def api_filtros_salvos_list():
-    """Lista todos os filtros salvos"""
+    """Lista todos os filtros salvos (com ?com_contagem=1 inclui o total de resultados)"""
     tipo = request.args.get('tipo', 'brainrot')
     filtros = FiltroSalvo.query.filter_by(tipo=tipo).all()
-    return jsonify([f.to_dict() for f in filtros])
+    resultado = [f.to_dict() for f in filtros]
+    if tipo == 'brainrot' and request.args.get('com_contagem') == '1':
+        for filtro, filtro_dict in zip(filtros, resultado):
+            filtro_dict['total'] = len(ids_filtro_salvo(filtro))
+    return jsonify(resultado)
+
+@app.route('/api/filtros-salvos/<int:id>/resultados', methods=['GET'])
+@login_required
+@leitura_replica
+def api_filtro_salvo_resultados(id):
+    """Executa um filtro salvo no servidor e retorna os resultados paginados"""
+    filtro = FiltroSalvo.query.get_or_404(id)
+    if filtro.tipo != 'brainrot':
+        return jsonify({'success': False, 'error': 'Apenas filtros de brainrot podem ser executados'}), 400
+    
+    pagina = max(1, request.args.get('pagina', 1, type=int) or 1)
+    por_pagina = request.args.get('por_pagina', FILTROS_POR_PAGINA, type=int) or FILTROS_POR_PAGINA
+    por_pagina = max(1, min(por_pagina, FILTROS_POR_PAGINA_MAX))
+    
+    ids = ids_filtro_salvo(filtro)
+    ids_pagina = ids[(pagina - 1) * por_pagina:pagina * por_pagina]
+    
+    # Carregar apenas os brainrots da página e manter a ordem do conjunto de ids
+    brainrots = {br.id: br for br in Brainrot.query.filter(Brainrot.id.in_(ids_pagina)).all()} if ids_pagina else {}
+    itens = [brainrots[i].to_dict() for i in ids_pagina if i in brainrots]
+    
+    return jsonify({
+        'success': True,
+        'filtro': filtro.to_dict(),
+        'itens': itens,
+        'total': len(ids),
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'tem_mais': pagina * por_pagina < len(ids),
+        'versao': obter_versao()
+    })
 
 @app.route('/api/filtros-salvos', methods=['POST'])
 @login_required
@@ -1086,8 +1321,11 @@ def api_meta_create():
             nome=data.get('nome'),
             descricao=data.get('descricao', ''),
             tipo=data.get('tipo'),
+            parametro=data.get('parametro') or None,
             valor_alvo=int(data.get('valor_alvo', 0))
         )
+        # Progresso inicial calculado a partir do inventário atual
+        recalcular_meta(meta)
         db.session.add(meta)
         db.session.commit()
         return jsonify({'success': True, 'meta': meta.to_dict()})
@@ -1101,19 +1339,7 @@ def api_meta_update(id):
     """Atualiza uma meta"""
     try:
         meta = Meta.query.get_or_404(id)
-        data = request.get_json()
-        if 'nome' in data:
-            meta.nome = data['nome']
-        if 'descricao' in data:
-            meta.descricao = data['descricao']
-        if 'valor_alvo' in data:
-            meta.valor_alvo = int(data['valor_alvo'])
-        if 'valor_atual' in data:
-            meta.valor_atual = int(data['valor_atual'])
-        if 'concluida' in data:
-            meta.concluida = data['concluida']
-            if data['concluida'] and not meta.data_conclusao:
-                meta.data_conclusao = datetime.utcnow()
+        atualizar_meta(meta, request.get_json())
         db.session.commit()
         return jsonify({'success': True, 'meta': meta.to_dict()})
     except Exception as e:
@@ -1133,6 +1359,21 @@ def api_meta_delete(id):
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
+# Operações em lote
+@app.route('/api/batch', methods=['POST'])
+@login_required
+def api_batch():
+    """Executa várias operações (brainrots, contas, metas) em uma única transação"""
+    try:
+        resultado = executar_lote(request.get_json(silent=True))
+        return jsonify(resultado), (200 if resultado['success'] else 400)
+    except ErroLote as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # Histórico de Alterações
 @app.route('/api/historico', methods=['GET'])
 @login_required
@@ -1151,10 +1392,39 @@ def api_historico_list():
     return jsonify([h.to_dict() for h in historico])
 
 # Importação de Dados
+# Colunas do CSV de importação que preenchem cada campo
+COLUNAS_CSV_IMPORTACAO = {
+    'nome': ('Nome', 'nome'),
+    'foto': ('Foto', 'foto'),
+    'raridade': ('Raridade', 'raridade'),
+    'valor_formatado': ('Valor Formatado', 'valor_formatado'),
+    'valor_por_segundo': ('Valor/s', 'valor_por_segundo'),
+    'quantidade': ('Quantidade', 'quantidade'),
+    'numero_mutacoes': ('Mutações', 'numero_mutacoes'),
+    'eventos': ('Eventos',),
+}
+
+
+def _somente_fornecidos(campos, fornecidos):
+    """Tira da linha os campos que o arquivo não trouxe
+
+    Ao inserir, importar_brainrots preenche os que faltam com os padrões; ao atualizar,
+    o brainrot existente mantém os seus. Os campos da impressão digital ficam, porque
+    identificam o brainrot (e nunca são alterados).
+    """
+    return {campo: valor for campo, valor in campos.items() if campo in fornecidos or campo in CAMPOS_IMPRESSAO}
+
+
 @app.route('/api/import/brainrots', methods=['POST'])
 @login_required
 def api_import_brainrots():
-    """Importa brainrots de um arquivo JSON ou CSV"""
+    """Importa brainrots de um arquivo JSON ou CSV
+    
+    Parâmetro `modo` (formulário ou URL): 'inserir' (padrão, insere todas as linhas),
+    'pular' (ignora duplicados) ou 'atualizar' (atualiza o brainrot já existente).
+    Duplicados são detectados pela impressão digital (nome, valor, mutações e eventos).
+    No modo 'atualizar' só os campos presentes no arquivo são alterados.
+    """
     try:
         if 'file' not in request.files:
             return jsonify({'success': False, 'error': 'Nenhum arquivo enviado'}), 400
@@ -1163,8 +1433,9 @@ def api_import_brainrots():
         if file.filename == '':
             return jsonify({'success': False, 'error': 'Arquivo vazio'}), 400
         
+        modo = request.form.get('modo') or request.args.get('modo', 'inserir')
         filename = file.filename.lower()
-        importados = 0
+        linhas = []
         erros = []
         
         if filename.endswith('.json'):
@@ -1174,7 +1445,7 @@ def api_import_brainrots():
             
             for item in data:
                 try:
-                    brainrot = Brainrot(
+                    campos = dict(
                         nome=item.get('nome', 'Sem nome'),
                         foto=item.get('foto', ''),
                         raridade=item.get('raridade', 'Comum'),
@@ -1185,11 +1456,10 @@ def api_import_brainrots():
                         favorito=item.get('favorito', False)
                     )
                     if 'eventos' in item:
-                        brainrot.set_eventos(item['eventos'])
+                        campos['eventos'] = item['eventos']
                     if 'tags' in item:
-                        brainrot.set_tags(item['tags'])
-                    db.session.add(brainrot)
-                    importados += 1
+                        campos['tags'] = item['tags']
+                    linhas.append(_somente_fornecidos(campos, set(item)))
                 except Exception as e:
                     erros.append(f"Erro ao importar {item.get('nome', 'item')}: {str(e)}")
         
@@ -1201,7 +1471,7 @@ def api_import_brainrots():
             
             for row in csv_reader:
                 try:
-                    brainrot = Brainrot(
+                    campos = dict(
                         nome=row.get('Nome', row.get('nome', 'Sem nome')),
                         foto=row.get('Foto', row.get('foto', '')),
                         raridade=row.get('Raridade', row.get('raridade', 'Comum')),
@@ -1211,19 +1481,28 @@ def api_import_brainrots():
                         numero_mutacoes=int(row.get('Mutações', row.get('numero_mutacoes', 0)))
                     )
                     if row.get('Eventos'):
-                        eventos = [e.strip() for e in row['Eventos'].split(',')]
-                        brainrot.set_eventos(eventos)
-                    db.session.add(brainrot)
-                    importados += 1
+                        campos['eventos'] = [e.strip() for e in row['Eventos'].split(',')]
+                    linhas.append(_somente_fornecidos(campos, {
+                        campo for campo, colunas in COLUNAS_CSV_IMPORTACAO.items()
+                        if any(coluna in row for coluna in colunas)
+                    }))
                 except Exception as e:
                     erros.append(f"Erro ao importar linha: {str(e)}")
         
+        relatorio = importar_brainrots(linhas, modo)
         db.session.commit()
         return jsonify({
             'success': True,
-            'importados': importados,
+            'modo': modo,
+            'importados': relatorio['inseridos'] + relatorio['atualizados'],
+            'inseridos': relatorio['inseridos'],
+            'atualizados': relatorio['atualizados'],
+            'ignorados': relatorio['ignorados'],
             'erros': erros
         })
+    except ErroImportacao as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -1252,49 +1531,138 @@ def api_compare_brainrots():
 @app.route('/api/report/pdf', methods=['GET'])
 @login_required
 def api_generate_pdf_report():
-    """Gera um relatório em PDF"""
+    """Relatório em PDF do inventário (servido do disco enquanto os dados não mudarem)
+
+    Parâmetros: secoes=raridade,conta, raridade, conta_id. Relatórios grandes ainda não
+    gerados respondem 202 e são gerados em segundo plano; basta repetir a requisição.
+    """
+    if not relatorios.DISPONIVEL:
+        return jsonify({'success': False, 'error': 'Biblioteca reportlab não instalada'}), 500
     try:
-        from reportlab.lib.pagesizes import letter
-        from reportlab.pdfgen import canvas
-        from io import BytesIO
-        
+        from flask import send_file
         tipo = request.args.get('tipo', 'brainrots')
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        
-        # Título
-        p.setFont("Helvetica-Bold", 20)
-        p.drawString(100, 750, f"Relatório de {tipo.capitalize()}")
-        
-        if tipo == 'brainrots':
-            brainrots = Brainrot.query.all()
-            y = 700
-            p.setFont("Helvetica", 12)
-            for br in brainrots[:50]:  # Limitar a 50 por página
-                p.drawString(100, y, f"{br.nome} - {br.raridade} - {br.valor_formatado}")
-                y -= 20
-                if y < 50:
-                    p.showPage()
-                    y = 750
-        
-        p.save()
-        buffer.seek(0)
-        
-        from flask import Response
-        return Response(
-            buffer.getvalue(),
-            mimetype='application/pdf',
-            headers={'Content-Disposition': 'attachment; filename=relatorio.pdf'}
-        )
-    except ImportError:
-        return jsonify({'success': False, 'error': 'Biblioteca reportlab não instalada'}), 500
+        if tipo != 'brainrots':
+            return jsonify({'success': False, 'error': f'Tipo de relatório inválido: {tipo}'}), 400
+        
+        parametros = relatorios.normalizar_parametros(request.args)
+        versao = obter_versao()
+        caminho = relatorios.caminho_relatorio(versao, parametros)
+        em_cache = os.path.exists(caminho)
+        
+        if not em_cache:
+            if relatorios.total_linhas(parametros) > app.config['RELATORIOS_LIMITE_SINCRONO']:
+                relatorios.gerar_em_segundo_plano(parametros, versao)
+                resposta = jsonify({
+                    'success': True,
+                    'status': 'gerando',
+                    'mensagem': 'O relatório está sendo gerado. Tente novamente em alguns segundos.'
+                })
+                resposta.status_code = 202
+                resposta.headers['Retry-After'] = '5'
+                return resposta
+            caminho = relatorios.gerar(parametros)
+        
+        resposta = send_file(os.path.abspath(caminho), mimetype='application/pdf',
+                             as_attachment=True, download_name='relatorio.pdf')
+        resposta.headers['X-Relatorio-Cache'] = 'hit' if em_cache else 'miss'
+        return resposta
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+# Análises de distribuição
+@app.route('/api/analytics', methods=['GET'])
+@login_required
+@leitura_replica
+def api_analytics():
+    """Percentis, histogramas, concentração e duplicados da renda (cache pela versão dos dados)"""
+    if not analytics.DISPONIVEL:
+        return jsonify({'success': False, 'error': 'Biblioteca numpy não instalada'}), 503
+    try:
+        import time
+        inicio = time.perf_counter()
+        bins = min(max(request.args.get('bins', 20, type=int), 2), 100)
+        limite = min(max(request.args.get('limite', 20, type=int), 1), 500)
+        chave = (obter_versao(), bins, limite)
+        relatorio = _cache_analytics.get(chave)
+        em_cache = relatorio is not None
+        if not em_cache:
+            relatorio = analytics.gerar_relatorio(analytics.carregar_colunas(chave[0]), bins=bins, limite=limite)
+            _cache_analytics.set(chave, relatorio)
+        return jsonify(dict(relatorio, success=True, em_cache=em_cache,
+                            tempo_ms=round((time.perf_counter() - inicio) * 1000, 1)))
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+# Feed de alterações (Server-Sent Events)
+@app.route('/api/events', methods=['GET'])
+@login_required
+def api_events():
+    """Stream SSE com as alterações confirmadas (entidade, id, ação e nova versão)"""
+    return stream_eventos(obter_versao())
+
+# Métricas (Prometheus)
+@app.route('/metrics')
+def metrics():
+    """Exporta métricas no formato texto do Prometheus (todos os workers)"""
+    from flask import Response
+    token = app.config.get('METRICAS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Não autorizado\n', status=401, mimetype='text/plain')
+    
+    conteudo = gerar_metricas()
+    if conteudo is None:
+        return Response('Biblioteca prometheus_client não instalada\n', status=503, mimetype='text/plain')
+    return Response(conteudo, mimetype=METRICAS_CONTENT_TYPE)
+
+# Backup completo
+@app.route('/admin/backup')
+@login_required
+def admin_backup():
+    """Baixa um backup completo (todas as tabelas, .jsonl.gz) gerado em streaming
+
+    Para restaurar: flask backup restaurar <arquivo> --sim
+    """
+    from flask import Response
+    nome = f"brainrot-backup-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.jsonl.gz"
+    return Response(
+        gerar_backup_compactado(db.engine),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': f'attachment; filename={nome}'}
+    )
+
+# Perfis de Requisições (profiler sob demanda)
+@app.route('/admin/perfis')
+@login_required
+def admin_perfis():
+    """Lista os perfis de requisições salvos pelo profiler"""
+    return render_template('admin/perfis.html',
+                         perfis=listar_perfis(app),
+                         ativo=app.config.get('PROFILER_ATIVO', False),
+                         amostragem=app.config.get('PROFILER_AMOSTRAGEM', 0))
+
+@app.route('/admin/perfis/<arquivo>')
+@login_required
+def admin_perfil_detalhe(arquivo):
+    """Mostra o resumo de um perfil ou baixa o arquivo .prof"""
+    arquivo = secure_filename(arquivo)
+    pasta = app.config.get('PROFILER_PASTA', 'profiles')
+    if not arquivo.endswith('.prof') or not os.path.isfile(os.path.join(pasta, arquivo)):
+        return jsonify({'success': False, 'error': 'Perfil não encontrado'}), 404
+    
+    if request.args.get('download'):
+        return send_from_directory(os.path.abspath(pasta), arquivo, as_attachment=True)
+    
+    from flask import Response
+    ordenacao = request.args.get('ordenar', 'cumulative')
+    if ordenacao not in ('cumulative', 'tottime', 'calls'):
+        ordenacao = 'cumulative'
+    return Response(resumo_perfil(app, arquivo, ordenacao), mimetype='text/plain')
+
 # ==================== EXPORTAÇÃO DE DADOS ====================
 
 @app.route('/api/export/brainrots', methods=['GET'])
 @login_required
+@leitura_replica
 def api_export_brainrots():
     """Exporta todos os brainrots em JSON ou CSV"""
     format_type = request.args.get('format', 'json').lower()
@@ -1335,6 +1703,7 @@ def api_export_brainrots():
 
 @app.route('/api/export/contas', methods=['GET'])
 @login_required
+@leitura_replica
 def api_export_contas():
     """Exporta todas as contas em JSON ou CSV"""
     format_type = request.args.get('format', 'json').lower()
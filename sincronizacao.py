@@ -0,0 +1,173 @@
+"""Sincronização incremental: GET /api/brainrots?since=<versão> e /api/contas?since=<versão>
+
+Cada brainrot e cada conta guardam em versao_alteracao a versão dos dados (versao_dados)
+da última transação que os alterou. A versão é incrementada sob lock da linha única de
+versao_dados, então as transações recebem versões na ordem em que confirmam; quem já tem
+os dados da versão N só precisa das linhas com versao_alteracao > N.
+
+Além das próprias colunas, contam como alteração:
+    - associações brainrot <-> conta (os dois lados: nomes das contas no brainrot,
+      ocupação na conta), pelo ORM ou em lote (marcar_alterados);
+    - renomear uma conta (os brainrots dela mostram o nome) e alterar uma espécie
+      (foto/raridade dos brainrots dela);
+    - excluir um brainrot (ocupação das contas) ou uma conta (associações dos brainrots).
+
+Exclusões viram linhas em `exclusao` (tombstones). Uma linha com tipo '*' pede que os
+clientes com versão anterior recarreguem tudo (restauração de backup, limpeza de
+tombstones antigos).
+"""
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import delete, event, func, inspect, select, update
+
+LOTE = 1000
+
+_estado = {}
+
+
+class ErroSincronizacao(ValueError):
+    """Parâmetro since inválido"""
+
+
+def _versao(session):
+    # Definida pelo versioning no before_flush/incrementar_versao da mesma transação
+    return session.info.get('versao_nova', 0)
+
+
+def marcar_alterados(tabela, ids):
+    """Marca linhas alteradas fora do ORM (ex: associações em lote) com a versão da transação
+
+    Chamar depois de incrementar_versao().
+    """
+    session = _estado['db'].session
+    ids = list(ids)
+    for inicio in range(0, len(ids), LOTE):
+        session.execute(
+            update(tabela).where(tabela.c.id.in_(ids[inicio:inicio + LOTE]))
+            .values(versao_alteracao=_versao(session))
+        )
+
+
+def ler_desde(valor):
+    """Converte o parâmetro since; ErroSincronizacao se não for um inteiro >= 0"""
+    try:
+        desde = int(valor)
+    except (TypeError, ValueError):
+        raise ErroSincronizacao('Parâmetro since deve ser uma versão (inteiro)')
+    if desde < 0:
+        raise ErroSincronizacao('Parâmetro since deve ser >= 0')
+    return desde
+
+
+def delta(Modelo, tipo_entidade, desde, versao, para_dict, chave):
+    """Linhas alteradas e exclusões com versão > desde
+
+    Retorna {'versao', 'desde', chave: [...], 'excluidos': [...], 'recarregar'}; com
+    recarregar=True o cliente deve buscar a lista completa de novo.
+    """
+    db, Exclusao = _estado['db'], _estado['Exclusao']
+    resposta = {'versao': versao, 'desde': desde, chave: [], 'excluidos': [], 'recarregar': False}
+    if desde > versao:
+        resposta['recarregar'] = True
+        return resposta
+    reinicio = db.session.execute(
+        select(func.count()).select_from(Exclusao)
+        .where(Exclusao.tipo_entidade == '*', Exclusao.versao > desde)
+    ).scalar()
+    if reinicio:
+        resposta['recarregar'] = True
+        return resposta
+    linhas = Modelo.query.filter(Modelo.versao_alteracao > desde).order_by(Modelo.id).all()
+    resposta[chave] = [para_dict(linha) for linha in linhas]
+    existentes = {linha.id for linha in linhas}
+    resposta['excluidos'] = sorted(set(db.session.execute(
+        select(Exclusao.entidade_id)
+        .where(Exclusao.tipo_entidade == tipo_entidade, Exclusao.versao > desde)
+    ).scalars()) - existentes)
+    return resposta
+
+
+def registrar_reinicio(conexao, versao):
+    """Tombstone '*': clientes com versão anterior a `versao` precisam recarregar tudo"""
+    tabela = _estado['Exclusao'].__table__
+    conexao.execute(tabela.insert().values(tipo_entidade='*', entidade_id=0, versao=versao,
+                                           data_exclusao=datetime.utcnow()))
+
+
+def limpar_exclusoes(dias):
+    """Apaga tombstones com mais de `dias` dias (deixa um '*' no lugar); retorna quantos"""
+    db, Exclusao = _estado['db'], _estado['Exclusao']
+    limite = datetime.utcnow() - timedelta(days=dias)
+    filtro = (Exclusao.data_exclusao < limite) & (Exclusao.tipo_entidade != '*')
+    versao_maxima = db.session.execute(select(func.max(Exclusao.versao)).where(filtro)).scalar()
+    if versao_maxima is None:
+        return 0
+    apagadas = db.session.execute(delete(Exclusao).where(filtro)).rowcount
+    registrar_reinicio(db.session, versao_maxima)
+    db.session.commit()
+    return apagadas
+
+
+def init_sincronizacao(app, db, Brainrot, Conta, Especie, Exclusao, brainrot_conta):
+    """Registra os eventos que mantêm versao_alteracao e os tombstones"""
+    _estado.update(db=db, Exclusao=Exclusao)
+    tabela_brainrot, tabela_conta = Brainrot.__table__, Conta.__table__
+
+    @event.listens_for(Brainrot, 'before_insert')
+    @event.listens_for(Brainrot, 'before_update')
+    @event.listens_for(Conta, 'before_insert')
+    @event.listens_for(Conta, 'before_update')
+    def _carimbar(mapper, connection, obj):
+        # Também dispara quando só as associações mudaram
+        obj.versao_alteracao = _versao(inspect(obj).session)
+
+    def _marcar_por_associacao(session, coluna_filtro, ids, tabela_alvo, coluna_alvo):
+        """Marca as linhas de tabela_alvo associadas (via brainrot_conta) aos ids dados"""
+        if not ids:
+            return
+        associados = select(coluna_alvo).where(coluna_filtro.in_(ids)).scalar_subquery()
+        session.execute(
+            update(tabela_alvo).where(tabela_alvo.c.id.in_(associados))
+            .values(versao_alteracao=_versao(session))
+        )
+
+    @event.listens_for(db.session, 'before_flush')
+    def _propagar(session, flush_context, instances):
+        # Roda depois do listener do versioning (registrado antes), que já definiu a versão
+        contas_renomeadas, especies_alteradas = [], []
+        for obj in list(session.dirty) + list(session.new):
+            if isinstance(obj, (Brainrot, Conta)):
+                estado = inspect(obj)
+                colecao = 'contas' if isinstance(obj, Brainrot) else 'brainrots'
+                historico = estado.attrs[colecao].history
+                for outro in list(historico.added or ()) + list(historico.deleted or ()):
+                    # O outro lado fica "dirty" e recebe a versão no before_update
+                    if inspect(outro).persistent:
+                        outro.versao_alteracao = _versao(session)
+                if isinstance(obj, Conta) and estado.persistent and estado.attrs.nome.history.deleted:
+                    contas_renomeadas.append(obj.id)
+            elif isinstance(obj, Especie) and inspect(obj).persistent and session.is_modified(obj):
+                especies_alteradas.append(obj.id)
+
+        brainrots_excluidos = [obj.id for obj in session.deleted if isinstance(obj, Brainrot)]
+        contas_excluidas = [obj.id for obj in session.deleted if isinstance(obj, Conta)]
+        # Antes do flush as linhas de brainrot_conta ainda existem
+        _marcar_por_associacao(session, brainrot_conta.c.conta_id, contas_renomeadas + contas_excluidas,
+                               tabela_brainrot, brainrot_conta.c.brainrot_id)
+        _marcar_por_associacao(session, brainrot_conta.c.brainrot_id, brainrots_excluidos,
+                               tabela_conta, brainrot_conta.c.conta_id)
+        if especies_alteradas:
+            session.execute(
+                update(tabela_brainrot).where(tabela_brainrot.c.especie_id.in_(especies_alteradas))
+                .values(versao_alteracao=_versao(session))
+            )
+        for tipo, ids in (('brainrot', brainrots_excluidos), ('conta', contas_excluidas)):
+            for id_ in ids:
+                session.add(Exclusao(tipo_entidade=tipo, entidade_id=id_, versao=_versao(session)))
+
+    @app.cli.command('limpar-exclusoes')
+    @click.option('--dias', default=30, show_default=True, help='Idade mínima dos registros apagados')
+    def limpar_exclusoes_command(dias):
+        """Apaga registros de exclusão antigos (clientes mais antigos recarregam tudo)"""
+        print(f"{limpar_exclusoes(dias)} registro(s) de exclusão apagado(s)")
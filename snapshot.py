@@ -0,0 +1,251 @@
+"""Modelo de leitura compacto (snapshot em memória) da tabela de brainrots
+
+Opcional (SNAPSHOT_ATIVO=1). Mantém em cada worker uma cópia enxuta dos brainrots e das
+associações com contas: cada linha é um objeto com __slots__ (sem __dict__ nem estado
+do ORM), strings repetidas são internadas e as contas de cada brainrot ficam em um
+array de inteiros. Filtrar, agrupar por espécie e ordenar a listagem passa a ser feito
+em memória, sem materializar objetos Brainrot.
+
+Atualização incremental: quando a versão dos dados muda, só os brainrots e contas com
+versao_alteracao acima da versão do snapshot são relidos (a sincronização já marca
+nelas mudanças de associação, de nome da conta e da espécie), junto com as associações
+desses brainrots; exclusões vêm dos tombstones em `exclusao`. Um tombstone '*'
+(restauração de backup, limpeza de tombstones) pede a carga completa.
+"""
+import json
+import os
+import sys
+import threading
+from array import array
+from collections import defaultdict
+from functools import lru_cache
+
+from sqlalchemy import select
+
+from campos import atende_filtro
+
+# Ids por IN (...) ao reler as associações dos brainrots alterados
+LOTE = 1000
+
+# Brainrots sem conta compartilham a mesma tupla vazia
+SEM_CONTAS = ()
+
+_estado = {}
+
+
+@lru_cache(maxsize=4096)
+def _lista_json(valor):
+    """Lista JSON -> tupla; textos iguais (muito comuns) compartilham a mesma tupla"""
+    if not valor:
+        return ()
+    try:
+        return tuple(sys.intern(str(item)) for item in json.loads(valor))
+    except (ValueError, TypeError):
+        return ()
+
+
+def _internar(valor):
+    return sys.intern(valor) if isinstance(valor, str) else valor
+
+
+class LinhaBrainrot:
+    """Uma linha do snapshot: só os campos usados pela listagem"""
+    __slots__ = ('id', 'nome', 'especie_id', 'foto', 'raridade', 'raridade_ordem', 'valor_por_segundo',
+                 'valor_formatado', 'quantidade', 'numero_mutacoes', 'eventos', 'ordem',
+                 'campos_personalizados', 'favorito', 'tags', 'data_criacao', 'contas')
+
+    COLUNAS = __slots__[:-1]
+
+    def __init__(self, linha):
+        for campo, valor in zip(self.COLUNAS, linha):
+            setattr(self, campo, valor)
+        self.nome = _internar(self.nome)
+        self.raridade = _internar(self.raridade)
+        self.valor_formatado = _internar(self.valor_formatado)
+        self.foto = _internar(self.foto)
+        self.eventos = _lista_json(self.eventos)
+        self.tags = _lista_json(self.tags)
+        # Dicionário já decodificado pela coluna JSON (None quando vazio)
+        self.campos_personalizados = self.campos_personalizados or None
+        self.contas = SEM_CONTAS
+
+
+class SnapshotBrainrots:
+    """Snapshot de um worker; obter() devolve o snapshot atualizado para a versão atual"""
+
+    def __init__(self):
+        self.linhas = {}
+        self.nomes_contas = {}
+        self.versao = None
+        self._lock = threading.Lock()
+
+    def _consulta(self):
+        """SELECT das colunas do snapshot; a foto vem da espécie"""
+        Brainrot, Especie = _estado['Brainrot'], _estado['Especie']
+        colunas = [Especie.foto if campo == 'foto' else getattr(Brainrot, campo) for campo in LinhaBrainrot.COLUNAS]
+        return select(*colunas).outerjoin(Especie, Brainrot.especie_id == Especie.id)
+
+    def _carregar_associacoes(self, linhas, ids=None):
+        """Preenche as contas das linhas; com ids, lê só as associações desses brainrots"""
+        db, tabela = _estado['db'], _estado['brainrot_conta']
+        consulta = select(tabela.c.brainrot_id, tabela.c.conta_id).order_by(tabela.c.brainrot_id, tabela.c.conta_id)
+        if ids is None:
+            consultas = [consulta]
+        else:
+            consultas = [consulta.where(tabela.c.brainrot_id.in_(ids[inicio:inicio + LOTE]))
+                         for inicio in range(0, len(ids), LOTE)]
+        por_brainrot = defaultdict(lambda: array('i'))
+        for consulta in consultas:
+            for brainrot_id, conta_id in db.session.execute(consulta):
+                por_brainrot[brainrot_id].append(conta_id)
+        for brainrot_id, linha in linhas.items():
+            linha.contas = por_brainrot.get(brainrot_id, SEM_CONTAS)
+
+    def recarregar(self, versao):
+        """Carga completa (primeira vez ou depois de um tombstone '*')"""
+        db, Conta = _estado['db'], _estado['Conta']
+        linhas = {linha[0]: LinhaBrainrot(linha) for linha in db.session.execute(self._consulta())}
+        self._carregar_associacoes(linhas)
+        self.nomes_contas = {id_: _internar(nome) for id_, nome in db.session.execute(select(Conta.id, Conta.nome))}
+        self.linhas = linhas
+        self.versao = versao
+
+    def atualizar(self, versao):
+        """Relê só o que mudou depois da versão do snapshot"""
+        db, Brainrot, Conta, Exclusao = _estado['db'], _estado['Brainrot'], _estado['Conta'], _estado['Exclusao']
+        desde = self.versao
+        excluidos = defaultdict(set)
+        for tipo, entidade_id in db.session.execute(
+                select(Exclusao.tipo_entidade, Exclusao.entidade_id).where(Exclusao.versao > desde)):
+            excluidos[tipo].add(entidade_id)
+        if versao < desde or '*' in excluidos:
+            return self.recarregar(versao)
+
+        alteradas = {linha[0]: LinhaBrainrot(linha)
+                     for linha in db.session.execute(self._consulta().where(Brainrot.versao_alteracao > desde))}
+        self._carregar_associacoes(alteradas, list(alteradas))
+        contas_alteradas = dict(db.session.execute(select(Conta.id, Conta.nome).where(Conta.versao_alteracao > desde)).all())
+
+        # Cópias rasas: leitores em outras threads continuam usando os dicionários anteriores
+        linhas = dict(self.linhas)
+        linhas.update(alteradas)
+        for removido in excluidos['brainrot'] - alteradas.keys():
+            linhas.pop(removido, None)
+        nomes_contas = self.nomes_contas
+        if contas_alteradas or excluidos['conta']:
+            nomes_contas = dict(nomes_contas)
+            nomes_contas.update((id_, _internar(nome)) for id_, nome in contas_alteradas.items())
+            for removida in excluidos['conta'] - contas_alteradas.keys():
+                nomes_contas.pop(removida, None)
+        self.linhas = linhas
+        self.nomes_contas = nomes_contas
+        self.versao = versao
+
+    def obter(self, versao):
+        if self.versao == versao:
+            return self
+        with self._lock:
+            if self.versao is None:
+                self.recarregar(versao)
+            elif self.versao != versao:
+                self.atualizar(versao)
+        return self
+
+    def contas_de(self, linha):
+        return [self.nomes_contas[c] for c in linha.contas if c in self.nomes_contas]
+
+    def para_dict(self, linha):
+        """Mesmo formato de Brainrot.to_dict()"""
+        campos = dict(linha.campos_personalizados) if isinstance(linha.campos_personalizados, dict) else {}
+        return {
+            'id': linha.id,
+            'nome': linha.nome,
+            'foto': linha.foto if linha.foto else '',
+            'raridade': linha.raridade,
+            'valor_por_segundo': linha.valor_por_segundo,
+            'valor_formatado': linha.valor_formatado or f'${linha.valor_por_segundo}/s',
+            'quantidade': linha.quantidade,
+            'numero_mutacoes': linha.numero_mutacoes,
+            'eventos': list(linha.eventos),
+            'ordem': linha.ordem or 0,
+            'campos_personalizados': campos,
+            'favorito': linha.favorito if linha.favorito is not None else False,
+            'tags': list(linha.tags),
+            'contas': self.contas_de(linha),
+            'data_criacao': linha.data_criacao.isoformat() if linha.data_criacao else None
+        }
+
+    def filtrar(self, filtros):
+        """Equivalente em memória de aplicar_filtros_brainrot(); retorna (linhas, tem_filtros)
+
+        filtros: dicionário já convertido por ler_filtros_brainrot()
+        """
+        todas = self.linhas
+        busca = (filtros.get('busca') or '').lower()
+        raridade = filtros.get('raridade')
+        valor_formato = filtros.get('valor_formato')
+        evento = filtros.get('evento')
+        tag = filtros.get('tag')
+        limites = [
+            (campo, filtros.get(f'{chave}_min'), filtros.get(f'{chave}_max'))
+            for chave, campo in (('valor', 'valor_por_segundo'), ('quantidade', 'quantidade'),
+                                 ('mutacoes', 'numero_mutacoes'))
+        ]
+        limites = [(campo, minimo, maximo) for campo, minimo, maximo in limites
+                   if minimo is not None or maximo is not None]
+        conta_id = filtros.get('conta_id')
+        campos = filtros.get('campos') or ()
+
+        condicoes = []
+        if busca:
+            condicoes.append(lambda l: busca in l.nome.lower())
+        if raridade:
+            condicoes.append(lambda l: l.raridade == raridade)
+        if valor_formato:
+            condicoes.append(lambda l: (l.valor_formatado or '').endswith(valor_formato))
+        for campo, minimo, maximo in limites:
+            if minimo is not None:
+                condicoes.append(lambda l, c=campo, m=minimo: getattr(l, c) is not None and getattr(l, c) >= m)
+            if maximo is not None:
+                condicoes.append(lambda l, c=campo, m=maximo: getattr(l, c) is not None and getattr(l, c) <= m)
+        if evento:
+            condicoes.append(lambda l: evento in l.eventos)
+        if tag:
+            condicoes.append(lambda l: tag in l.tags)
+        if conta_id:
+            condicoes.append(lambda l: conta_id in l.contas)
+        for filtro in campos:
+            condicoes.append(lambda l, f=filtro: atende_filtro(l.campos_personalizados, f))
+
+        if not condicoes:
+            return list(todas.values()), False
+        return [l for l in todas.values() if all(c(l) for c in condicoes)], True
+
+    def listar(self, filtros):
+        """Linhas na ordem de exibição; com filtros, traz todas as instâncias das espécies encontradas"""
+        todas = self.linhas
+        linhas, tem_filtros = self.filtrar(filtros)
+        if tem_filtros:
+            especies = {l.especie_id for l in linhas}
+            linhas = [l for l in todas.values() if l.especie_id in especies]
+        linhas.sort(key=_chave_exibicao)
+        return linhas
+
+
+def _chave_exibicao(linha):
+    data = linha.data_criacao
+    return (linha.raridade_ordem or 0, linha.ordem or 0, data is None, data or 0)
+
+
+_snapshot = SnapshotBrainrots()
+
+
+def init_snapshot(app, db, Brainrot, Conta, brainrot_conta, Especie, Exclusao):
+    app.config.setdefault('SNAPSHOT_ATIVO', os.getenv('SNAPSHOT_ATIVO', '0') == '1')
+    _estado.update(db=db, Brainrot=Brainrot, Conta=Conta, brainrot_conta=brainrot_conta, Especie=Especie,
+                   Exclusao=Exclusao)
+
+
+def obter_snapshot(versao):
+    """Snapshot do worker atualizado para a versão informada"""
+    return _snapshot.obter(versao)
@@ -0,0 +1,100 @@
+"""Versão global dos dados, usada como chave de invalidação dos caches
+
+Toda transação que cria, altera ou exclui um Brainrot ou uma Conta (incluindo as
+associações entre eles) incrementa a linha única de versao_dados na mesma transação.
+Caches em memória ou em disco usam (chave, versão) e ficam automaticamente inválidos
+após qualquer escrita, em qualquer worker.
+
+Savepoints (session.begin_nested(), usados pelo /api/batch) não encerram a transação:
+liberar um savepoint não conta como commit, e desfazer um só descarta o incremento se
+ele foi feito dentro do savepoint (o próximo flush incrementa de novo).
+"""
+from flask import g, has_app_context
+from sqlalchemy import event, insert, select, update
+
+VERSAO_ID = 1
+
+_estado = {}
+
+
+def init_versioning(db, VersaoDados, modelos_versionados):
+    """Registra os listeners de sessão que incrementam a versão dos dados"""
+    _estado['db'] = db
+    _estado['modelo'] = VersaoDados
+    _estado['modelos'] = tuple(modelos_versionados)
+
+    @event.listens_for(db.session, 'before_flush')
+    def _incrementar_se_alterado(session, flush_context, instances):
+        if session.info.get('versao_incrementada'):
+            return
+        modelos = _estado['modelos']
+        alterados = any(
+            isinstance(obj, modelos)
+            for colecao in (session.new, session.dirty, session.deleted)
+            for obj in colecao
+        )
+        if alterados:
+            _incrementar(session)
+
+    @event.listens_for(db.session, 'after_commit')
+    def _limpar_apos_commit(session):
+        if session.in_nested_transaction():
+            return
+        session.info.pop('versao_incrementada', None)
+        session.info.pop('versao_transacao', None)
+        if has_app_context():
+            g.pop('_versao_dados', None)
+
+    @event.listens_for(db.session, 'after_soft_rollback')
+    def _limpar_apos_rollback(session, previous_transaction):
+        if previous_transaction.nested and not _dentro(session.info.get('versao_transacao'), previous_transaction):
+            return
+        session.info.pop('versao_incrementada', None)
+        session.info.pop('versao_nova', None)
+        session.info.pop('versao_transacao', None)
+
+
+def _dentro(transacao, externa):
+    """Se a transação (ou savepoint) está dentro de `externa`"""
+    while transacao is not None:
+        if transacao is externa:
+            return True
+        transacao = transacao.parent
+    return False
+
+
+def _incrementar(session):
+    VersaoDados = _estado['modelo']
+    tabela = VersaoDados.__table__
+    versao = session.execute(
+        update(tabela)
+        .where(tabela.c.id == VERSAO_ID)
+        .values(versao=tabela.c.versao + 1)
+        .returning(tabela.c.versao)
+    ).scalar()
+    if versao is None:
+        session.execute(insert(tabela).values(id=VERSAO_ID, versao=1))
+        versao = 1
+    session.info['versao_incrementada'] = True
+    session.info['versao_transacao'] = session.get_nested_transaction() or session.get_transaction()
+    # Versão que a transação vai publicar ao confirmar (lida pelo feed de eventos)
+    session.info['versao_nova'] = versao
+
+
+def incrementar_versao():
+    """Incrementa a versão manualmente (para escritas feitas fora do ORM, ex: inserts em lote)"""
+    _incrementar(_estado['db'].session())
+
+
+def obter_versao():
+    """Retorna a versão atual dos dados (memorizada durante a requisição)"""
+    if has_app_context() and '_versao_dados' in g:
+        return g._versao_dados
+    VersaoDados = _estado['modelo']
+    versao = _estado['db'].session.execute(
+        select(VersaoDados.__table__.c.versao).where(VersaoDados.__table__.c.id == VERSAO_ID)
+    ).scalar()
+    versao = versao or 0
+    if has_app_context():
+        g._versao_dados = versao
+    return versao